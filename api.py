@@ -0,0 +1,355 @@
+import argparse
+import base64
+import ipaddress
+import json
+import os
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import assistant
+import chat_history
+import podcast
+import telemetry
+import transcription
+import web_fetch
+
+
+# ---------------------------
+# Headless API
+# ---------------------------
+# The assistant's pipelines over plain HTTP + JSON, without Streamlit, for
+# other front ends, scripts and load testing. Requests are POSTed as JSON;
+# with "stream": true the reply is a Server-Sent Events stream of "token" (or
+# "segment") events ending with a "done" event. Each process holds no user
+# state besides the session store, so with SESSION_STORE=sqlite any number of
+# `python api.py` workers can run behind a load balancer. Every request is a
+# trace, and the stage metrics are served on /metrics.
+
+API_HOST = os.environ.get("API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("API_PORT", "8502"))
+# Bearer token required on every request except /healthz (no authentication when empty)
+API_TOKEN = os.environ.get("API_TOKEN", "")
+API_MAX_BODY_MB = int(os.environ.get("API_MAX_BODY_MB", "50"))
+
+# Most document chunks a question may ask for, and most spreadsheet rows per request
+MAX_DOCUMENT_CHUNKS = 20
+MAX_SHEET_ROWS = 1000
+
+
+def _required(body, name):
+    value = body.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise assistant.InputError(f"'{name}' is required")
+    return value
+
+
+def _integer(body, name, default, minimum, maximum):
+    value = body.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, int) or not minimum <= value <= maximum:
+        raise assistant.InputError(f"'{name}' must be an integer from {minimum} to {maximum}")
+    return value
+
+
+def _session(body):
+    return body.get("session") or chat_history.new_session_id()
+
+
+# Function to decode an uploaded file, {"name", "data" (base64)}, into (name, bytes)
+def _decode_file(upload):
+    try:
+        return upload["name"], base64.b64decode(upload["data"], validate=True)
+    except (KeyError, TypeError, ValueError) as e:
+        raise assistant.InputError(f"Invalid file, expected {{\"name\", \"data\" (base64)}}: {e}") from e
+
+
+def _file(body, name="file"):
+    if not isinstance(body.get(name), dict):
+        raise assistant.InputError(f"'{name}' is required: {{\"name\", \"data\" (base64)}}")
+    return _decode_file(body[name])
+
+
+def _files(body):
+    if not body.get("files") or not isinstance(body["files"], list):
+        raise assistant.InputError("'files' is required: [{\"name\", \"data\" (base64)}]")
+    return [_decode_file(upload) for upload in body["files"]]
+
+
+# Function to turn pipeline events ({"event", ...}) into the reply: the final "done" event's data,
+# or (event, data) pairs for the SSE stream. `extra` is added to the "done" data.
+def _reply(events, stream, **extra):
+    if not stream:
+        for event in events:
+            if event["event"] == "done":
+                return {**_data(event), **extra}
+    return _stream(events, extra)
+
+
+def _stream(events, extra):
+    for event in events:
+        data = _data(event)
+        yield event["event"], {**data, **extra} if event["event"] == "done" else data
+
+
+def _data(event):
+    return {key: value for key, value in event.items() if key != "event"}
+
+
+# Each handler takes the JSON body and returns a JSON-serializable result, or yields
+# (event, data) pairs when the request asked for a stream
+
+
+def chat(body, stream):
+    session = _session(body)
+    tab = body.get("tab") or "chat"
+    events = assistant.answer_events(session, tab, _required(body, "message"), body.get("context", ""), stream=stream)
+    return _reply(events, stream, session=session)
+
+
+def clear_chat(body, stream):
+    session = _required(body, "session")
+    assistant.clear_conversation(session, body.get("tab") or "chat")
+    return {"session": session, "cleared": True}
+
+
+def documents_context(body, stream):
+    return assistant.document_context(_files(body), _required(body, "question"), k=_integer(body, "k", 4, 1, MAX_DOCUMENT_CHUNKS))
+
+
+def documents_ask(body, stream):
+    question = _required(body, "question")
+    documents = documents_context(body, stream)
+    session = _session(body)
+    events = assistant.answer_events(session, "documents", question, documents["context"], stream=stream)
+    return _reply(events, stream, session=session, sources=documents["sources"], errors=documents["errors"])
+
+
+def spreadsheet_profile(body, stream):
+    return assistant.spreadsheet_profile(*_file(body))
+
+
+def spreadsheet_rows(body, stream):
+    start = _integer(body, "start", 0, 0, 10 ** 9)
+    stop = _integer(body, "stop", start + 100, start, start + MAX_SHEET_ROWS)
+    return assistant.spreadsheet_rows(*_file(body), _required(body, "sheet"), start, stop)
+
+
+def website_fetch(body, stream):
+    return assistant.fetch_website(_required(body, "url"))
+
+
+def website_ask(body, stream):
+    question = _required(body, "question")
+    context = assistant.fetch_website(_required(body, "url"))["text"]
+    session = _session(body)
+    return _reply(assistant.answer_events(session, "websites", question, context, stream=stream), stream, session=session)
+
+
+def translate(body, stream):
+    targets = body.get("targets")
+    if not targets or not isinstance(targets, list):
+        raise assistant.InputError("'targets' is required, e.g. [\"fr\", \"de\"]")
+    return {"translations": assistant.translate(_required(body, "text"), targets, body.get("source", "auto"))}
+
+
+def sentiment(body, stream):
+    return assistant.analyze_sentiment(_required(body, "text"))
+
+
+def emotion(body, stream):
+    return assistant.analyze_emotions(_required(body, "text"))
+
+
+def _schema(body):
+    database = _file(body, "database")[1] if body.get("database") else None
+    return body.get("schema") or "", database
+
+
+def sql(body, stream):
+    schema_ddl, database = _schema(body)
+    events = assistant.sql_events(_required(body, "question"), schema_ddl, database, run=bool(body.get("run")), stream=stream)
+    return _reply(events, stream)
+
+
+def sql_schema(body, stream):
+    schema_ddl, database = _schema(body)
+    if not schema_ddl.strip() and not database:
+        raise assistant.InputError("'schema' (CREATE statements) or 'database' is required")
+    return assistant.sql_schema(schema_ddl, database)
+
+
+def _encode_audio(segment):
+    return {**segment, "audio": base64.b64encode(segment["audio"]).decode("ascii")}
+
+
+def podcast_audio(body, stream):
+    segments = assistant.podcast_segments(_required(body, "text"))
+    if stream:
+        return (("segment", _encode_audio(segment)) for segment in segments)
+    segments = list(segments)
+    if not segments:
+        raise assistant.InputError("There is no text to synthesize")
+    audio_format = segments[0]["format"]
+    audio = podcast.stitch([segment["audio"] for segment in segments], audio_format)
+    return {"format": audio_format, "audio": base64.b64encode(audio).decode("ascii")}
+
+
+def transcribe(body, stream):
+    segments = assistant.transcription_segments_from_bytes(*_file(body))
+    if stream:
+        return (("segment", segment) for segment in segments)
+    segments = list(segments)
+    return {"text": transcription.join_segments(segments), "segments": sorted(segments, key=lambda s: s["index"])}
+
+
+ROUTES = {
+    "/v1/chat": chat,
+    "/v1/chat/clear": clear_chat,
+    "/v1/documents/context": documents_context,
+    "/v1/documents/ask": documents_ask,
+    "/v1/spreadsheet/profile": spreadsheet_profile,
+    "/v1/spreadsheet/rows": spreadsheet_rows,
+    "/v1/website/fetch": website_fetch,
+    "/v1/website/ask": website_ask,
+    "/v1/translate": translate,
+    "/v1/sentiment": sentiment,
+    "/v1/emotion": emotion,
+    "/v1/sql": sql,
+    "/v1/sql/schema": sql_schema,
+    "/v1/podcast": podcast_audio,
+    "/v1/transcribe": transcribe,
+}
+
+
+# Function to map an exception to the HTTP status reported for it
+def error_status(error):
+    if isinstance(error, assistant.InputError):
+        return 400
+    if isinstance(error, web_fetch.FetchError):
+        return 502
+    return 500
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "SMAssistantAPI/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok", "model": assistant.OLLAMA_MODEL})
+        elif path == "/metrics":
+            if self._authorized():
+                body = telemetry.metrics.render().encode("utf-8")
+                self._send(200, "text/plain; version=0.0.4; charset=utf-8", body)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        handler = ROUTES.get(self.path.split("?")[0])
+        if handler is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+        if not self._authorized():
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY_MB * 1024 * 1024:
+            self._send_json(413, {"error": f"Request body is larger than {API_MAX_BODY_MB} MB"})
+            self.close_connection = True
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON body: {e}"})
+            return
+
+        stream = bool(body.get("stream"))
+        self._streaming = False
+        telemetry.begin_trace(f"api {self.path}")
+        try:
+            with telemetry.span("api", route=self.path, streamed=stream):
+                result = handler(body, stream)
+                if stream and not isinstance(result, dict):
+                    self._send_events(result)
+                else:
+                    self._send_json(200, result)
+        except Exception as e:
+            if stream and getattr(self, "_streaming", False):
+                # Headers are already sent, the error becomes the stream's last event
+                self._write_event("error", {"error": str(e)})
+            else:
+                self._send_json(error_status(e), {"error": str(e)})
+        finally:
+            telemetry.end_trace()
+
+    def _authorized(self):
+        if not API_TOKEN or secrets.compare_digest(self.headers.get("Authorization", ""), f"Bearer {API_TOKEN}"):
+            return True
+        self._send_json(401, {"error": "Missing or invalid bearer token"})
+        return False
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, result):
+        self._send(status, "application/json", json.dumps(result, default=str).encode("utf-8"))
+
+    # Server-Sent Events: each event is flushed as soon as it is produced, the connection closes after the last
+    def _send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        self._streaming = True
+        for event, data in events:
+            self._write_event(event, data)
+
+    def _write_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# Function to create the API server; call serve_forever() on it.
+# Without API_TOKEN the server only listens on a loopback address.
+def create_server(host=API_HOST, port=API_PORT):
+    if not API_TOKEN and not _is_loopback(host):
+        raise ValueError(f"Set API_TOKEN to listen on {host}; without a token the API only listens on 127.0.0.1")
+    return ThreadingHTTPServer((host, port), APIHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the assistant's pipelines as an HTTP API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    try:
+        server = create_server(args.host, args.port)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Assistant API listening on http://{args.host}:{server.server_address[1]} (model {assistant.OLLAMA_MODEL})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
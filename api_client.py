@@ -0,0 +1,145 @@
+import base64
+import json
+import os
+import threading
+
+import requests
+
+
+# ---------------------------
+# API Client
+# ---------------------------
+# Lets the Streamlit app run as a thin client of a headless API (api.py) when
+# ASSISTANT_API_URL is set: chat, document and website context, spreadsheet
+# profiles, Text-to-SQL, translation, the text analyses, podcasts and
+# transcription are sent to the API, so the models, the LLM traffic and the
+# caches live on the API workers. The client has the same functions as
+# assistant.py; uploads are sent base64-encoded.
+
+REQUEST_TIMEOUT = 300
+
+
+class APIError(Exception):
+    pass
+
+
+class RemoteAssistant:
+    def __init__(self, url, token=""):
+        self.url = url.rstrip("/")
+        # One pooled connection set per process, shared by all sessions
+        self.http = requests.Session()
+        if token:
+            self.http.headers["Authorization"] = f"Bearer {token}"
+
+    def _post(self, path, body, stream=False):
+        try:
+            response = self.http.post(f"{self.url}{path}", json=body, stream=stream, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            raise APIError(f"Assistant API unreachable: {e}") from e
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]
+            except (ValueError, KeyError):
+                message = response.text[:200]
+            raise APIError(f"Assistant API error {response.status_code}: {message}")
+        return response
+
+    # Yield (event, data) pairs from a Server-Sent Events response
+    def _events(self, response):
+        event = None
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "error":
+                        raise APIError(data["error"])
+                    yield event, data
+
+    # Yield the pipeline events ({"event", ...}) of a request that may be streamed
+    def _pipeline_events(self, path, body, stream):
+        response = self._post(path, {**body, "stream": stream}, stream=stream)
+        if not stream:
+            yield {"event": "done", **response.json()}
+            return
+        for event, data in self._events(response):
+            yield {"event": event, **data}
+
+    # Same events as assistant.answer_events
+    def answer_events(self, session_id, tab, question, context="", stream=True):
+        body = {"session": session_id, "tab": tab, "message": question, "context": context}
+        return self._pipeline_events("/v1/chat", body, stream)
+
+    def clear_conversation(self, session_id, tab):
+        self._post("/v1/chat/clear", {"session": session_id, "tab": tab})
+
+    def document_context(self, files, question, k=4):
+        body = {"files": [_encode_file(name, data) for name, data in files], "question": question, "k": k}
+        return self._post("/v1/documents/context", body).json()
+
+    def spreadsheet_profile(self, name, data):
+        return self._post("/v1/spreadsheet/profile", {"file": _encode_file(name, data)}).json()
+
+    def spreadsheet_rows(self, name, data, sheet_title, start=0, stop=100):
+        body = {"file": _encode_file(name, data), "sheet": sheet_title, "start": start, "stop": stop}
+        return self._post("/v1/spreadsheet/rows", body).json()
+
+    def fetch_website(self, url):
+        return self._post("/v1/website/fetch", {"url": url}).json()
+
+    def translate(self, text, targets, source="auto", on_progress=None):
+        # Progress is not reported over the API; the whole text is one step
+        translations = self._post("/v1/translate", {"text": text, "targets": targets, "source": source}).json()["translations"]
+        if on_progress:
+            on_progress(1, 1, 0)
+        return translations
+
+    def analyze_sentiment(self, text):
+        return self._post("/v1/sentiment", {"text": text}).json()
+
+    def analyze_emotions(self, text):
+        return self._post("/v1/emotion", {"text": text}).json()
+
+    def sql_schema(self, schema_ddl="", database=None):
+        return self._post("/v1/sql/schema", _schema_body(schema_ddl, database)).json()
+
+    # Same events as assistant.sql_events
+    def sql_events(self, question, schema_ddl="", database=None, run=False, stream=True):
+        body = {**_schema_body(schema_ddl, database), "question": question, "run": run}
+        return self._pipeline_events("/v1/sql", body, stream)
+
+    def podcast_segments(self, text):
+        response = self._post("/v1/podcast", {"text": text, "stream": True}, stream=True)
+        for _, segment in self._events(response):
+            yield {**segment, "audio": base64.b64decode(segment["audio"])}
+
+    def transcription_segments(self, path):
+        with open(path, "rb") as audio_file:
+            upload = _encode_file(os.path.basename(path), audio_file.read())
+        response = self._post("/v1/transcribe", {"file": upload, "stream": True}, stream=True)
+        for _, segment in self._events(response):
+            yield segment
+
+
+def _encode_file(name, data):
+    return {"name": name, "data": base64.b64encode(data).decode("ascii")}
+
+
+def _schema_body(schema_ddl, database):
+    body = {"schema": schema_ddl}
+    if database:
+        body["database"] = _encode_file("database.sqlite3", database)
+    return body
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# Function to get the process-wide client of the API at `url`
+def get_client(url, token=""):
+    with _clients_lock:
+        if (url, token) not in _clients:
+            _clients[(url, token)] = RemoteAssistant(url, token)
+        return _clients[(url, token)]
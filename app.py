@@ -1,22 +1,36 @@
 import streamlit as st 
-import ollama
-from PyPDF2 import PdfReader
-from docx import Document
 import pandas as pd
 import tempfile
 import os
-import moviepy.editor as mp
-from deep_translator import GoogleTranslator
-import pptx
-import requests
-from bs4 import BeautifulSoup
 import datetime
-import speech_recognition as sr
-import spacy
-from gtts import gTTS
-import threading
-from transformers import pipeline
+import time
 import base64
+import model_registry
+import llm_streaming
+import queue
+import retrieval
+import extraction_cache
+import document_extraction
+import response_cache
+import ollama_client
+import text_analysis
+import wave
+import io
+import site_crawler
+import media_audio
+import transcription
+import podcast
+import speech
+import telemetry
+import lazy_imports
+import session_memo
+import chat_history
+import spreadsheet
+import assistant
+import api_client
+
+# Heavy libraries are imported the first time a feature uses them, see lazy_imports.py
+sr = lazy_imports.lazy("speech_recognition")
 
 
 
@@ -24,121 +38,318 @@ import base64
 # Function Definitions
 # ---------------------------
 
-# Load SpaCy English model
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    st.error("SpaCy model 'en_core_web_sm' not found. Please run 'python -m spacy download en_core_web_sm' in your terminal.")
-    st.stop()
+# Models are registered with the shared registry by assistant.py; the sidebar shows their status
+registry = model_registry.registry
 
-# Initialize sentiment and emotion analysis pipeline
-sentiment_pipeline = pipeline("sentiment-analysis")
+# Local Ollama model used for chat and Text-to-SQL
+OLLAMA_MODEL = assistant.OLLAMA_MODEL
 
-emotion_pipeline = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", return_all_scores=True)
+# Chat, translation and text analysis run in this process, or on a headless API (api.py) when
+# ASSISTANT_API_URL is set, so the app can run as a thin client of a pool of API workers
+ASSISTANT_API_URL = os.environ.get("ASSISTANT_API_URL", "")
+backend = api_client.get_client(ASSISTANT_API_URL, os.environ.get("API_TOKEN", "")) if ASSISTANT_API_URL else assistant
+
+# Serve pipeline metrics in Prometheus format once per process, with the queues as gauges
+telemetry.start_metrics_server()
+telemetry.metrics.gauge("sm_ollama_queue_depth", lambda: ollama_client.client.stats()["queue_depth"])
+telemetry.metrics.gauge("sm_ollama_running", lambda: ollama_client.client.stats()["running"])
+telemetry.metrics.gauge("sm_speech_queued_replies", lambda: speech.service.stats()["queued_replies"])
+
+# Show the per-stage breakdown of the last request in the sidebar (for developers)
+DEV_MODE = os.environ.get("DEV_MODE", "0") == "1"
 
-# Initialize speech recognition and text-to-speech
-recognizer = sr.Recognizer()
 #engine = pyttsx3.init() 
 
-def llama_chatbot(user_input, context=""):
-    prompt = f"{context}\nUser: {user_input}\nBot:"
-    # Generate the response using the local Ollama model
-    response = ollama.generate(model='llama3.2:3b', prompt=prompt)
-    return response["response"]
+# Function to get this session's memo of values derived from its inputs (see session_memo.py)
+def get_memo():
+    if 'memo' not in st.session_state:
+        st.session_state['memo'] = session_memo.SessionMemo()
+    return st.session_state['memo']
+
+# Function to get this browser session's id. It is kept in the page URL (?session=...), so the
+# chat history is found again after a reload or a server restart.
+def get_session_id():
+    if 'session_id' not in st.session_state:
+        session_id = st.query_params.get("session") or chat_history.new_session_id()
+        st.query_params["session"] = session_id
+        st.session_state['session_id'] = session_id
+    return st.session_state['session_id']
+
+# Function to record a question and answer in the history of `tab`
+def add_history(tab, user, bot):
+    chat_history.store.append(get_session_id(), tab, user, bot)
+
+# Function to show one page of a tab's chat history; the first page holds the newest turns,
+# so each rerun renders at most one page however long the conversation gets
+def show_history(tab, heading="### Chat History:"):
+    session_id = get_session_id()
+    total = chat_history.store.count(session_id, tab)
+    if not total:
+        return
+    if heading:
+        st.markdown("---")
+        st.markdown(heading)
+    page = 1
+    pages = -(-total // chat_history.HISTORY_PAGE_SIZE)
+    if pages > 1:
+        page = st.number_input(f"History page (1 = newest, {pages} pages):", min_value=1, max_value=pages, value=1,
+                               key=f"history_page_{tab}")
+    for turn in chat_history.store.page(session_id, tab, page - 1):
+        st.markdown(f"**You:** {turn.user} ({chat_history.format_time(turn.ts)})")
+        st.markdown(f"**Bot:** {turn.bot}")
+
+# Function to extract several uploaded documents in parallel worker processes, in upload order.
+# A file that fails to parse is reported without stopping the others.
+def extract_documents_segments(uploaded_files):
+    def extract():
+        with telemetry.span("extract_documents", files=len(uploaded_files),
+                            bytes_in=sum(uploaded_file.size for uploaded_file in uploaded_files)) as span:
+            results = document_extraction.extract_documents(
+                [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files],
+                cache=extraction_cache.cache,
+            )
+            span.set(chars_out=sum(len(segment["text"]) for result in results for segment in result["segments"]))
+            return results
+
+    segments = []
+    for result in get_memo().get("extract_documents", session_memo.upload_key(uploaded_files), extract):
+        if result["error"]:
+            st.error(f"Error reading {result['name']}: {result['error']}")
+        segments.extend(result["segments"])
+    return segments
+
+# Character budgets for what each consumer pulls from a document; parsing stops once reached
+PREVIEW_CHARS = 20000
+CONTEXT_CHARS = 16000
+DOCUMENT_CHARS = int(os.environ.get("DOCUMENT_CHAR_BUDGET", "200000"))
+
+# Function to stream the segments of an uploaded file, from the extraction cache when possible
+def stream_segments(uploaded_file):
+    data = uploaded_file.getvalue()
+    segmenter = document_extraction.segmenter_for(uploaded_file.name)
+    if segmenter is None:
+        return iter(())
+    return extraction_cache.cache.iter_or_extract(
+        data, segmenter.__name__, document_extraction.EXTRACTOR_VERSION,
+        lambda: document_extraction.iter_document_segments(uploaded_file.name, data)
+    )
 
-# Function to extract text from uploaded PDFs
-def extract_pdf_text(uploaded_files):
-    text = ""
+# Function to stream the segments of several uploaded files; files that fail to parse are added to `errors`
+def stream_uploaded_segments(uploaded_files, errors):
     for uploaded_file in uploaded_files:
         try:
-            reader_pdf = PdfReader(uploaded_file)
-            for page in reader_pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            yield from stream_segments(uploaded_file)
         except Exception as e:
-            st.error(f"Error reading {uploaded_file.name}: {e}")
+            errors.append(f"Error reading {uploaded_file.name}: {e}")
+
+# Function to extract the text of uploaded files, stopping after `max_chars` characters.
+# The text is reused on reruns until the uploads change.
+def extract_text(uploaded_files, max_chars=None):
+    def extract():
+        with telemetry.span("extract_text", files=len(uploaded_files),
+                            bytes_in=sum(uploaded_file.size for uploaded_file in uploaded_files)) as span:
+            errors = []
+            segments = list(document_extraction.limit_chars(stream_uploaded_segments(uploaded_files, errors), max_chars))
+            text = "".join(segment["text"] + "\n" for segment in segments if segment["text"])
+            # limit_chars stops pulling once the budget is used up, so reaching it means the rest was left out
+            truncated = max_chars is not None and sum(len(segment["text"]) for segment in segments) >= max_chars
+            span.set(chars_out=len(text), truncated=truncated)
+            return text, errors, truncated
+
+    text, errors, truncated = get_memo().get("extract_text", (session_memo.upload_key(uploaded_files), max_chars), extract)
+    for error in errors:
+        st.error(error)
+    if truncated:
+        st.warning(f"⚠️ The document is longer than {max_chars:,} characters, so only its beginning is used. "
+                   "Set DOCUMENT_CHAR_BUDGET to read more.")
     return text
 
+# Function to extract text from uploaded PDFs
+def extract_pdf_text(uploaded_files, max_chars=None):
+    return extract_text(uploaded_files, max_chars)
+
 # Function to extract text from uploaded Word files
-def extract_word_text(uploaded_files):
-    text = ""
-    for uploaded_file in uploaded_files:
-        try:
-            doc = Document(uploaded_file)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        except Exception as e:
-            st.error(f"Error reading {uploaded_file.name}: {e}")
-    return text
+def extract_word_text(uploaded_files, max_chars=None):
+    return extract_text(uploaded_files, max_chars)
 
 # Function to extract text from uploaded PPTX files
-def extract_pptx_text(uploaded_files):
-    text = ""
-    for uploaded_file in uploaded_files:
-        try:
-            prs = pptx.Presentation(uploaded_file)
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-        except Exception as e:
-            st.error(f"Error reading {uploaded_file.name}: {e}")
-    return text
+def extract_pptx_text(uploaded_files, max_chars=None):
+    return extract_text(uploaded_files, max_chars)
 
 # Function to extract text from uploaded Excel files
-def extract_excel_text(uploaded_files):
-    text = ""
-    for uploaded_file in uploaded_files:
-        try:
-            df = pd.read_excel(uploaded_file)
-            text += df.to_string() + "\n"
-        except Exception as e:
-            st.error(f"Error reading {uploaded_file.name}: {e}")
-    return text
+def extract_excel_text(uploaded_files, max_chars=None):
+    return extract_text(uploaded_files, max_chars)
+
+# Function to show the first pages of uploaded files while the rest are still being parsed
+def show_text_preview(label, uploaded_files, height=300):
+    st.markdown(f"**{label}**")
+    preview = st.container(height=height).empty()
+
+    def stream_preview():
+        parts = []
+        errors = []
+        segments = document_extraction.limit_chars(stream_uploaded_segments(uploaded_files, errors), PREVIEW_CHARS)
+        for segment in segments:
+            if segment["text"]:
+                parts.append(segment["text"])
+                preview.text("\n".join(parts))
+        return "\n".join(parts), errors
+
+    # On later reruns the finished preview is shown at once
+    text, errors = get_memo().get("preview", session_memo.upload_key(uploaded_files), stream_preview)
+    preview.text(text)
+    for error in errors:
+        st.error(error)
+
+# Rows shown per page in the spreadsheet row browser
+SHEET_PAGE_ROWS = 100
+
+# Function to profile the uploaded spreadsheets (columns, types, ranges, top values), cached by file content
+def get_spreadsheet_profiles(uploaded_files):
+    def build():
+        spreadsheets = [f for f in uploaded_files if spreadsheet.is_spreadsheet(f.name)]
+        profiles = []
+        with telemetry.span("spreadsheet_profile", files=len(spreadsheets),
+                            bytes_in=sum(f.size for f in spreadsheets)) as span:
+            for uploaded_file in spreadsheets:
+                try:
+                    profiles.append(backend.spreadsheet_profile(uploaded_file.name, uploaded_file.getvalue()))
+                except Exception:
+                    # Unreadable files are already reported by the text extraction
+                    continue
+            span.set(sheets=sum(len(profile["sheets"]) for profile in profiles))
+        return profiles
+
+    return get_memo().get("spreadsheet_profiles", session_memo.upload_key(uploaded_files), build)
+
+# Function to show the spreadsheet summaries and browse their rows a page at a time
+def show_spreadsheets(uploaded_files, profiles):
+    with st.expander("📊 Spreadsheet Summary & Rows"):
+        st.text("\n\n".join(spreadsheet.summary_text(profile) for profile in profiles))
+        sheets = [(profile["source"], sheet) for profile in profiles for sheet in profile["sheets"]]
+        if not sheets:
+            return
+        choice = st.selectbox("Sheet:", range(len(sheets)), format_func=lambda i: f"{sheets[i][0]} · {sheets[i][1]['title']}",
+                              key="sheet_browser")
+        source, sheet = sheets[choice]
+        if not sheet["rows"]:
+            st.caption("This sheet has no rows.")
+            return
+        first_row = st.number_input("First row:", min_value=1, max_value=sheet["rows"], value=1, step=SHEET_PAGE_ROWS,
+                                    key="sheet_first_row")
+        uploaded_file = next(f for f in uploaded_files if f.name == source)
+        # Only the requested page is read from the file, and kept until another page is asked for
+        page = get_memo().get(
+            "sheet_rows", (session_memo.upload_key([uploaded_file]), sheet["title"], first_row),
+            lambda: backend.spreadsheet_rows(source, uploaded_file.getvalue(), sheet["title"],
+                                             first_row - 1, first_row - 1 + SHEET_PAGE_ROWS),
+        )
+        table = pd.DataFrame(page["rows"], columns=page["header"])
+        table.index = range(first_row, first_row + len(table))
+        st.dataframe(table)
+
+# Function to find the chunks of the uploaded documents most relevant to a question, after the summaries
+# of any spreadsheets. Returns {"context", "sources", "errors"}, or None when no text could be read.
+def get_document_context(uploaded_files, question):
+    try:
+        documents = backend.document_context([(f.name, f.getvalue()) for f in uploaded_files], question)
+    except Exception as e:
+        st.error(f"Error processing the documents: {e}")
+        return None
+    for error in documents["errors"]:
+        st.error(error)
+    return documents
 
 # Function to extract text from a website URL
+# (pooled connection, timeout, size cap and conditional revalidation against the page cache)
 def extract_website_text(url):
     try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # Remove script and style elements
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
-        text = ' '.join(soup.stripped_strings)
-        return text
+        page = backend.fetch_website(url)
     except Exception as e:
         st.error(f"Error fetching {url}: {e}")
         return ""
-
-# Function to extract audio from video and save it as a file
+    st.session_state['last_fetch'] = page["report"]
+    return page["text"]
+
+# Function to add pages crawled since the last rerun to the session's website index
+def sync_crawl_index(crawler):
+    index = st.session_state.get('website_index')
+    if index is None or st.session_state.get('website_index_crawler') is not crawler:
+        index = retrieval.VectorIndex(retrieval.default_embedder())
+        st.session_state['website_index'] = index
+        st.session_state['website_index_crawler'] = crawler
+        st.session_state['website_index_pages'] = 0
+    new_pages = crawler.pages_since(st.session_state['website_index_pages'])
+    if new_pages:
+        segments = [{"source": page["url"], "location": "web page", "text": page["text"]} for page in new_pages]
+        index.add(retrieval.chunk_segments(segments))
+        st.session_state['website_index_pages'] += len(new_pages)
+    return index
+
+# Progress of the running crawl, refreshed every 2 seconds without rerunning the whole page
+@st.fragment(run_every=2)
+def show_crawl_progress():
+    crawler = st.session_state.get('crawler')
+    if crawler is None:
+        return
+    status = crawler.status()
+    message = f"🕸️ {status['pages']} pages crawled · {status['queued']} queued · {status['errors']} errors"
+    if status['done']:
+        message += " · done"
+    st.progress(min(status['pages'] / crawler.max_pages, 1.0), text=message)
+    if status['errors']:
+        with st.expander("Crawl errors"):
+            for error_url, error in crawler.errors[-20:]:
+                st.caption(f"{error_url}: {error}")
+
+# Function to extract the audio of a video as a 16 kHz mono WAV file, ready for transcription.
+# The upload is copied to disk in chunks and only the audio track is decoded; the result is
+# kept for the session so reruns do not extract the same video again.
 def extract_audio_from_video(video_file):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_video_file:
-        tmp_video_file.write(video_file.read())
-        tmp_video_file_path = tmp_video_file.name
+    cached = st.session_state.get('video_audio')
+    if cached and cached[0] == video_file.file_id and os.path.exists(cached[1]):
+        return cached[1]
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".aac") as tmp_audio_file:
-        audio_file_path = tmp_audio_file.name
+    progress = st.progress(0.0, text="Copying upload...")
 
-    video = mp.VideoFileClip(tmp_video_file_path)
+    def on_progress(stage, fraction):
+        if stage == "upload":
+            progress.progress(fraction * 0.2, text="Copying upload...")
+        else:
+            progress.progress(0.2 + fraction * 0.8, text=f"Extracting audio... {fraction:.0%}")
 
     try:
-        video.audio.write_audiofile(audio_file_path, codec='aac')
+        audio_file_path = media_audio.video_to_speech_wav(video_file, on_progress=on_progress)
+    except Exception as e:
+        st.error(f"Error extracting audio: {e}")
+        return None
     finally:
-        video.close()
-
-    os.remove(tmp_video_file_path)
+        progress.empty()
 
+    if cached and os.path.exists(cached[1]):
+        os.remove(cached[1])
+    st.session_state['video_audio'] = (video_file.file_id, audio_file_path)
     return audio_file_path
 
 # Function to translate text to a target language
 def translate_text(text, dest_language):
+    return translate_text_multi(text, [dest_language]).get(dest_language, "")
+
+# Function to translate text into several target languages in one pass.
+# Long texts are translated in concurrent sentence-aligned chunks; chunks translated before come from the cache.
+def translate_text_multi(text, dest_languages):
+    progress = st.progress(0.0, text="Translating...")
+
+    def on_progress(done, total, cached):
+        progress.progress(done / total, text=f"Translated {done} of {total} chunks ({cached} from cache)")
+
     try:
-        translated = GoogleTranslator(source='auto', target=dest_language).translate(text)
-        return translated
+        return backend.translate(text, dest_languages, on_progress=on_progress)
     except Exception as e:
         st.error(f"Error translating text: {e}")
-        return ""
+        return {}
+    finally:
+        progress.empty()
 
 # Function to listen to user input via microphone
 def listen_to_user():
@@ -163,82 +374,206 @@ def listen_to_user():
             st.error(f"An error occurred: {e}")
             return None
 
-# Function to convert natural language to SQL using Llama chatbot
-def text_to_sql(query):
-    prompt = f"Convert the following natural language query into an SQL statement:\n\nQuery: {query}\nSQL:"
-    response = ollama.generate(model='llama3.2:3b', prompt=prompt)
-    sql_query = response.get("response", "")
-    return sql_query
-
-
-# Function to generate podcast audio from text
-def generate_podcast_from_text(text):
+# Function to describe an uploaded SQLite database or pasted CREATE statements the way the model sees them.
+# Returns {"summary", "database"}, or None when the schema is invalid.
+def get_sql_schema(uploaded_db=None, ddl=""):
+    def describe():
+        try:
+            return backend.sql_schema(ddl, uploaded_db.getvalue() if uploaded_db else None)
+        except Exception as e:
+            st.error(str(e))
+
+    schema_key = session_memo.upload_key([uploaded_db]) if uploaded_db else session_memo.text_key(ddl.strip())
+    return get_memo().get("sql_schema", schema_key, describe)
+
+# Function to convert natural language to SQL, showing the model's reply as it streams in (one block per
+# attempt when a schema makes it retry). Returns the final event: {"sql", "cached", "metrics", ...}.
+def convert_to_sql(query, ddl="", database=None, run=False):
+    stream = st.session_state.get('stream_responses', True)
+    events = backend.sql_events(query, ddl, database, run=run, stream=stream)
+    if not stream:
+        with st.spinner("Converting to SQL... 🛠️"):
+            return next(event for event in events if event["event"] == "done")
+
+    placeholder = None
+    attempt = 0
+    reply = ""
+    for event in events:
+        if event["event"] == "done":
+            if placeholder is not None:
+                placeholder.code(reply, language='sql')
+            if not event["cached"]:
+                record_llm_metrics("sql", event["metrics"])
+            return event
+        if event["attempt"] != attempt:
+            if placeholder is not None:
+                placeholder.code(reply, language='sql')
+            attempt = event["attempt"]
+            if attempt > 1:
+                st.caption("🔁 SQLite rejected the first attempt, retrying with the error...")
+            placeholder = st.empty()
+            reply = ""
+        reply += event["text"]
+        placeholder.code(reply + "▌", language='sql')
+
+# Function to show a validated statement with its query plan
+def show_sql_result(result):
+    st.success("**SQL Statement:**")
+    st.code(result["sql"], language='sql')
+    if result["error"]:
+        st.error(f"SQLite could not validate the statement after {result['attempts']} attempts: {result['error']}")
+    elif result["attempts"]:
+        st.caption(f"✅ Validated against the schema in {result['attempts']} attempt(s)")
+    if result["plan"]:
+        with st.expander("Query plan"):
+            st.text("\n".join(result["plan"]))
+
+# Function to show the rows and timing of a statement run in the sandbox
+def show_sql_rows(result):
+    if result.get("run_error"):
+        st.error(f"Error running the query: {result['run_error']}")
+        return
+    rows = result["result"]
+    st.dataframe(pd.DataFrame(rows["rows"], columns=rows["columns"]), hide_index=True)
+    limit_note = f" (first {len(rows['rows'])} rows)" if rows["truncated"] else ""
+    st.caption(f"⏱️ {rows['seconds'] * 1000:.1f} ms · {len(rows['rows'])} rows{limit_note}")
+
+
+# Function to generate podcast audio from text.
+# Segments are synthesized in parallel and each finished part is playable right away;
+# returns the path of the stitched podcast and its format.
+def generate_podcast_from_text(text, part_segments=5):
+    progress = st.progress(0.0, text="Generating podcast...")
+    parts = st.container()
+    audio_segments = []
+    part = []
+    audio_format = None
     try:
-        tts = gTTS(text)
-        podcast_path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3").name
-        tts.save(podcast_path)
-        return podcast_path
+        for segment in backend.podcast_segments(text):
+            audio_format = segment["format"]
+            audio_segments.append(segment["audio"])
+            part.append(segment["audio"])
+            progress.progress((segment["index"] + 1) / segment["total"],
+                              text=f"Synthesized {segment['index'] + 1} of {segment['total']} segments")
+            # The first segment is played on its own so listening can start as early as possible
+            if segment["index"] == 0 or len(part) == part_segments or segment["index"] + 1 == segment["total"]:
+                parts.caption(f"Segments {segment['index'] + 2 - len(part)}–{segment['index'] + 1}")
+                parts.audio(podcast.stitch(part, audio_format), format=f"audio/{audio_format}")
+                part = []
     except Exception as e:
         st.error(f"Error generating podcast: {e}")
-        return None
+        return None, None
+    finally:
+        progress.empty()
+    if not audio_segments:
+        return None, None
+
+    podcast_path = tempfile.NamedTemporaryFile(delete=False, suffix=f".{audio_format}").name
+    with open(podcast_path, "wb") as podcast_file:
+        podcast_file.write(podcast.stitch(audio_segments, audio_format))
+    return podcast_path, audio_format
 
 
 # Function to extract text from uploaded audio files
 def transcribe_audio(uploaded_audio):
-    recognizer = sr.Recognizer()
     with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_audio_file:
-        tmp_audio_file.write(uploaded_audio.read())
         audio_path = tmp_audio_file.name
-
     try:
-        with sr.AudioFile(audio_path) as source:
-            audio = recognizer.record(source)
-            text = recognizer.recognize_google(audio)
-            return text
-    except sr.UnknownValueError:
-        st.error("Could not understand the audio.")
-        return ""
-    except sr.RequestError as e:
-        st.error(f"Error with the speech recognition service: {e}")
-        return ""
+        media_audio.save_upload(uploaded_audio, audio_path)
+        return transcribe_audio_file(audio_path)
+    finally:
+        os.remove(audio_path)
+
+# Function to extract text from a WAV file on disk.
+# The recording is transcribed in concurrent chunks and the timestamped transcript fills in as chunks finish.
+def transcribe_audio_file(audio_path):
+    progress = st.progress(0.0, text="Transcribing audio...")
+    live_transcript = st.empty()
+    segments = []
+    try:
+        for segment in backend.transcription_segments(audio_path):
+            segments.append(segment)
+            progress.progress(len(segments) / segment["total"], text=f"Transcribed {len(segments)} of {segment['total']} chunks")
+            live_transcript.text("\n".join(
+                f"[{transcription.format_timestamp(s['start'])}] {s['text']}"
+                for s in sorted(segments, key=lambda s: s["index"]) if s["text"]
+            ))
     except Exception as e:
         st.error(f"An error occurred: {e}")
         return ""
-
+    finally:
+        progress.empty()
+        live_transcript.empty()
+
+    failed = [s for s in segments if s["error"]]
+    if failed:
+        st.error(f"Error with the speech recognition service on {len(failed)} of {len(segments)} chunks: {failed[0]['error']}")
+    text = transcription.join_segments(segments)
+    if not text and not failed:
+        st.error("Could not understand the audio.")
+    return text
 
 # Function to analyze sentiment of text
+# Texts longer than the model's 512-token window are split into sentences and scored in batches
+# Results are reused on reruns until the text changes
 def analyze_sentiment(text):
-    try:
-        result = sentiment_pipeline(text)
-        return result
-    except Exception as e:
-        st.error(f"Error analyzing sentiment: {e}")
+    def analyze():
+        try:
+            return backend.analyze_sentiment(text)
+        except Exception as e:
+            st.error(f"Error analyzing sentiment: {e}")
+
+    return get_memo().get("sentiment", session_memo.text_key(text), analyze)
 
 # Function to analyze emotions in text
 def analyze_emotions(text):
+    def analyze():
+        try:
+            return backend.analyze_emotions(text)
+        except Exception as e:
+            st.error(f"Error analyzing emotions: {e}")
+
+    return get_memo().get("emotion", session_memo.text_key(text), analyze)
+
+# Function to show document-level sentiment and emotion scores, with per-segment details
+# and, for audio, a timeline over the recording
+def show_analysis(sentiment_result, emotion_result, text, title, duration_seconds=None):
+    if not sentiment_result or not emotion_result or not sentiment_result["document"]:
+        return
+    st.subheader(f"Sentiment Analysis {title}:")
+    st.json(sentiment_result["document"])
+
+    st.subheader(f"Emotion Analysis {title}:")
+    st.json(emotion_result["document"])
+
+    if duration_seconds is not None and len(sentiment_result["segments"]) > 1:
+        st.subheader("Sentiment & Emotion Timeline:")
+        timeline = pd.DataFrame(text_analysis.timeline(sentiment_result, emotion_result, len(text), duration_seconds))
+        st.line_chart(timeline.set_index("position"))
+        st.caption("Position in seconds from the start of the recording.")
+
+    with st.expander(f"Per-segment scores ({len(sentiment_result['segments'])} segments)"):
+        st.dataframe(pd.DataFrame([
+            {"segment": sentiment["text"][:120], "sentiment": sentiment["label"],
+             "sentiment_score": round(sentiment["score"], 3), "emotion": emotion["label"]}
+            for sentiment, emotion in zip(sentiment_result["segments"], emotion_result["segments"])
+        ]), hide_index=True)
+
+# Function to get the length of a WAV recording in seconds
+def wav_duration(data):
     try:
-        result = emotion_pipeline(text)
-        return result
-    except Exception as e:
-        st.error(f"Error analyzing emotions: {e}")
+        with wave.open(io.BytesIO(data)) as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError):
+        return None
 
 
+# `text` can also be an iterable of sentences that is still being produced,
+# so playback starts on the first complete sentence of a streamed reply.
+# Replies are spoken one after another by the shared speech service.
 def speak_text(text):
-    def speak():
-        try:
-            # Generate speech using gTTS
-            tts = gTTS(text)
-            # Create a temporary mp3 file to store the speech
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-                tts.save(tmp_file.name)
-                # Use 'mpg321' to play the audio file in the background (for Linux environments)
-                os.system(f"mpg321 {tmp_file.name}")
-        except Exception as e:
-            print(f"Error: {e}")
-    
-    # Run the speak function in a separate thread to avoid blocking
-    thread = threading.Thread(target=speak)
-    thread.start()
+    if not speech.service.say(text):
+        st.warning("🔇 Too many replies are waiting to be spoken; this one was skipped.")
 
 
 # Function to recognize speech using the microphone
@@ -257,12 +592,92 @@ def recognize_speech():
             st.error(f"Error with the speech recognition service: {e}")
             return None
 
-def set_background(image_file_path):
-    global encoded_image  # Declare encoded_image as global to use it outside the function
-    # Open the image file
-    with open(image_file_path, "rb") as image_file:
-        # Convert the image to base64 encoding
-        encoded_image = base64.b64encode(image_file.read()).decode()
+# Function to render a token stream into a placeholder as it arrives
+def render_stream(tokens, render):
+    placeholder = st.empty()
+    placeholder.markdown("Thinking... 🤔")
+    response = ""
+    for token in tokens:
+        response += token
+        render(placeholder, response + "▌")
+    render(placeholder, response)
+    return response
+
+# Function to keep timing metrics of the last LLM requests and show them under the response
+def record_llm_metrics(tab, metrics):
+    st.session_state['llm_metrics'].append({
+        "tab": tab,
+        "time_to_first_token": metrics.get("time_to_first_token"),
+        "tokens_per_second": metrics.get("tokens_per_second"),
+        "eval_tokens": metrics.get("eval_tokens"),
+        "total_seconds": metrics.get("total_seconds"),
+    })
+    del st.session_state['llm_metrics'][:-50]
+    if metrics.get("time_to_first_token") is not None:
+        st.caption(f"⏱️ First token in {metrics['time_to_first_token']:.2f}s · {metrics['tokens_per_second']:.1f} tokens/s")
+
+# Function to note under a response that it came from the response cache
+def show_cache_hit(cached):
+    if cached["match"] == "semantic":
+        st.caption(f"⚡ Answered from cache (similar question, similarity {cached['similarity']:.2f})")
+    else:
+        st.caption("⚡ Answered from cache")
+
+# Function to answer a chat message, streaming the reply when streaming mode is on
+def respond(tab, user_input, context="", speak=False):
+    # The response cache and the conversation memory are kept by the backend
+    stream = st.session_state.get('stream_responses', True)
+    events = backend.answer_events(get_session_id(), tab, user_input, context, stream=stream)
+    if stream:
+        first = next(events)
+    else:
+        with st.spinner("Thinking... 🤔"):
+            first = next(events)
+    if first["event"] == "done":
+        bot_response = first["response"]
+        st.markdown(f"**Bot:** {bot_response}")
+        if first["cached"]:
+            show_cache_hit(first["cached"])
+        if speak:
+            speak_text(bot_response)
+        return bot_response
+
+    done = {}
+    def stream_tokens():
+        yield first["text"]
+        for event in events:
+            if event["event"] == "token":
+                yield event["text"]
+            else:
+                done.update(event)
+
+    tokens = stream_tokens()
+    if speak:
+        # Hand each finished sentence to the speech thread while the rest is generated
+        sentence_queue = queue.Queue()
+        speak_text(iter(sentence_queue.get, None))
+        tokens = llm_streaming.iter_with_sentences(tokens, sentence_queue.put)
+    try:
+        bot_response = render_stream(tokens, lambda placeholder, text: placeholder.markdown(f"**Bot:** {text}"))
+    finally:
+        if speak:
+            sentence_queue.put(None)
+    record_llm_metrics(tab, done.get("metrics", {}))
+    return bot_response
+
+# Function to get the CSS url of the background image. With static serving (.streamlit/config.toml)
+# the browser downloads and caches static/<name> once; otherwise the image is inlined, encoded once per process.
+def set_background(image_name):
+    global background_url  # Declare background_url as global to use it outside the function
+    if st.get_option("server.enableStaticServing"):
+        background_url = f"app/static/{image_name}"
+    else:
+        background_url = f"data:image/jpeg;base64,{encode_background(image_name)}"
+
+@st.cache_resource
+def encode_background(image_name):
+    with open(os.path.join("static", image_name), "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode()
 
 # ---------------------------
 # Streamlit App Layout
@@ -278,11 +693,17 @@ if 'user_input' not in st.session_state:
 # Configure the Streamlit page
 st.set_page_config(page_title="🤖 SM Business Chatbot", page_icon="💬", layout="wide")
 
-# Initialize session state for chat history and user activity
-if 'history' not in st.session_state:
-    st.session_state['history'] = []
+# Every pipeline stage run during this rerun is recorded in one trace, and the whole script is timed
+rerun_started = time.perf_counter()
+telemetry.begin_trace("rerun")
+
+# Initialize session state for user activity
 if 'activity' not in st.session_state:
     st.session_state['activity'] = []
+if 'llm_metrics' not in st.session_state:
+    st.session_state['llm_metrics'] = []
+if 'rerun_seconds' not in st.session_state:
+    st.session_state['rerun_seconds'] = []
 
 with st.sidebar:
     # Set the background image
@@ -313,7 +734,7 @@ with st.sidebar:
         <style>
         /* Apply background, black text, and bold font to the main content area */
         .stApp {{
-            background-image: url("data:image/jpeg;base64,{encoded_image}");
+            background-image: url("{background_url}");
             background-size: cover;  /* Cover will adapt to screen size */
             background-position: center;
             background-attachment: fixed; /* Fixed background for a parallax effect */
@@ -423,13 +844,89 @@ with st.sidebar:
         # Display the image in the sidebar
         st.image("ai.jpeg", use_column_width=True)  # Adjust the size to fit the sidebar
 
+        # Load time and resident memory of each model
+        with st.expander("🧠 Model Status"):
+            st.dataframe(pd.DataFrame(registry.stats()), hide_index=True)
+
+        # Hit/miss counters of the document extraction cache
+        with st.expander("🗂️ Extraction Cache"):
+            st.json(extraction_cache.cache.stats())
+
+        # Per-tab hit rates of the LLM response cache and the generation time they saved
+        with st.expander("⚡ Response Cache"):
+            st.dataframe(pd.DataFrame(response_cache.cache.stats()), hide_index=True)
+
+        # Generations waiting for the shared Ollama client and how long they waited
+        with st.expander("🦙 Ollama Queue"):
+            st.json(ollama_client.client.stats())
+
+        with st.expander("🔊 Speech Output"):
+            st.json(speech.service.stats())
+            if st.button("Stop Speaking 🔇"):
+                speech.service.stop()
+
+        # Search this session's saved conversations and download them
+        with st.expander("🗒️ Chat History"):
+            history_query = st.text_input("Search history:", key="history_query")
+            if history_query.strip():
+                matches = chat_history.store.search(get_session_id(), history_query.strip(), limit=20)
+                if not matches:
+                    st.caption("No matching messages.")
+                for turn in matches:
+                    st.markdown(f"**[{turn.tab}] You:** {turn.user}")
+                    st.caption(f"{chat_history.format_time(turn.ts)} · {turn.bot[:200]}")
+            export_format = st.radio("Export as:", ("markdown", "json"), horizontal=True, key="history_export_format")
+            # The export is only built when asked for, so reruns do not read the whole history
+            if st.button("Prepare Export 📦", key="history_export"):
+                st.download_button(
+                    "Download History ⬇️",
+                    chat_history.store.export(get_session_id(), export_format=export_format),
+                    file_name=f"chat_history.{'md' if export_format == 'markdown' else 'json'}",
+                    mime="text/markdown" if export_format == "markdown" else "application/json",
+                )
+
+        # Libraries imported since the worker started, what triggered them and what they cost
+        with st.expander("⏱️ Import Profile"):
+            import_profile = lazy_imports.profile()
+            if import_profile:
+                st.dataframe(pd.DataFrame(import_profile), hide_index=True)
+            else:
+                st.caption("No heavy library imported yet.")
+
+        # Script execution time of this session's recent reruns and how often derived values were reused
+        with st.expander("⏱️ Rerun Timing"):
+            recent_reruns = st.session_state['rerun_seconds']
+            if recent_reruns:
+                st.json({
+                    "last_ms": round(recent_reruns[-1] * 1000, 1),
+                    "p50_ms": round(telemetry.percentile(recent_reruns, 0.5) * 1000, 1),
+                    "p95_ms": round(telemetry.percentile(recent_reruns, 0.95) * 1000, 1),
+                    "reruns": len(recent_reruns),
+                    "memo": get_memo().stats(),
+                })
+            else:
+                st.caption("No rerun finished yet.")
+
+        # Time spent in each stage of the last request that did any work
+        if DEV_MODE:
+            with st.expander("🛠️ Last Request Breakdown"):
+                last_trace = st.session_state.get('last_trace')
+                if last_trace:
+                    st.caption(f"Trace {last_trace.id} · {datetime.datetime.fromtimestamp(last_trace.started):%H:%M:%S}")
+                    st.dataframe(pd.DataFrame(last_trace.spans).drop(columns=["ts", "trace_id", "trace"]), hide_index=True)
+                else:
+                    st.caption("No request traced yet.")
+
+        # Show responses token by token instead of waiting for the full reply
+        st.toggle("⚡ Stream responses", value=True, key="stream_responses")
+
     st.title("🤖💼 SM Business & Research Assistant")
     st.markdown(""" 
     Welcome to the **SM Business & Research Assistant**! Empower your business operations and research activities by seamlessly interacting with documents, websites, videos, and more. 🚀
 
     ### 📌 Features:
     - **💬 Chat with AI-BOT:** Ask any questions and receive instant, AI-powered responses.
-    - **📄 Chat with Documents:** Upload PDF, Word, PPTX, or Excel documents and get insights.
+    - **📄 Chat with Documents:** Upload PDF, Word, PPTX, Excel or CSV documents and get insights.
     - **🌐 Web Content Analyzer:** Input website URLs to fetch and interact with their content.
     - **📹 Video to Audio Extraction:** Upload video files, extract audio, and ask questions about the content.
     - **🎙️ Podcast Generator:** Turn your PDF documents into audio podcasts for easy consumption.
@@ -461,7 +958,7 @@ if st.checkbox("View Voice Command Guide 🛠️"):
     ### **1. General Commands**
     These commands can be used across multiple tabs to perform common actions:
     
-    - **"Upload file"**: Opens the file uploader so you can upload files (PDFs, DOCX, PPTX, Excel).
+    - **"Upload file"**: Opens the file uploader so you can upload files (PDFs, DOCX, PPTX, Excel, CSV).
     - **"Analyze"**: Starts analyzing the content of an uploaded file or document.
     - **"Switch tab"**: Switches between different tabs in the app, e.g., moving from 'Chat with AI-BOT' to 'Chat with Documents'.
     - **"Translate to [language]"**: Translates text or documents to a target language (e.g., "Translate to Spanish").
@@ -478,7 +975,7 @@ if st.checkbox("View Voice Command Guide 🛠️"):
     
     #### 📄 **Tab: Chat with Documents**
     - **Command**: "Upload file" followed by "Analyze" or ask a specific question related to the document content.
-    - **Task**: Upload PDF, DOCX, PPTX, or Excel files and ask the AI to analyze or answer questions about the document’s content.
+    - **Task**: Upload PDF, DOCX, PPTX, Excel or CSV files and ask the AI to analyze or answer questions about the document’s content.
 
     #### 🌐 **Tab: Chat with Websites**
     - **Command**: "Fetch website" followed by a URL and "Analyze" or ask a question about the website’s content.
@@ -556,16 +1053,17 @@ with tab1:
     st.title("🤖💬 Chat with AI Bot")
 
     # Display chat history only in this tab
-    if st.session_state['history']:
-        for chat in st.session_state['history']:
-            st.markdown(f"**You:** {chat['user']} ({chat['timestamp']})")
-            st.markdown(f"**Bot:** {chat['bot']}")
+    show_history("chat", heading=None)
 
     st.markdown("---")
 
     # Initialize user input
     user_input = ""
 
+    # Forget what the bot remembers of this conversation
+    if st.button("New Conversation 🧹", key="new_conversation"):
+        backend.clear_conversation(get_session_id(), "chat")
+
     # Radio button to choose input method (Only visible in this tab)
     input_method = st.radio("Choose input method:", ("Text", "Voice"))
 
@@ -575,16 +1073,8 @@ with tab1:
 
         if user_input:
             if user_input.strip() != "":
-                with st.spinner("Thinking... 🤔"):
-                    bot_response = llama_chatbot(user_input)
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    st.session_state['history'].append({
-                        "user": user_input,
-                        "bot": bot_response,
-                        "timestamp": timestamp
-                    })
-                st.markdown(f"**Bot:** {bot_response}")
-                speak_text(bot_response)
+                bot_response = respond("chat", user_input, speak=True)
+                add_history("chat", user_input, bot_response)
             else:
                 st.warning("⚠️ Please enter a message.")
 
@@ -592,16 +1082,8 @@ with tab1:
         if st.button("Speak 🎤", key="speak_button_tab_0"):
             user_input = recognize_speech()  
             if user_input:
-                with st.spinner("Thinking... 🤔"):
-                    bot_response = llama_chatbot(user_input)
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    st.session_state['history'].append({
-                        "user": user_input,
-                        "bot": bot_response,
-                        "timestamp": timestamp
-                    })
-                st.markdown(f"**Bot:** {bot_response}")
-                speak_text(bot_response)
+                bot_response = respond("chat", user_input, speak=True)
+                add_history("chat", user_input, bot_response)
 
 # ---------------------------
 # Tab 2: Chat with Documents
@@ -611,62 +1093,45 @@ with tab2:
 
     st.markdown(""" 
     ### 📚 Upload Your Documents
-    - Click on the **"Browse files"** button to upload PDF, Word, PPTX, or Excel documents.
+    - Click on the **"Browse files"** button to upload PDF, Word, PPTX, Excel or CSV documents.
     - After uploading, you'll be able to ask questions about the document content using the AI-BOT.
     """)
 
-    uploaded_files = st.file_uploader("Upload Documents", type=["pdf", "docx", "pptx", "xlsx"], accept_multiple_files=True)
+    uploaded_files = st.file_uploader("Upload Documents", type=["pdf", "docx", "pptx", "xlsx", "csv"], accept_multiple_files=True)
 
     # Check if files are uploaded
     if uploaded_files:
-        text = ""
-        with st.spinner("Processing documents... 📄"):
-            for uploaded_file in uploaded_files:
-                if uploaded_file.name.endswith(".pdf"):
-                    text += extract_pdf_text([uploaded_file])
-                elif uploaded_file.name.endswith(".docx"):
-                    text += extract_word_text([uploaded_file])
-                elif uploaded_file.name.endswith(".pptx"):
-                    text += extract_pptx_text([uploaded_file])
-                elif uploaded_file.name.endswith(".xlsx"):
-                    text += extract_excel_text([uploaded_file])
-
-        if text:
-            st.success("📄 Documents processed successfully!")
-            st.text_area("Extracted Text:", text, height=300)
-
-            # Ask questions about the document content
-            user_input_doc = st.text_input("Ask questions about the document content:", placeholder="Type your question here...")
-
-            if st.button("Ask 📥", key="document_ask"):
-                if user_input_doc.strip():
-                    with st.spinner("Thinking... 🤔"):
-                        # Using the document's text as context for the chatbot
-                        bot_response_doc = llama_chatbot(user_input_doc, context=text)
-                        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        
-                        # Store the conversation history for display
-                        if 'history' not in st.session_state:
-                            st.session_state['history'] = []
-                            
-                        st.session_state['history'].append({
-                            "user": user_input_doc,
-                            "bot": bot_response_doc,
-                            "timestamp": timestamp
-                        })
-                        
-                        # Display bot response
-                        st.markdown(f"**Bot:** {bot_response_doc}")
-                else:
-                    st.warning("⚠️ Please enter a question before clicking 'Ask'.")
+        # The first pages show up while the full documents are extracted in parallel
+        show_text_preview("Extracted Text:", uploaded_files)
+
+        # Spreadsheets are described by a compact per-sheet summary instead of their full text
+        spreadsheet_profiles = get_spreadsheet_profiles(uploaded_files)
+        if spreadsheet_profiles:
+            show_spreadsheets(uploaded_files, spreadsheet_profiles)
+
+        # Ask questions about the document content
+        user_input_doc = st.text_input("Ask questions about the document content:", placeholder="Type your question here...")
+
+        if st.button("Ask 📥", key="document_ask"):
+            if user_input_doc.strip():
+                # Only the chunks most relevant to the question are used as context,
+                # after the summaries of any spreadsheets
+                with st.spinner("Processing documents... 📄"):
+                    documents = get_document_context(uploaded_files, user_input_doc)
+                if documents:
+                    bot_response_doc = respond("documents", user_input_doc, context=documents["context"])
+                    with st.expander("📚 Sources"):
+                        for number, source in enumerate(documents["sources"], start=1):
+                            st.markdown(f"**[{number}] {source['source']}** (similarity {source['similarity']:.2f})")
+                            st.caption(source["text"])
+
+                    # Store the conversation history for display
+                    add_history("documents", user_input_doc, bot_response_doc)
+            else:
+                st.warning("⚠️ Please enter a question before clicking 'Ask'.")
 
-            # Display chat history related to documents
-            if 'history' in st.session_state and st.session_state['history']:
-                st.markdown("---")
-                st.markdown("### Chat History:")
-                for chat in st.session_state['history']:
-                    st.markdown(f"**You:** {chat['user']} ({chat['timestamp']})")
-                    st.markdown(f"**Bot:** {chat['bot']}")
+        # Display chat history related to documents
+        show_history("documents")
 
 
 # ---------------------------
@@ -681,25 +1146,54 @@ with tab3:
     - After fetching, you can ask questions about the website content using the AI-BOT.
     """)
 
+    # Fetch a single page, or crawl a whole site from a seed page or sitemap
+    website_mode = st.radio("Mode:", ("Single page", "Crawl site"), horizontal=True, key="website_mode")
+
     # Input field for website URL
     url = st.text_input("Enter the website URL:", placeholder="https://example.com")
 
-    # Initialize session state for website content and chat history
+    # Initialize session state for website content
     if 'website_text' not in st.session_state:
         st.session_state['website_text'] = ""
-    if 'website_history' not in st.session_state:
-        st.session_state['website_history'] = []
 
-    if st.button("Fetch Website Content 🕵️‍♂️", key="fetch_website"):
+    if website_mode == "Crawl site":
+        crawl_depth = st.number_input("Link depth:", min_value=0, max_value=5, value=2)
+        crawl_limit = st.number_input("Page limit:", min_value=1, max_value=500, value=50)
+        if st.button("Start Crawl 🕸️", key="start_crawl"):
+            if url:
+                if st.session_state.get('crawler'):
+                    st.session_state['crawler'].stop()
+                st.session_state['crawler'] = site_crawler.SiteCrawler(url, max_depth=crawl_depth, max_pages=crawl_limit).start()
+                # Each crawl starts a new conversation; the history of earlier ones stays in the store
+                st.session_state['crawl_tab'] = f"websites crawl {chat_history.format_time(time.time())}"
+            else:
+                st.warning("⚠️ Please enter a URL.")
+
+    website_ready = website_mode == "Single page" and bool(st.session_state['website_text'])
+    website_tab = st.session_state.get('crawl_tab', "websites") if website_mode == "Crawl site" else "websites"
+    if website_mode == "Crawl site" and st.session_state.get('crawler'):
+        show_crawl_progress()
+        # Pages crawled so far can be asked about while the crawl continues
+        website_index = sync_crawl_index(st.session_state['crawler'])
+        website_ready = len(website_index) > 0
+
+    if website_mode == "Single page" and st.button("Fetch Website Content 🕵️‍♂️", key="fetch_website"):
         if url:
             # Extract website content
             website_text = extract_website_text(url)
             if website_text:
                 st.success("🌐 Website content fetched successfully!")
+                report = st.session_state['last_fetch']
+                st.caption(
+                    f"⏱️ Fetch {report['fetch_seconds']:.2f}s · parse {report['parse_seconds']:.2f}s · "
+                    f"{report['bytes'] / 1024:.0f} KB · cache: {report['cache']}"
+                    + (" · truncated at the size limit" if report['truncated'] else "")
+                )
                 st.text_area("Website Content:", website_text, height=300)
                 
                 # Store website text in session state
                 st.session_state['website_text'] = website_text
+                website_ready = True
 
             else:
                 st.warning("⚠️ Failed to fetch content from the URL. Please check the URL or try a different one.")
@@ -707,35 +1201,29 @@ with tab3:
             st.warning("⚠️ Please enter a URL.")
 
     # Ask questions about the website content
-    if st.session_state['website_text']:
+    if website_ready:
         user_input_web = st.text_input("Ask questions about the website content:", placeholder="Type your question here...")
 
         if st.button("Ask 📥", key="website_ask"):
             if user_input_web.strip():
-                with st.spinner("Thinking... 🤔"):
+                if website_mode == "Crawl site":
+                    # Only the crawled chunks most relevant to the question are used as context
+                    results = website_index.search(user_input_web, k=4)
+                    bot_response_web = respond(website_tab, user_input_web, context=retrieval.build_context(results))
+                    with st.expander("📚 Sources"):
+                        for number, (score, chunk) in enumerate(results, start=1):
+                            st.markdown(f"**[{number}]** {chunk['source']} (similarity {score:.2f})")
+                else:
                     # Using the website content as context for the chatbot
-                    bot_response_web = llama_chatbot(user_input_web, context=st.session_state['website_text'])
-                    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    # Store the conversation history for display
-                    st.session_state['website_history'].append({
-                        "user": user_input_web,
-                        "bot": bot_response_web,
-                        "timestamp": timestamp
-                    })
-                    
-                    # Display bot response
-                    st.markdown(f"**Bot:** {bot_response_web}")
+                    bot_response_web = respond(website_tab, user_input_web, context=st.session_state['website_text'])
+
+                # Store the conversation history for display
+                add_history(website_tab, user_input_web, bot_response_web)
             else:
                 st.warning("⚠️ Please enter a question before clicking 'Ask'.")
 
         # Display chat history related to websites
-        if st.session_state['website_history']:
-            st.markdown("---")
-            st.markdown("### Chat History:")
-            for chat in st.session_state['website_history']:
-                st.markdown(f"**You:** {chat['user']} ({chat['timestamp']})")
-                st.markdown(f"**Bot:** {chat['bot']}")
+        show_history(website_tab)
 
 
 # ---------------------------
@@ -760,22 +1248,35 @@ with tab4:
         st.subheader("📹 Chat with Video")
         uploaded_video = st.file_uploader("Upload Video File", type=["mp4", "avi", "mov"])
 
-        if uploaded_video:
-            with st.spinner("Extracting audio... 🎧"):
-                audio_file_path = extract_audio_from_video(uploaded_video)
-                st.success("🎧 Audio extracted from video successfully!")
-                st.audio(audio_file_path, format='audio/aac')
+        audio_file_path = extract_audio_from_video(uploaded_video) if uploaded_video else None
+        if audio_file_path:
+            st.success("🎧 Audio extracted from video successfully!")
+            st.audio(audio_file_path, format='audio/wav')
 
             st.markdown("### Ask questions about the audio content from the video:")
             user_input_video = st.text_input("Your Question (Video):", placeholder="Type your question here...")
 
             if st.button("Ask Video 📥"):
                 if user_input_video.strip():
-                    # Placeholder for actual audio transcription logic (optional)
-                    st.warning("Audio transcription is not implemented yet.")
+                    # The transcript is kept with the extracted audio so follow-up questions reuse it
+                    transcript = st.session_state.get('video_transcript')
+                    if not transcript or transcript[0] != audio_file_path:
+                        with st.spinner("Transcribing audio... 🎙️"):
+                            transcript = (audio_file_path, transcribe_audio_file(audio_file_path))
+                        st.session_state['video_transcript'] = transcript
+                    if transcript[1]:
+                        with st.expander("Transcript"):
+                            st.write(transcript[1])
+                        bot_response_video = respond("video", user_input_video, context=transcript[1])
+
+                        # Store the conversation history for display
+                        add_history("video", user_input_video, bot_response_video)
                 else:
                     st.warning("⚠️ Please enter a question.")
 
+            # Display chat history related to the video
+            show_history("video")
+
     # ---------------------------
     # Sub-tab 2: Chat with Audio
     # ---------------------------
@@ -785,36 +1286,37 @@ with tab4:
 
         if uploaded_audio:
             with st.spinner("Transcribing audio... 🎙️"):
-                audio_text = transcribe_audio(uploaded_audio)
-                if audio_text:
-                    st.success("🎙️ Audio transcribed successfully!")
-                    st.text_area("Transcribed Audio Text:", audio_text, height=200)
+                # Keep the transcript for the session so reruns do not transcribe the same recording again
+                cached_transcript = st.session_state.get('audio_transcript')
+                if cached_transcript and cached_transcript[0] == uploaded_audio.file_id:
+                    audio_text = cached_transcript[1]
+                else:
+                    audio_text = transcribe_audio(uploaded_audio)
+                    st.session_state['audio_transcript'] = (uploaded_audio.file_id, audio_text)
+            if audio_text:
+                st.success("🎙️ Audio transcribed successfully!")
+                st.text_area("Transcribed Audio Text:", audio_text, height=200)
 
-                    # Analyze sentiment and emotions for the transcribed audio
+                # Analyze sentiment and emotions for the transcribed audio
                 if st.button("Analyze Sentiment and Emotions"):
                     sentiment_result = analyze_sentiment(audio_text)
                     emotion_result = analyze_emotions(audio_text)
-                    
-                    st.subheader("Sentiment Analysis of Audio:")
-                    st.json(sentiment_result)
-                    
-                    st.subheader("Emotion Analysis of Audio:")
-                    st.json(emotion_result)
-
+                    show_analysis(sentiment_result, emotion_result, audio_text, "of Audio", duration_seconds=wav_duration(uploaded_audio.getvalue()))
 
+                # Questions can be asked without running the analysis first
+                user_input_audio = st.text_input("Ask questions about the audio content:", placeholder="Type your question here...")
 
-                    user_input_audio = st.text_input("Ask questions about the audio content:", placeholder="Type your question here...")
+                if st.button("Ask Audio 📥"):
+                    if user_input_audio.strip():
+                        bot_response_audio = respond("audio", user_input_audio, context=audio_text)
 
-                    if st.button("Ask Audio 📥"):
-                        if user_input_audio.strip():
-                            with st.spinner("Thinking... 🤔"):
-                                bot_response_audio = llama_chatbot(user_input_audio, context=audio_text)
-                                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        # Store the conversation history for display
+                        add_history("audio", user_input_audio, bot_response_audio)
+                    else:
+                        st.warning("⚠️ Please enter a question before clicking 'Ask'.")
 
-                                # Display bot response
-                                st.markdown(f"**Bot:** {bot_response_audio}")
-                        else:
-                            st.warning("⚠️ Please enter a question before clicking 'Ask'.")
+                # Display chat history related to the audio
+                show_history("audio")
 
 
 # ---------------------------
@@ -833,15 +1335,16 @@ with tab5:
 
     if uploaded_pdf_podcast:
         with st.spinner("Extracting text from PDF... 📄"):
-            pdf_text = extract_pdf_text([uploaded_pdf_podcast])
+            pdf_text = extract_pdf_text([uploaded_pdf_podcast], max_chars=DOCUMENT_CHARS)
             if pdf_text:
                 st.success("📄 PDF text extracted successfully!")
 
                 if st.button("Generate Podcast 🎙️"):
                     with st.spinner("Generating podcast... 🎧"):
-                        podcast_path = generate_podcast_from_text(pdf_text)
+                        podcast_path, podcast_format = generate_podcast_from_text(pdf_text)
                         if podcast_path:
-                            st.audio(podcast_path, format="audio/mp3")
+                            st.markdown("**Full podcast:**")
+                            st.audio(podcast_path, format=f"audio/{podcast_format}")
                             st.success("🎙️ Podcast generated successfully!")
                         else:
                             st.error("Failed to generate podcast.")
@@ -868,22 +1371,26 @@ with tab6:
 
     # Language selection
     languages = ["en", "hi", "es", "fr", "de", "bn", "ta", "te"]  # Add more languages as needed
-    target_language = st.selectbox("Select target language:", languages)
+    target_languages = st.multiselect("Select target languages:", languages, default=["hi"])
 
     # Button to perform translation
     if st.button("Translate 🌐"):
         # If the user uploads a PDF, extract text from it
         if uploaded_pdf_translator:
             with st.spinner("Extracting text from PDF... 📄"):
-                extracted_text = extract_pdf_text([uploaded_pdf_translator])  # Use your existing function
+                extracted_text = extract_pdf_text([uploaded_pdf_translator], max_chars=DOCUMENT_CHARS)  # Use your existing function
                 translation_input = extracted_text  # Use the extracted text for translation
 
         # Perform translation if there's text to translate
-        if translation_input:
+        if not target_languages:
+            st.warning("⚠️ Please select at least one target language.")
+        elif translation_input:
             with st.spinner("Translating... 🌏"):
-                translated_text = translate_text(translation_input, target_language)
-                st.success("**Translated Text:**")
-                st.text_area("", translated_text, height=300)
+                translations = translate_text_multi(translation_input, target_languages)
+                if translations:
+                    st.success("**Translated Text:**")
+                    for language, translated_text in translations.items():
+                        st.text_area(f"Translated Text ({language}):", translated_text, height=300)
         else:
             st.warning("⚠️ Please enter text to translate or upload a document.")
 
@@ -900,18 +1407,63 @@ with tab7:
     - **Example**: "Show me all users from the users table where age is greater than 30."
     """)
 
+    # Optional schema: generated SQL is then checked against it before it is shown
+    schema_source = st.radio("Schema:", ["None", "Upload SQLite database", "Paste CREATE statements"], horizontal=True)
+    schema_ddl = ""
+    schema_database = None
+    sql_schema = None
+    if schema_source == "Upload SQLite database":
+        uploaded_db = st.file_uploader("Upload SQLite database", type=["db", "sqlite", "sqlite3"])
+        if uploaded_db:
+            sql_schema = get_sql_schema(uploaded_db=uploaded_db)
+            schema_database = uploaded_db.getvalue()
+    elif schema_source == "Paste CREATE statements":
+        schema_ddl = st.text_area("CREATE TABLE statements:", "", height=150)
+        if schema_ddl.strip():
+            sql_schema = get_sql_schema(ddl=schema_ddl)
+    if sql_schema:
+        with st.expander("Schema summary sent to the model"):
+            st.code(sql_schema["summary"] or "(no tables)")
+        run_query = st.checkbox("Run the query on the sandbox (read-only, limited rows and time)",
+                                value=sql_schema["database"])
+
     # Text input for SQL query
     user_query = st.text_area("Enter your query:", "")
 
     if st.button("Convert to SQL 🛠️"):
-        if user_query:
-            with st.spinner("Converting to SQL... 🛠️"):
-                sql_result = text_to_sql(user_query)
-                if sql_result:
-                    st.success("**SQL Statement:**")
-                    st.code(sql_result, language='sql')
-                else:
-                    st.error("Failed to convert the query to SQL.")
+        if user_query and sql_schema:
+            # The model's raw attempts are shown in a collapsible status box, the validated statement below it
+            result = None
+            try:
+                with st.status("Generating SQL... 🛠️", expanded=True) as status:
+                    result = convert_to_sql(user_query, schema_ddl, schema_database, run=run_query)
+                    label = f"Generated SQL in {result['attempts']} attempt(s)" if result["attempts"] else "SQL from cache"
+                    status.update(label=label, state="error" if result["error"] else "complete", expanded=False)
+            except Exception as e:
+                st.error(f"Error converting the query to SQL: {e}")
+            if result and result["sql"]:
+                show_sql_result(result)
+                if result["cached"]:
+                    show_cache_hit(result["cached"])
+                if run_query and not result["error"]:
+                    show_sql_rows(result)
+            elif result:
+                st.error("Failed to convert the query to SQL.")
+        elif user_query:
+            st.success("**SQL Statement:**")
+            result = None
+            try:
+                result = convert_to_sql(user_query)
+            except Exception as e:
+                st.error(f"Error converting the query to SQL: {e}")
+            if result and result["sql"]:
+                # A streamed statement is already on the page
+                if result["cached"] or not st.session_state.get('stream_responses', True):
+                    st.code(result["sql"], language='sql')
+                if result["cached"]:
+                    show_cache_hit(result["cached"])
+            elif result:
+                st.error("Failed to convert the query to SQL.")
         else:
             st.warning("⚠️ Please enter a query.")
 
@@ -929,43 +1481,29 @@ with tab8:
     uploaded_research_files = st.file_uploader("Upload Research Documents (PDF, DOCX)", type=["pdf", "docx"], accept_multiple_files=True)
 
     if uploaded_research_files:
-        research_text = ""
+        show_text_preview("Extracted Research Text:", uploaded_research_files)
         with st.spinner("Processing research documents... 📄"):
-            for uploaded_file in uploaded_research_files:
-                if uploaded_file.name.endswith(".pdf"):
-                    research_text += extract_pdf_text([uploaded_file])
-                elif uploaded_file.name.endswith(".docx"):
-                    research_text += extract_word_text([uploaded_file])
+            research_segments = extract_documents_segments(uploaded_research_files)
+            # Only the first CONTEXT_CHARS characters are sent to the chatbot
+            research_text = "".join(
+                segment["text"] + "\n"
+                for segment in document_extraction.limit_chars(research_segments, CONTEXT_CHARS)
+            )
 
         if research_text:
             st.success("📄 Research documents processed successfully!")
-            st.text_area("Extracted Research Text:", research_text, height=300)
 
             user_input_research = st.text_input("Ask questions about your research:", placeholder="Type your question here...")
 
             if st.button("Ask Research 📥"):
                 if user_input_research.strip():
-                    with st.spinner("Thinking... 🤔"):
-                        bot_response_research = llama_chatbot(user_input_research, context=research_text)
-                        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        
-                        st.session_state['history'].append({
-                            "user": user_input_research,
-                            "bot": bot_response_research,
-                            "timestamp": timestamp
-                        })
-                        
-                        st.markdown(f"**Bot:** {bot_response_research}")
+                    bot_response_research = respond("research", user_input_research, context=research_text)
+                    add_history("research", user_input_research, bot_response_research)
                 else:
                     st.warning("⚠️ Please enter a question before clicking 'Ask'.")
 
             # Display chat history related to research
-            if 'history' in st.session_state and st.session_state['history']:
-                st.markdown("---")
-                st.markdown("### Chat History:")
-                for chat in st.session_state['history']:
-                    st.markdown(f"**You:** {chat['user']} ({chat['timestamp']})")
-                    st.markdown(f"**Bot:** {chat['bot']}")
+            show_history("research")
         else:
             st.warning("⚠️ No text extracted from the uploaded documents. Please check the files.")
 
@@ -981,11 +1519,16 @@ with tab9:
     if text_input:
         sentiment_result = analyze_sentiment(text_input)
         emotion_result = analyze_emotions(text_input)
-        
-        st.subheader("Sentiment Analysis Result:")
-        st.json(sentiment_result)
-        
-        st.subheader("Emotion Analysis Result:")
-        st.json(emotion_result)
+        show_analysis(sentiment_result, emotion_result, text_input, "Result")
+
 
+# Keep this rerun's trace for the developer panel if any pipeline stage ran
+finished_trace = telemetry.end_trace()
+if finished_trace and finished_trace.spans:
+    st.session_state['last_trace'] = finished_trace
 
+# Record how long the script took, for the sidebar and the sm_rerun_seconds histogram
+rerun_seconds = time.perf_counter() - rerun_started
+telemetry.metrics.observe("sm_rerun_seconds", {}, rerun_seconds)
+st.session_state['rerun_seconds'].append(rerun_seconds)
+del st.session_state['rerun_seconds'][:-100]
@@ -0,0 +1,392 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import conversation
+import document_extraction
+import extraction_cache
+import lazy_imports
+import llm_streaming
+import model_registry
+import ollama_client
+import podcast
+import response_cache
+import retrieval
+import session_store
+import spreadsheet
+import sql_sandbox
+import telemetry
+import text_analysis
+import transcription
+import translation
+import web_fetch
+
+spacy = lazy_imports.lazy("spacy")
+transformers = lazy_imports.lazy("transformers")
+
+
+# ---------------------------
+# Assistant Pipelines
+# ---------------------------
+# The assistant's capabilities without any user interface: chat with
+# conversation memory and the response cache, document and website Q&A,
+# translation, Text-to-SQL, sentiment and emotion analysis and podcasts.
+# Inputs and outputs are plain values, so the same functions serve the
+# Streamlit app and the headless API (api.py). Per-user state is limited to
+# the conversation memory, which is kept in the session store.
+
+# Local Ollama model used for chat and Text-to-SQL
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:3b")
+
+# Retrieval indexes of uploaded document sets and SQL sandboxes kept per process
+DOCUMENT_INDEXES = 32
+SQL_SANDBOXES = 8
+
+# Register models with the shared registry; each one is loaded the first time it is used
+registry = model_registry.registry
+registry.register("spacy", lambda: spacy.load("en_core_web_sm"))
+registry.register("sentiment", lambda: transformers.pipeline("sentiment-analysis"))
+registry.register("emotion", lambda: transformers.pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", return_all_scores=True))
+
+# Optionally load every model in the background as soon as the worker starts
+if os.environ.get("WARM_MODELS", "0") == "1":
+    registry.warm()
+
+# Process-wide session store shared by all sessions
+sessions = session_store.get_store()
+
+
+class InputError(Exception):
+    # The request itself is unusable, e.g. an invalid schema or documents without text
+    pass
+
+
+# ---------------------------
+# Chat
+# ---------------------------
+
+# Function to build the chatbot prompt, continuing `chat_memory` (a conversation.Conversation) when given.
+# Returns the prompt and the Ollama context tokens to continue from.
+def chatbot_prompt(user_input, context="", chat_memory=None):
+    if chat_memory is None:
+        return f"{context}\nUser: {user_input}\nBot:", None
+    return chat_memory.prepare(user_input, context)
+
+def chat(user_input, context="", chat_memory=None):
+    with telemetry.span("chat", context_chars=len(context)) as span:
+        prompt, context_tokens = chatbot_prompt(user_input, context, chat_memory)
+        # Generate the response using the local Ollama model
+        response = ollama_client.client.generate(model=OLLAMA_MODEL, prompt=prompt, context=context_tokens)
+        if chat_memory is not None:
+            chat_memory.record(user_input, response["response"], context, response.get("context"))
+        span.set(prompt_chars=len(prompt), continued=context_tokens is not None, chars_out=len(response["response"]),
+                 prompt_tokens=response.get("prompt_eval_count"), eval_tokens=response.get("eval_count"))
+        return response["response"]
+
+# Function to stream the chatbot response token by token
+def chat_stream(user_input, context="", metrics=None, chat_memory=None):
+    metrics = {} if metrics is None else metrics
+    with telemetry.span("chat", context_chars=len(context), streamed=True) as span:
+        prompt, context_tokens = chatbot_prompt(user_input, context, chat_memory)
+        response = ""
+        for token in llm_streaming.stream_generate(prompt, model=OLLAMA_MODEL, metrics=metrics, context=context_tokens):
+            response += token
+            yield token
+        if chat_memory is not None:
+            chat_memory.record(user_input, response, context, metrics.get("context"))
+        span.set(prompt_chars=len(prompt), continued=context_tokens is not None, chars_out=len(response),
+                 prompt_tokens=metrics.get("prompt_tokens"), eval_tokens=metrics.get("eval_tokens"))
+
+# Function to get the conversation memory of a session's tab from the session store
+def load_conversation(session_id, tab):
+    state = sessions.get(session_id, f"conversation:{tab}")
+    if isinstance(state, conversation.Conversation):
+        return state
+    chat_memory = conversation.Conversation(OLLAMA_MODEL)
+    if state:
+        chat_memory.restore(state)
+    return chat_memory
+
+# Function to put a conversation back into the session store
+def save_conversation(session_id, tab, chat_memory):
+    if sessions.shared:
+        # Saved at once; turns still being summarized are saved as pending and summarized again by the
+        # worker that continues the session
+        sessions.put(session_id, f"conversation:{tab}", chat_memory.to_dict())
+    else:
+        sessions.put(session_id, f"conversation:{tab}", chat_memory)
+
+# Function to forget what the bot remembers of a session's tab
+def clear_conversation(session_id, tab):
+    sessions.delete(session_id, f"conversation:{tab}")
+
+# Function to answer a chat message in a session's tab, from the response cache when possible.
+# Yields {"event": "token", "text"} while streaming, then {"event": "done", "response", "cached", "metrics"},
+# where "cached" is the cache match ({"match", "similarity"}) or None.
+def answer_events(session_id, tab, question, context="", stream=True):
+    chat_memory = load_conversation(session_id, tab)
+    # Identical (or, if enabled, similar) questions are answered from the cache: about a document or website
+    # whatever was asked before, so repeated questions about the same content hit; in plain chat only with
+    # the same conversation history
+    cache_context = context or chat_memory.fingerprint()
+    with telemetry.span("response_cache", tab=tab) as span:
+        cached = response_cache.cache.lookup(tab, OLLAMA_MODEL, "chat", cache_context, question)
+        span.set(cache_hit=cached is not None)
+    if cached:
+        chat_memory.record_unsent(question, cached["response"], context)
+        save_conversation(session_id, tab, chat_memory)
+        yield {"event": "done", "response": cached["response"], "cached": cached, "metrics": {}}
+        return
+
+    started = time.perf_counter()
+    metrics = {}
+    if stream:
+        parts = []
+        for token in chat_stream(question, context=context, metrics=metrics, chat_memory=chat_memory):
+            parts.append(token)
+            yield {"event": "token", "text": token}
+        response = "".join(parts)
+    else:
+        response = chat(question, context=context, chat_memory=chat_memory)
+    response_cache.cache.store(OLLAMA_MODEL, "chat", cache_context, question, response, time.perf_counter() - started)
+    save_conversation(session_id, tab, chat_memory)
+    # Ollama's context tokens stay in the conversation memory
+    metrics.pop("context", None)
+    yield {"event": "done", "response": response, "cached": None, "metrics": metrics}
+
+
+# ---------------------------
+# Documents & Websites
+# ---------------------------
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# Function to profile a spreadsheet (columns, types, ranges, top values), cached by file content
+def spreadsheet_profile(name, data):
+    key = extraction_cache.cache.key(data, "spreadsheet_profile", spreadsheet.PROFILE_VERSION)
+    profile = extraction_cache.cache.get(key)
+    if profile is None:
+        profile = spreadsheet.profile(name, data)
+        try:
+            extraction_cache.cache.put(key, profile)
+        except OSError as e:
+            print(f"Error writing extraction cache: {e}")
+    return profile
+
+# Function to read rows [start, stop) of one sheet of a spreadsheet; returns {"header", "rows"}
+def spreadsheet_rows(name, data, sheet_title, start=0, stop=100):
+    try:
+        return spreadsheet.read_rows(name, data, sheet_title, start, stop)
+    except KeyError as e:
+        raise InputError(e.args[0]) from e
+
+# Function to build (or reuse) the retrieval index of a set of documents; `files` is a list of (name, bytes)
+def document_index(files, segments):
+    key = tuple(hashlib.sha256(data).hexdigest() for _, data in files)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = retrieval.VectorIndex(retrieval.default_embedder())
+    index.add(retrieval.chunk_segments(segments))
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > DOCUMENT_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+# Function to build the context for a question about documents: the most relevant chunks, after the
+# summaries of any spreadsheets. Returns {"context", "sources", "errors"}.
+def document_context(files, question, k=4):
+    with telemetry.span("extract_documents", files=len(files), bytes_in=sum(len(data) for _, data in files)) as span:
+        results = document_extraction.extract_documents(files, cache=extraction_cache.cache)
+        segments = [segment for result in results for segment in result["segments"]]
+        span.set(chars_out=sum(len(segment["text"]) for segment in segments))
+    errors = [f"Error reading {result['name']}: {result['error']}" for result in results if result["error"]]
+    if not any(segment["text"] for segment in segments):
+        raise InputError("; ".join(errors) or "No text could be extracted from the documents")
+
+    hits = document_index(files, segments).search(question, k=k)
+    context = retrieval.build_context(hits)
+    summaries = [spreadsheet.summary_text(spreadsheet_profile(name, data))
+                 for name, data in files if spreadsheet.is_spreadsheet(name)]
+    if summaries:
+        context = "Spreadsheet summaries:\n" + "\n\n".join(summaries) + f"\n\n{context}"
+    sources = [{"source": retrieval.format_source(chunk), "similarity": round(float(score), 4), "text": chunk["text"][:300]}
+               for score, chunk in hits]
+    return {"context": context, "sources": sources, "errors": errors}
+
+# Function to fetch a web page (revalidated against the page cache); raises web_fetch.FetchError.
+# Returns {"text", "report"} with the fetch report ({"bytes", "cache", "truncated", "fetch_seconds", ...}).
+def fetch_website(url):
+    with telemetry.span("fetch_website") as span:
+        page, report = web_fetch.fetch_page(url)
+        span.set(bytes_in=report["bytes"], chars_out=len(page["text"]), cache_hit=report["cache"] == "revalidated",
+                 fetch_seconds=round(report["fetch_seconds"], 4), parse_seconds=round(report["parse_seconds"], 4))
+        return {"text": page["text"], "report": report}
+
+
+# ---------------------------
+# Translation, Analysis, SQL, Podcasts & Transcription
+# ---------------------------
+
+_sandboxes = OrderedDict()
+_sandboxes_lock = threading.Lock()
+
+
+# Function to translate text into several languages; returns {target: text}
+def translate(text, targets, source="auto", on_progress=None):
+    with telemetry.span("translate", chars_in=len(text), languages=",".join(targets)) as span:
+        translations = translation.translate(text, targets, source=source, on_progress=on_progress)
+        span.set(chars_out=sum(len(translated) for translated in translations.values()))
+        return translations
+
+# Function to get the SpaCy English model
+def get_nlp():
+    try:
+        return registry.get("spacy")
+    except OSError as e:
+        raise RuntimeError("SpaCy model 'en_core_web_sm' not found. Please run 'python -m spacy download en_core_web_sm' in your terminal.") from e
+
+# Function to analyze sentiment of text
+# Texts longer than the model's 512-token window are split into sentences and scored in batches
+def analyze_sentiment(text):
+    with telemetry.span("sentiment", chars_in=len(text)) as span:
+        result = text_analysis.analyze_sentiment(get_nlp(), registry.get("sentiment"), text)
+        span.set(segments=len(result["segments"]))
+        return result
+
+# Function to analyze emotions in text
+def analyze_emotions(text):
+    with telemetry.span("emotion", chars_in=len(text)) as span:
+        result = text_analysis.analyze_emotions(get_nlp(), registry.get("emotion"), text)
+        span.set(segments=len(result["segments"]))
+        return result
+
+# Function to get (or build) the SQLite sandbox of a schema: an uploaded database (bytes) or CREATE statements
+def sql_sandbox_for(schema_ddl="", database=None):
+    key = ("db", hashlib.sha256(database).hexdigest()) if database else ("ddl", schema_ddl.strip())
+    with _sandboxes_lock:
+        if key in _sandboxes:
+            _sandboxes.move_to_end(key)
+            return _sandboxes[key]
+    try:
+        sandbox = sql_sandbox.sandbox_from_sqlite(database) if database else sql_sandbox.sandbox_from_ddl(schema_ddl)
+    except sql_sandbox.SchemaError as e:
+        raise InputError(str(e)) from e
+    with _sandboxes_lock:
+        _sandboxes[key] = sandbox
+        while len(_sandboxes) > SQL_SANDBOXES:
+            _, evicted = _sandboxes.popitem(last=False)
+            # Wait for a query still running on it
+            with evicted.lock:
+                evicted.close()
+    return sandbox
+
+# Function to describe a schema the way it is put in the prompt; "database" tells an uploaded database
+# (which has rows to run queries on) from CREATE statements
+def sql_schema(schema_ddl="", database=None):
+    sandbox = sql_sandbox_for(schema_ddl, database)
+    return {"summary": sandbox.summary, "database": sandbox.path is not None}
+
+# Function to generate the reply of one Text-to-SQL attempt, streamed or in one piece
+def _sql_tokens(prompt, metrics, stream):
+    if stream:
+        return llm_streaming.stream_generate(prompt, model=OLLAMA_MODEL, metrics=metrics)
+    response = ollama_client.client.generate(model=OLLAMA_MODEL, prompt=prompt)
+    metrics.update(prompt_tokens=response.get("prompt_eval_count"), eval_tokens=response.get("eval_count"))
+    return [response.get("response", "")]
+
+# Function to convert a question to SQL, from the response cache when possible. With a schema (an uploaded
+# database or CREATE statements) the statement is validated against it, retrying once with SQLite's error,
+# and if `run` is set, executed in the sandbox. Yields {"event": "token", "text", "attempt"} if `stream`,
+# then {"event": "done", "sql", "cached", "metrics"} plus, with a schema, "plan", "attempts", "error" and
+# "result" or "run_error".
+def sql_events(question, schema_ddl="", database=None, run=False, stream=True):
+    metrics = {}
+    if not schema_ddl.strip() and not database:
+        cached = response_cache.cache.lookup("sql", OLLAMA_MODEL, "sql", "", question)
+        if cached:
+            yield {"event": "done", "sql": cached["response"], "cached": cached, "metrics": metrics}
+            return
+        started = time.perf_counter()
+        reply = []
+        with telemetry.span("text_to_sql", schema=False, streamed=stream) as span:
+            for token in _sql_tokens(sql_sandbox.sql_prompt(question), metrics, stream):
+                reply.append(token)
+                if stream:
+                    yield {"event": "token", "text": token, "attempt": 1}
+            span.set(prompt_tokens=metrics.get("prompt_tokens"), eval_tokens=metrics.get("eval_tokens"))
+        sql = "".join(reply)
+        if sql:
+            response_cache.cache.store(OLLAMA_MODEL, "sql", "", question, sql, time.perf_counter() - started)
+        metrics.pop("context", None)
+        yield {"event": "done", "sql": sql, "cached": None, "metrics": metrics}
+        return
+
+    sandbox = sql_sandbox_for(schema_ddl, database)
+    cached = response_cache.cache.lookup("sql", OLLAMA_MODEL, "sql-schema", sandbox.summary, question)
+    if cached:
+        # Validation is local and cheap, so the plan is returned for cached statements too
+        result = {"sql": cached["response"], "plan": [], "attempts": 0, "error": None}
+        try:
+            result["plan"] = sql_sandbox.validate(sandbox, cached["response"])
+        except sqlite3.Error as e:
+            result["error"] = str(e)
+    else:
+        started = time.perf_counter()
+        with telemetry.span("text_to_sql", schema=True, streamed=stream) as span:
+            for event in sql_sandbox.generate_sql_events(question, sandbox, lambda prompt: _sql_tokens(prompt, metrics, stream)):
+                if event["event"] == "token":
+                    if stream:
+                        yield event
+                else:
+                    result = {key: event[key] for key in ("sql", "plan", "attempts", "error")}
+            span.set(attempts=result["attempts"], valid=result["error"] is None)
+        if result["error"] is None:
+            response_cache.cache.store(OLLAMA_MODEL, "sql-schema", sandbox.summary, question, result["sql"],
+                                       time.perf_counter() - started)
+    if run and result["error"] is None:
+        try:
+            result["result"] = sql_sandbox.execute(sandbox, result["sql"])
+        except sqlite3.Error as e:
+            result["run_error"] = str(e)
+    metrics.pop("context", None)
+    yield {"event": "done", **result, "cached": cached, "metrics": metrics}
+
+# Function to synthesize a podcast; yields {"index", "total", "text", "audio", "cached", "format"} in reading
+# order as soon as each segment is ready
+def podcast_segments(text, backend=None):
+    backend = backend or podcast.get_backend()
+    with telemetry.span("podcast", chars_in=len(text), backend=backend.name) as span:
+        cached = 0
+        for segment in podcast.synthesize(text, backend):
+            cached += segment["cached"]
+            span.set(segments=segment["total"], cache_hits=cached)
+            yield {**segment, "format": backend.format}
+
+# Function to transcribe an audio file in concurrent chunks; yields {"index", "start", "end", "text", "error", "total"}
+# segments in the order they finish
+def transcription_segments(path):
+    with telemetry.span("transcribe", bytes_in=os.path.getsize(path)) as span:
+        failed = chars = 0
+        for segment, total in transcription.transcribe_chunks(path):
+            failed += segment["error"] is not None
+            chars += len(segment["text"])
+            span.set(chunks=total, failed_chunks=failed, chars_out=chars)
+            yield {**segment, "total": total}
+
+# Function to transcribe audio given as bytes, e.g. an upload; `name` gives the file type
+def transcription_segments_from_bytes(name, data):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(name)[1] or ".wav") as audio_file:
+        audio_file.write(data)
+    try:
+        yield from transcription_segments(audio_file.name)
+    finally:
+        os.remove(audio_file.name)
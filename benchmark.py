@@ -0,0 +1,470 @@
+import argparse
+import ast
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keep benchmark runs out of the real caches and trace log
+os.environ.setdefault("EXTRACTION_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "benchmark"))
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+import document_extraction
+import llm_streaming
+import ollama_client
+import retrieval
+import spreadsheet
+import sql_sandbox
+import telemetry
+import text_analysis
+import web_fetch
+
+
+# ---------------------------
+# Micro-benchmarks
+# ---------------------------
+# Runs the processing functions behind the app without starting Streamlit:
+# document extraction, website fetching, sentiment/emotion analysis,
+# retrieval, chat and Text-to-SQL. Documents and web pages are generated at
+# increasing sizes and the LLM calls go to a local stand-in for the Ollama
+# HTTP API with configurable latency. Each benchmark reports p50/p95 latency,
+# throughput and peak Python memory, and can be compared against a baseline.
+#
+#   python benchmark.py --sizes 1,4,16 --save baseline.json
+#   python benchmark.py --sizes 1,4,16 --compare baseline.json
+#   python benchmark.py --startup
+
+WORDS = ("market revenue growth customer product research analysis report quarter strategy data model "
+         "team result increase decline forecast risk opportunity service platform region").split()
+
+MODEL = "llama3.2:3b"
+
+
+# Function to make `count` pseudo-random English-like sentences
+def sentences(count, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "." for _ in range(count)]
+
+
+# ---------------------------
+# Fixture Documents
+# ---------------------------
+
+# Function to write a PDF with `pages` pages of text, using the standard Helvetica font
+def make_pdf(pages, lines_per_page=40, seed=0):
+    lines = sentences(pages * lines_per_page, seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        text = " T* ".join(f"({line[:95]}) Tj" for line in lines[page * lines_per_page:(page + 1) * lines_per_page])
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET".encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1") + stream + b"\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        body = body if isinstance(body, bytes) else body.encode("latin-1")
+        output.write(f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    output.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1"))
+    output.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return output.getvalue()
+
+
+def make_docx(paragraphs, seed=0):
+    import docx
+    document = docx.Document()
+    for paragraph in sentences(paragraphs, seed):
+        document.add_paragraph(paragraph)
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def make_pptx(slides, seed=0):
+    from pptx import Presentation
+    presentation = Presentation()
+    lines = sentences(slides * 4, seed)
+    for slide_number in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {slide_number + 1}"
+        slide.placeholders[1].text = "\n".join(lines[slide_number * 4:(slide_number + 1) * 4])
+    output = io.BytesIO()
+    presentation.save(output)
+    return output.getvalue()
+
+
+def make_xlsx(rows, seed=0):
+    from openpyxl import Workbook
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sales")
+    sheet.append(["region", "product", "units", "revenue", "date"])
+    for _ in range(rows):
+        sheet.append([rng.choice(WORDS), rng.choice(WORDS), rng.randint(1, 500),
+                      round(rng.uniform(10, 10000), 2), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def make_html(paragraphs, seed=0):
+    body = "".join(f"<p>{line} <a href='/page/{i}'>more</a></p>" for i, line in enumerate(sentences(paragraphs, seed)))
+    return f"<html><head><title>Fixture</title><style>p {{}}</style></head><body>{body}</body></html>".encode()
+
+
+# ---------------------------
+# Local Stand-in Servers
+# ---------------------------
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Answers /api/generate (streamed or not) and /api/embed like an Ollama server would
+    first_token_seconds = 0.05
+    token_seconds = 0.002
+    reply_tokens = 40
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/embed":
+            texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            vectors = [[b / 255 for b in hashlib.sha256(text.encode()).digest()] * 2 for text in texts]
+            return self._json({"model": request["model"], "embeddings": vectors})
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+
+        prompt = request.get("prompt", "")
+        tokens = ["SELECT * FROM users;"] if "SQL:" in prompt else [f"{WORDS[i % len(WORDS)]} " for i in range(self.reply_tokens)]
+        final = {"model": request["model"], "response": "", "done": True, "context": [1, 2, 3],
+                 "prompt_eval_count": len(prompt) // 4, "eval_count": len(tokens)}
+        time.sleep(self.first_token_seconds)
+        if not request.get("stream", True):
+            time.sleep(self.token_seconds * len(tokens))
+            return self._json({**final, "response": "".join(tokens)})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in tokens:
+            self.wfile.write(json.dumps({"model": request["model"], "response": token, "done": False}).encode() + b"\n")
+            self.wfile.flush()
+            time.sleep(self.token_seconds)
+        self.wfile.write(json.dumps(final).encode() + b"\n")
+
+
+class FixtureSiteHandler(BaseHTTPRequestHandler):
+    # Serves generated pages of /page/<paragraphs> without cache validators, so every fetch is a miss
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        paragraphs = int(self.path.strip("/").split("/")[-1].split("?")[0] or 10)
+        body = make_html(paragraphs)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Function to run a handler on a free local port in a background thread; returns (server, base URL)
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ---------------------------
+# Analysis Stand-ins
+# ---------------------------
+
+# Function to get spaCy and the transformers pipelines, or light stand-ins that cost a fixed time per text
+def analysis_models(real_models):
+    if real_models:
+        import spacy
+        from transformers import pipeline
+        return (spacy.load("en_core_web_sm"), pipeline("sentiment-analysis"),
+                pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base", return_all_scores=True))
+
+    import spacy
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+
+    def sentiment(texts, batch_size=16, truncation=True):
+        time.sleep(0.001 * len(texts))
+        return [{"label": "POSITIVE" if len(text) % 2 else "NEGATIVE", "score": 0.9} for text in texts]
+
+    def emotion(texts, batch_size=16, truncation=True):
+        time.sleep(0.001 * len(texts))
+        return [[{"label": label, "score": 1 / 3} for label in ("joy", "anger", "neutral")] for _ in texts]
+
+    return nlp, sentiment, emotion
+
+
+# ---------------------------
+# Measurement
+# ---------------------------
+
+# Function to time `run()` `repeats` times, then measure its peak Python memory in one more run.
+# `units` is how much work one run does (e.g. pages), for the throughput.
+def measure(name, run, units, unit, repeats):
+    run()  # warm-up: imports, connections, first-call caches
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p50 = statistics.median(latencies)
+    return {
+        "name": name,
+        "p50_ms": p50 * 1000,
+        "p95_ms": telemetry.percentile(latencies, 0.95) * 1000,
+        "throughput": units / p50 if p50 else 0.0,
+        "unit": f"{unit}/s",
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+# Function to build the list of (name, run, units, unit) benchmarks for a size multiplier
+def benchmarks(size, ollama_url, site_url, models):
+    pdf = make_pdf(10 * size)
+    word = make_docx(200 * size)
+    slides = make_pptx(10 * size)
+    workbook = make_xlsx(2000 * size)
+    text = " ".join(sentences(200 * size))
+    nlp, sentiment, emotion = models
+    segments = [{"source": "fixture.pdf", "location": f"page {i + 1}", "text": line}
+                for i, line in enumerate(sentences(100 * size))]
+    index = retrieval.VectorIndex(retrieval.HashingEmbedder())
+    index.add(retrieval.chunk_segments(segments))
+    sandbox = sql_sandbox.sandbox_from_ddl("CREATE TABLE users(id INTEGER PRIMARY KEY, name TEXT, age INTEGER);")
+    counter = iter(range(10 ** 9))
+
+    def analyze():
+        # Clear the memo so every run analyzes the text again
+        text_analysis._memo.clear()
+        text_analysis.analyze_sentiment(nlp, sentiment, text)
+        text_analysis.analyze_emotions(nlp, emotion, text)
+
+    def chat():
+        # Same call as llama_chatbot without memory; prompts differ so nothing is coalesced
+        ollama_client.client.generate(model=MODEL, prompt=f"{text[:2000]}\nUser: question {next(counter)}\nBot:")
+
+    def chat_stream():
+        for _ in llm_streaming.stream_generate(f"User: question {next(counter)}\nBot:", model=MODEL):
+            pass
+
+    def chat_concurrent():
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: chat(), range(8)))
+
+    def to_sql():
+        sql_sandbox.generate_sql(
+            f"all users {next(counter)}", sandbox,
+            lambda prompt, attempt: ollama_client.client.generate(model=MODEL, prompt=prompt)["response"],
+        )
+
+    return [
+        (f"extract_pdf[{10 * size} pages]", lambda: document_extraction.pdf_segments("fixture.pdf", pdf), 10 * size, "pages"),
+        (f"extract_word[{200 * size} paragraphs]", lambda: document_extraction.word_segments("fixture.docx", word), 200 * size, "paragraphs"),
+        (f"extract_pptx[{10 * size} slides]", lambda: document_extraction.pptx_segments("fixture.pptx", slides), 10 * size, "slides"),
+        (f"extract_excel[{2000 * size} rows]", lambda: document_extraction.excel_segments("fixture.xlsx", workbook), 2000 * size, "rows"),
+        (f"profile_excel[{2000 * size} rows]", lambda: spreadsheet.profile("fixture.xlsx", workbook), 2000 * size, "rows"),
+        (f"website_fetch[{100 * size} paragraphs]", lambda: web_fetch.fetch_page(f"{site_url}/page/{100 * size}?run={next(counter)}"), 1, "pages"),
+        (f"analyze_sentiment_emotion[{200 * size} sentences]", analyze, 200 * size, "sentences"),
+        (f"retrieval_search[{len(index)} chunks]", lambda: index.search("revenue growth forecast"), 1, "queries"),
+        ("llama_chatbot", chat, 1, "requests"),
+        ("llama_chatbot_stream", chat_stream, 1, "requests"),
+        ("llama_chatbot_concurrent[8]", chat_concurrent, 8, "requests"),
+        ("text_to_sql_validated", to_sql, 1, "requests"),
+    ]
+
+
+# ---------------------------
+# Startup
+# ---------------------------
+# A fresh Python process runs app.py's module-level imports and lazy library
+# bindings, once with LAZY_IMPORTS=0 (everything imported up front) and once
+# with lazy imports, to show what a new worker pays before the first rerun.
+# Modules that are not installed here (e.g. streamlit) are skipped.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+skipped = []
+for source in json.loads(sys.argv[1]):
+    try:
+        exec(source, globals())
+    except ImportError as e:
+        skipped.append(e.name)
+seconds = time.perf_counter() - started
+import model_registry
+print(json.dumps({"seconds": seconds, "rss": model_registry.current_rss_bytes(), "modules": len(sys.modules),
+                  "skipped": sorted(set(skipped))}))
+"""
+
+
+# Function to collect app.py's top-level imports and `x = lazy_imports.lazy(...)` bindings as source lines
+def startup_statements(path=APP_PATH):
+    with open(path, encoding="utf-8") as app_file:
+        tree = ast.parse(app_file.read())
+    statements = []
+    for node in tree.body:
+        is_lazy = (isinstance(node, ast.Assign) and isinstance(node.value, ast.Call)
+                   and ast.unparse(node.value.func) == "lazy_imports.lazy")
+        if isinstance(node, (ast.Import, ast.ImportFrom)) or is_lazy:
+            statements.append(ast.unparse(node))
+    return statements
+
+
+# Function to time cold starts in fresh processes with lazy imports off and on
+def startup_benchmarks(repeats):
+    statements = json.dumps(startup_statements())
+    results = []
+    for mode, lazy in (("eager", "0"), ("lazy", "1")):
+        runs = []
+        for _ in range(repeats):
+            env = dict(os.environ, LAZY_IMPORTS=lazy, TRACE_LOG_PATH="", METRICS_PORT="0")
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, statements], env=env, check=True,
+                                    capture_output=True, text=True, cwd=os.path.dirname(APP_PATH)).stdout
+            run = json.loads(output.strip().splitlines()[-1])
+            run["wall"] = time.perf_counter() - started
+            runs.append(run)
+        imports = [run["seconds"] for run in runs]
+        results.append({
+            "name": f"startup[{mode}]",
+            "p50_ms": round(statistics.median(imports) * 1000, 2),
+            "p95_ms": round(telemetry.percentile(imports, 0.95) * 1000, 2),
+            "throughput": round(1 / statistics.median(run["wall"] for run in runs), 2),
+            "unit": "starts/s",
+            "peak_mb": round(statistics.median(run["rss"] for run in runs) / (1024 * 1024), 2),
+            "modules": runs[-1]["modules"],
+            "skipped": runs[-1]["skipped"],
+        })
+        print(f"  startup[{mode}]: {results[-1]['p50_ms']:.2f} ms, {results[-1]['modules']} modules", file=sys.stderr)
+    return results
+
+
+# Function to compare results with a baseline; returns the names that regressed beyond `tolerance`
+def compare(results, baseline, tolerance):
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["name"])
+        if not previous:
+            result["vs_baseline"] = "new"
+            continue
+        ratio = result["p50_ms"] / previous["p50_ms"] if previous["p50_ms"] else 1.0
+        p95_ratio = result["p95_ms"] / previous["p95_ms"] if previous.get("p95_ms") else 1.0
+        memory_ratio = result["peak_mb"] / previous["peak_mb"] if previous["peak_mb"] else 1.0
+        result["vs_baseline"] = f"{ratio:.2f}x p50, {p95_ratio:.2f}x p95, {memory_ratio:.2f}x memory"
+        if max(ratio, p95_ratio, memory_ratio) > 1 + tolerance:
+            regressions.append(result["name"])
+            result["vs_baseline"] += " REGRESSION"
+    return regressions
+
+
+def print_table(results):
+    print(f"{'benchmark':<44} {'p50 ms':>10} {'p95 ms':>10} {'throughput':>20} {'peak MB':>9}  vs baseline")
+    for result in results:
+        throughput = f"{result['throughput']:.1f} {result['unit']}"
+        print(f"{result['name']:<44} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {throughput:>20} "
+              f"{result['peak_mb']:>9.2f}  {result.get('vs_baseline', '')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the assistant's processing functions")
+    parser.add_argument("--sizes", default="1,4", help="comma-separated fixture size multipliers (default: 1,4)")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--first-token-ms", type=float, default=50, help="latency of the Ollama stand-in before the first token")
+    parser.add_argument("--token-ms", type=float, default=2, help="latency of the Ollama stand-in per token")
+    parser.add_argument("--real-models", action="store_true", help="use spaCy and transformers instead of stand-ins")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a baseline JSON file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a regression (default: 0.2)")
+    parser.add_argument("--startup", action="store_true",
+                        help="only measure cold-start imports and resident memory with lazy imports off and on")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        results = startup_benchmarks(args.repeats)
+        if results[0]["skipped"]:
+            print(f"  not installed, skipped: {', '.join(results[0]['skipped'])}", file=sys.stderr)
+        return report(results, args)
+
+    FakeOllamaHandler.first_token_seconds = args.first_token_ms / 1000
+    FakeOllamaHandler.token_seconds = args.token_ms / 1000
+    ollama_server, ollama_url = serve(FakeOllamaHandler)
+    site_server, site_url = serve(FixtureSiteHandler)
+    # Route every LLM call through the stand-in
+    ollama_client.client = ollama_client.OllamaService(host=ollama_url)
+    models = analysis_models(args.real_models)
+
+    results = []
+    try:
+        for size in (int(size) for size in args.sizes.split(",")):
+            for name, run, units, unit in benchmarks(size, ollama_url, site_url, models):
+                if args.filter in name and not any(result["name"] == name for result in results):
+                    results.append(measure(name, run, units, unit, args.repeats))
+                    print(f"  {name}: {results[-1]['p50_ms']:.2f} ms", file=sys.stderr)
+    finally:
+        ollama_server.shutdown()
+        site_server.shutdown()
+
+    return report(results, args)
+
+
+# Function to print the results, compare/save them as requested and return the exit code
+def report(results, args):
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, {result["name"]: result for result in json.load(baseline_file)}, args.tolerance)
+    print_table(results)
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
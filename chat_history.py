@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque, namedtuple
+
+
+# ---------------------------
+# Chat History Store
+# ---------------------------
+# Every turn of the chat tabs is written to SQLite under the browser session's
+# id and the tab it belongs to, so each tab keeps its own conversation and the
+# history survives a server restart. The most recent turns of each open
+# conversation are also kept in memory, so showing the first page of history
+# on a rerun does not touch the database; older pages, search and export read
+# from SQLite. Conversations are capped at HISTORY_MAX_TURNS turns.
+
+DEFAULT_HISTORY_PATH = os.environ.get(
+    "CHAT_HISTORY_PATH", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "history.sqlite3")
+)
+HISTORY_WINDOW = int(os.environ.get("CHAT_HISTORY_WINDOW", "20"))
+HISTORY_PAGE_SIZE = int(os.environ.get("CHAT_HISTORY_PAGE_SIZE", "10"))
+HISTORY_MAX_TURNS = int(os.environ.get("CHAT_HISTORY_MAX_TURNS", "1000"))
+
+# Conversations whose recent turns are kept in memory, least recently used ones are dropped
+CACHED_CONVERSATIONS = 256
+
+Turn = namedtuple("Turn", ["id", "tab", "ts", "user", "bot"])
+
+
+# Function to create an id for a new browser session
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+# Function to format a turn's Unix time the way the chat tabs show it
+def format_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+class HistoryStore:
+    def __init__(self, path=DEFAULT_HISTORY_PATH, window=HISTORY_WINDOW, max_turns=HISTORY_MAX_TURNS):
+        self.path = path
+        self.window = window
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()  # (session, tab) -> [turn count, deque of recent turns]
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session TEXT NOT NULL,"
+            " tab TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " user TEXT NOT NULL,"
+            " bot TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS turns_conversation ON turns (session, tab, id)")
+        self._db.commit()
+
+    # Load (or reuse) the turn count and recent turns of a conversation; call with the lock held
+    def _conversation(self, session, tab):
+        key = (session, tab)
+        conversation = self._conversations.get(key)
+        if conversation is not None:
+            self._conversations.move_to_end(key)
+            return conversation
+        count = self._db.execute("SELECT count(*) FROM turns WHERE session = ? AND tab = ?", (session, tab)).fetchone()[0]
+        rows = self._db.execute(
+            "SELECT id, tab, ts, user, bot FROM turns WHERE session = ? AND tab = ? ORDER BY id DESC LIMIT ?",
+            (session, tab, self.window),
+        ).fetchall()
+        conversation = [count, deque((Turn(*row) for row in reversed(rows)), maxlen=self.window)]
+        self._conversations[key] = conversation
+        while len(self._conversations) > CACHED_CONVERSATIONS:
+            self._conversations.popitem(last=False)
+        return conversation
+
+    # Function to add a turn to a conversation, dropping its oldest turns beyond max_turns
+    def append(self, session, tab, user, bot, ts=None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            conversation = self._conversation(session, tab)
+            cursor = self._db.execute(
+                "INSERT INTO turns (session, tab, ts, user, bot) VALUES (?, ?, ?, ?, ?)", (session, tab, ts, user, bot)
+            )
+            turn = Turn(cursor.lastrowid, tab, ts, user, bot)
+            conversation[0] += 1
+            conversation[1].append(turn)
+            if conversation[0] > self.max_turns:
+                self._db.execute(
+                    "DELETE FROM turns WHERE session = ? AND tab = ? AND id NOT IN"
+                    " (SELECT id FROM turns WHERE session = ? AND tab = ? ORDER BY id DESC LIMIT ?)",
+                    (session, tab, session, tab, self.max_turns),
+                )
+                conversation[0] = self.max_turns
+            self._db.commit()
+        return turn
+
+    def count(self, session, tab):
+        with self._lock:
+            return self._conversation(session, tab)[0]
+
+    # Function to get one page of a conversation in reading order; page 0 holds the most recent turns
+    def page(self, session, tab, page=0, page_size=HISTORY_PAGE_SIZE):
+        skip = page * page_size
+        with self._lock:
+            count, recent = self._conversation(session, tab)
+            if skip + page_size <= len(recent) or (count <= len(recent)):
+                turns = list(recent)
+                return turns[max(0, len(turns) - skip - page_size):max(0, len(turns) - skip)]
+            rows = self._db.execute(
+                "SELECT id, tab, ts, user, bot FROM turns WHERE session = ? AND tab = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (session, tab, page_size, skip),
+            ).fetchall()
+        return [Turn(*row) for row in reversed(rows)]
+
+    # Function to find turns of a session whose question or answer contains `query`, newest first
+    def search(self, session, query, tab=None, limit=50):
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql = ("SELECT id, tab, ts, user, bot FROM turns WHERE session = ?"
+               " AND (user LIKE ? ESCAPE '\\' OR bot LIKE ? ESCAPE '\\')")
+        parameters = [session, pattern, pattern]
+        if tab:
+            sql += " AND tab = ?"
+            parameters.append(tab)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id DESC LIMIT ?", (*parameters, limit)).fetchall()
+        return [Turn(*row) for row in rows]
+
+    # Function to export a session's history (one tab or all) as "markdown" or "json" text
+    def export(self, session, tab=None, export_format="markdown"):
+        sql = "SELECT id, tab, ts, user, bot FROM turns WHERE session = ?"
+        parameters = [session]
+        if tab:
+            sql += " AND tab = ?"
+            parameters.append(tab)
+        with self._lock:
+            turns = [Turn(*row) for row in self._db.execute(sql + " ORDER BY tab, id", parameters)]
+        if export_format == "json":
+            return json.dumps([{**turn._asdict(), "time": format_time(turn.ts)} for turn in turns], indent=2, ensure_ascii=False)
+        lines = []
+        current_tab = None
+        for turn in turns:
+            if turn.tab != current_tab:
+                lines.append(f"## {turn.tab}\n")
+                current_tab = turn.tab
+            lines.append(f"**You:** {turn.user} ({format_time(turn.ts)})\n\n**Bot:** {turn.bot}\n")
+        return "\n".join(lines)
+
+    # Function to delete a conversation
+    def clear(self, session, tab):
+        with self._lock:
+            self._db.execute("DELETE FROM turns WHERE session = ? AND tab = ?", (session, tab))
+            self._db.commit()
+            self._conversations.pop((session, tab), None)
+
+
+# Process-wide history store shared by all sessions
+store = HistoryStore()
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import threading
+
+import ollama_client
+
+
+# ---------------------------
+# Conversation Memory
+# ---------------------------
+# Ollama returns the token context of every completion. Passing it back with
+# the next request continues the conversation from the server's KV cache, so
+# only the new turn has to be prefilled. Once the conversation's part of the
+# context grows past the token budget (the attached document or website does
+# not count) it is dropped, older turns are summarized in the background, and
+# the next prompt is rebuilt from the summary plus a window of recent turns.
+
+CONVERSATION_TOKEN_BUDGET = int(os.environ.get("CONVERSATION_TOKEN_BUDGET", "3000"))
+
+# Rough size of a token, used where Ollama did not report a count
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class Conversation:
+    def __init__(self, model, token_budget=CONVERSATION_TOKEN_BUDGET, keep_turns=4):
+        self.model = model
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.turns = []
+        self.summary = ""
+        self.context_tokens = None
+        self.last_context = None
+        self.attached_tokens = 0  # estimated tokens of the attached contexts inside context_tokens
+        self._unsent = []  # turns answered without the model, not in context_tokens yet
+        self._pending = []  # older turns waiting to be folded into the summary
+        self._summarizing = []  # turns being folded into the summary right now
+        self._summary_thread = None
+        self._lock = threading.Lock()
+
+    # Function to build the prompt for the next turn; returns (prompt, context tokens to pass to Ollama)
+    def prepare(self, user_input, context=""):
+        with self._lock:
+            if self.context_tokens:
+                # Continue from Ollama's context, only sending what is new
+                new_context = f"{context}\n" if context and context != self.last_context else ""
+                unsent = "".join(f"User: {turn['user']}\nBot: {turn['bot']}\n" for turn in self._unsent)
+                return f"\n{new_context}{unsent}User: {user_input}\nBot:", self.context_tokens
+
+            parts = [context] if context else []
+            if self.summary:
+                parts.append(f"Summary of the earlier conversation: {self.summary}")
+            parts.extend(f"User: {turn['user']}\nBot: {turn['bot']}" for turn in self._recent_window())
+            parts.append(f"User: {user_input}\nBot:")
+            return "\n".join(parts), None
+
+    # Most recent turns that fit in half of the token budget
+    def _recent_window(self):
+        window = []
+        tokens = 0
+        for turn in reversed(self.turns):
+            tokens += estimate_tokens(turn["user"]) + estimate_tokens(turn["bot"])
+            if window and tokens > self.token_budget // 2:
+                break
+            window.append(turn)
+        return list(reversed(window))
+
+    # Function to store a finished turn together with the context tokens Ollama returned
+    def record(self, user_input, bot_response, context="", context_tokens=None):
+        with self._lock:
+            self.turns.append({"user": user_input, "bot": bot_response})
+            if self.context_tokens and context_tokens:
+                # Continued: a context that changed was sent along with the turn
+                if context and context != self.last_context:
+                    self.attached_tokens += estimate_tokens(context)
+            else:
+                self.attached_tokens = estimate_tokens(context) if context else 0
+            self.last_context = context
+            self.context_tokens = list(context_tokens) if context_tokens else None
+            self._unsent = []
+
+            if self.context_tokens:
+                # Only the conversation counts against the budget, not the attached document or website
+                over_budget = len(self.context_tokens) - self.attached_tokens > self.token_budget
+            else:
+                over_budget = sum(estimate_tokens(t["user"]) + estimate_tokens(t["bot"]) for t in self.turns) > self.token_budget
+            if over_budget:
+                # The next turn is rebuilt from the summary and recent turns
+                self.context_tokens = None
+                self._fold_older_turns()
+
+    # Function to store a turn answered without the model, e.g. from the response cache. Ollama's
+    # context is kept, and the turn is sent along with the next prompt that continues it.
+    def record_unsent(self, user_input, bot_response, context=""):
+        with self._lock:
+            turn = {"user": user_input, "bot": bot_response}
+            self.turns.append(turn)
+            if self.context_tokens:
+                self._unsent.append(turn)
+            else:
+                self.last_context = context
+
+    def _fold_older_turns(self):
+        older = self.turns[:-self.keep_turns] if len(self.turns) > self.keep_turns else []
+        if not older:
+            return
+        self.turns = self.turns[len(older):]
+        self._pending.extend(older)
+        if self._summary_thread is None or not self._summary_thread.is_alive():
+            self._summary_thread = threading.Thread(target=self._summarize, name="conversation-summary", daemon=True)
+            self._summary_thread.start()
+
+    def _summarize(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                pending, self._pending = self._pending, []
+                self._summarizing = pending
+                summary = self.summary
+            transcript = "\n".join(f"User: {turn['user']}\nBot: {turn['bot']}" for turn in pending)
+            prompt = (
+                "Update the summary of this conversation in a few sentences, keeping names, facts and decisions.\n\n"
+                f"Current summary: {summary or '(none)'}\n\nNew messages:\n{transcript}\n\nUpdated summary:"
+            )
+            try:
+                response = ollama_client.client.generate(model=self.model, prompt=prompt)
+                new_summary = response["response"].strip()
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+                new_summary = f"{summary}\n{transcript}".strip()
+            with self._lock:
+                self.summary = new_summary
+                self._summarizing = []
+
+    # Function to identify the conversation state, so cached answers are only reused for the same history
+    def fingerprint(self):
+        with self._lock:
+            if not self.turns and not self.summary:
+                return ""
+            state = self.summary + "".join(turn["user"] + turn["bot"] for turn in self.turns)
+        return hashlib.sha256(state.encode("utf-8")).hexdigest()
+
+    # Function to capture the state needed to continue the conversation in another process.
+    # Turns that are still being summarized are saved as pending, so it never has to wait for the summary.
+    def to_dict(self):
+        with self._lock:
+            return {
+                "turns": list(self.turns),
+                "summary": self.summary,
+                "context_tokens": self.context_tokens,
+                "last_context": self.last_context,
+                "attached_tokens": self.attached_tokens,
+                "unsent": list(self._unsent),
+                "pending": self._summarizing + self._pending,
+            }
+
+    # Function to continue from a state made by to_dict(); turns still waiting to be summarized are picked up again
+    def restore(self, state):
+        with self._lock:
+            self.turns = list(state.get("turns", []))
+            self.summary = state.get("summary", "")
+            self.context_tokens = state.get("context_tokens")
+            self.last_context = state.get("last_context")
+            self.attached_tokens = state.get("attached_tokens", 0)
+            self._unsent = list(state.get("unsent", []))
+            self._pending = list(state.get("pending", []))
+            if self._pending:
+                self._summary_thread = threading.Thread(target=self._summarize, name="conversation-summary", daemon=True)
+                self._summary_thread.start()
+
+    # Function to wait until older turns have been folded into the summary
+    def wait_for_summary(self, timeout=None):
+        thread = self._summary_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def clear(self):
+        with self._lock:
+            self.turns = []
+            self.summary = ""
+            self.context_tokens = None
+            self.last_context = None
+            self.attached_tokens = 0
+            self._unsent = []
+            self._pending = []
+            self._summarizing = []
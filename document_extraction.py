@@ -0,0 +1,278 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import lazy_imports
+import spreadsheet
+
+pptx = lazy_imports.lazy("pptx")
+docx = lazy_imports.lazy("docx")
+PyPDF2 = lazy_imports.lazy("PyPDF2")
+
+
+# ---------------------------
+# Document Extraction
+# ---------------------------
+# Segmenters take the file name and raw bytes (so they can run in worker
+# processes) and return segments: {"source", "location", "text"}.
+
+# Bump when a segmenter changes its output so stale cache entries are not reused
+EXTRACTOR_VERSION = 2
+
+# Upper bound on extraction worker processes
+MAX_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# PDFs with more pages than this are split into page ranges extracted in parallel
+PAGES_PER_JOB = int(os.environ.get("EXTRACTION_PAGES_PER_JOB", "25"))
+
+# Spreadsheet rows per segment
+ROWS_PER_SEGMENT = 200
+
+
+# Function to yield the pages of a PDF, optionally only pages [start, stop)
+def iter_pdf_segments(name, data, start=0, stop=None):
+    reader_pdf = PyPDF2.PdfReader(io.BytesIO(data))
+    pages = reader_pdf.pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+    for number in range(start, stop):
+        page_text = pages[number].extract_text()
+        if page_text:
+            yield {"source": name, "location": f"page {number + 1}", "text": page_text}
+
+# Function to yield the paragraphs of a Word file
+def iter_word_segments(name, data):
+    doc = docx.Document(io.BytesIO(data))
+    for number, para in enumerate(doc.paragraphs, start=1):
+        yield {"source": name, "location": f"paragraph {number}", "text": para.text}
+
+# Function to yield the slides of a PPTX file
+def iter_pptx_segments(name, data):
+    prs = pptx.Presentation(io.BytesIO(data))
+    for number, slide in enumerate(prs.slides, start=1):
+        slide_text = "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+        yield {"source": name, "location": f"slide {number}", "text": slide_text}
+
+# Function to yield blocks of rows of every sheet of an Excel or CSV file, reading it
+# row by row instead of loading whole sheets into a DataFrame
+def iter_excel_segments(name, data):
+    for title, header, rows in spreadsheet.iter_sheets(name, data):
+        header_line = "\t".join("" if value is None else str(value) for value in header)
+        block = []
+        first_row = 2
+        for row_number, row in enumerate(rows, start=2):
+            block.append("\t".join("" if value is None else str(value) for value in row))
+            if len(block) == ROWS_PER_SEGMENT:
+                yield _rows_segment(name, title, first_row, row_number, header_line, block)
+                block = []
+                first_row = row_number + 1
+        if block or first_row == 2:
+            yield _rows_segment(name, title, first_row, first_row + len(block) - 1, header_line, block)
+
+
+def _rows_segment(name, sheet_title, first_row, last_row, header_line, block):
+    location = f"sheet {sheet_title}" if last_row < first_row else f"sheet {sheet_title} rows {first_row}–{last_row}"
+    return {"source": name, "location": location, "text": "\n".join([header_line] + block)}
+
+# List versions of the segmenters, used by worker processes and as cache key names
+def pdf_segments(name, data, start=0, stop=None):
+    return list(iter_pdf_segments(name, data, start, stop))
+
+# Function to extract pages [start, stop) of a PDF saved at `path`, so page-range jobs share one copy of the file
+def pdf_file_segments(name, path, start, stop):
+    with open(path, "rb") as pdf_file:
+        return pdf_segments(name, pdf_file.read(), start, stop)
+
+def word_segments(name, data):
+    return list(iter_word_segments(name, data))
+
+def pptx_segments(name, data):
+    return list(iter_pptx_segments(name, data))
+
+def excel_segments(name, data):
+    return list(iter_excel_segments(name, data))
+
+def csv_segments(name, data):
+    return list(iter_excel_segments(name, data))
+
+SEGMENTERS = {
+    ".pdf": pdf_segments,
+    ".docx": word_segments,
+    ".pptx": pptx_segments,
+    ".xlsx": excel_segments,
+    ".csv": csv_segments,
+}
+
+ITER_SEGMENTERS = {
+    ".pdf": iter_pdf_segments,
+    ".docx": iter_word_segments,
+    ".pptx": iter_pptx_segments,
+    ".xlsx": iter_excel_segments,
+    ".csv": iter_excel_segments,
+}
+
+
+def segmenter_for(name):
+    return SEGMENTERS.get(os.path.splitext(name)[1].lower())
+
+
+# Function to lazily yield the segments of a document; nothing is parsed until they are pulled
+def iter_document_segments(name, data):
+    iter_segmenter = ITER_SEGMENTERS.get(os.path.splitext(name)[1].lower())
+    if iter_segmenter is None:
+        return iter(())
+    return iter_segmenter(name, data)
+
+
+# Function to stop a segment stream once `max_chars` characters were produced, cutting the
+# last segment. The source is not pulled any further, so parsing stops early too.
+def limit_chars(segments, max_chars=None):
+    if max_chars is None:
+        yield from segments
+        return
+    remaining = max_chars
+    if remaining <= 0:
+        return
+    for segment in segments:
+        text = segment["text"]
+        if len(text) >= remaining:
+            yield {**segment, "text": text[:remaining]}
+            return
+        remaining -= len(text)
+        yield segment
+
+
+# ---------------------------
+# Parallel Extraction
+# ---------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Function to get the shared worker pool, created on first use
+def get_executor(max_workers=MAX_WORKERS):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers do not inherit the Streamlit server's threads and sockets
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+# Function to drop a pool whose worker died; the next get_executor() starts a new one
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Run one extraction job, returning the error instead of raising so one bad file cannot abort the batch
+def _run_job(segmenter, args):
+    try:
+        return segmenter(*args), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+# Function to split a file into jobs, page ranges for large PDFs and a single job otherwise.
+# A large PDF is written once to a temporary file, added to `temp_paths`, that its jobs read.
+def _plan_jobs(name, data, temp_paths):
+    segmenter = segmenter_for(name)
+    if segmenter is pdf_segments:
+        try:
+            page_count = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+        except Exception:
+            page_count = 0
+        if page_count > PAGES_PER_JOB:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as pdf_file:
+                pdf_file.write(data)
+            temp_paths.append(pdf_file.name)
+            return [(pdf_file_segments, (name, pdf_file.name, start, start + PAGES_PER_JOB))
+                    for start in range(0, page_count, PAGES_PER_JOB)]
+    return [(segmenter, (name, data))]
+
+
+def _submit(executor, segmenter, args):
+    try:
+        return executor.submit(_run_job, segmenter, args)
+    except BrokenProcessPool:
+        return None
+
+
+# Function to get a pool job's (segments, error). A worker that dies (e.g. killed for using too much
+# memory) fails every job still in its pool; those are retried alone in a new pool, so only a file
+# that kills the worker again is reported.
+def _job_output(executor, future, segmenter, args, max_workers):
+    try:
+        if future is not None:
+            return future.result()
+    except BrokenProcessPool:
+        pass
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+    _discard_executor(executor)
+    executor = get_executor(max_workers)
+    try:
+        return executor.submit(_run_job, segmenter, args).result()
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        return [], "The extraction worker crashed, e.g. out of memory"
+
+
+# Function to extract many files at once; `files` is a list of (name, bytes).
+# Returns one {"name", "segments", "error"} per file, in input order.
+def extract_documents(files, cache=None, max_workers=MAX_WORKERS):
+    results = [{"name": name, "segments": [], "error": None} for name, _ in files]
+    jobs = []  # (file index, job position, segmenter, args)
+    cache_keys = {}
+    temp_paths = []
+
+    for index, (name, data) in enumerate(files):
+        segmenter = segmenter_for(name)
+        if segmenter is None:
+            results[index]["error"] = "Unsupported file type"
+            continue
+        if cache is not None:
+            cache_keys[index] = cache.key(data, segmenter.__name__, EXTRACTOR_VERSION)
+            cached = cache.get(cache_keys[index])
+            if cached is not None:
+                results[index]["segments"] = cached
+                continue
+        for position, (job_segmenter, args) in enumerate(_plan_jobs(name, data, temp_paths)):
+            jobs.append((index, position, job_segmenter, args))
+
+    if not jobs:
+        return results
+
+    try:
+        if len(jobs) == 1 or max_workers <= 1:
+            outputs = [_run_job(segmenter, args) for _, _, segmenter, args in jobs]
+        else:
+            executor = get_executor(max_workers)
+            futures = [_submit(executor, segmenter, args) for _, _, segmenter, args in jobs]
+            outputs = [_job_output(executor, future, segmenter, args, max_workers)
+                       for future, (_, _, segmenter, args) in zip(futures, jobs)]
+    finally:
+        for path in temp_paths:
+            os.remove(path)
+
+    # Jobs were planned in file and page order, so appending keeps the output deterministic
+    for (index, _, _, _), (segments, error) in zip(jobs, outputs):
+        if error and not results[index]["error"]:
+            results[index]["error"] = error
+        results[index]["segments"].extend(segments)
+
+    if cache is not None:
+        for index in {job[0] for job in jobs}:
+            if not results[index]["error"]:
+                try:
+                    cache.put(cache_keys[index], results[index]["segments"])
+                except OSError as e:
+                    print(f"Error writing extraction cache: {e}")
+    return results
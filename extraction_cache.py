@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+# ---------------------------
+# Extraction Result Cache
+# ---------------------------
+# Extracted document segments are stored on disk under a hash of the file
+# content plus the extractor name and version, so the same upload is parsed
+# only once, even across sessions and server restarts. Files are evicted least
+# recently used first once the cache grows past its size limit.
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "EXTRACTION_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "extraction")
+)
+DEFAULT_CACHE_MB = int(os.environ.get("EXTRACTION_CACHE_MB", "256"))
+
+
+class ExtractionCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    # Function to build the cache key for some file content and extractor
+    @staticmethod
+    def key(data, extractor, version):
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}-{extractor}-v{version}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    # List (path, size, last used) for every cached file
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as cached_file:
+                segments = json.load(cached_file)
+            # Mark as recently used for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return segments
+
+    def put(self, key, segments):
+        path = self._path(key)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw_file, gzip.GzipFile(fileobj=raw_file, mode="wb") as cached_file:
+                cached_file.write(json.dumps(segments, separators=(",", ":")).encode("utf-8"))
+            size = os.path.getsize(tmp_path)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._total_bytes += size - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    # Remove least recently used files until the cache fits in its size limit
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+    # Return cached segments for `data`, running `extract()` and storing its result on a miss
+    def get_or_extract(self, data, extractor, version, extract):
+        key = self.key(data, extractor, version)
+        segments = self.get(key)
+        if segments is None:
+            segments = list(extract())
+            try:
+                self.put(key, segments)
+            except OSError as e:
+                print(f"Error writing extraction cache: {e}")
+        return segments
+
+    # Yield cached segments for `data`, or stream them from `iterate()` on a miss. The result is
+    # only stored when the consumer reads the stream to the end, never a partial extraction.
+    def iter_or_extract(self, data, extractor, version, iterate):
+        key = self.key(data, extractor, version)
+        segments = self.get(key)
+        if segments is not None:
+            yield from segments
+            return
+        segments = []
+        for segment in iterate():
+            segments.append(segment)
+            yield segment
+        try:
+            self.put(key, segments)
+        except OSError as e:
+            print(f"Error writing extraction cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+            }
+
+
+# Process-wide cache shared by all sessions
+cache = ExtractionCache()
@@ -0,0 +1,94 @@
+import importlib
+import os
+import sys
+import threading
+import time
+import traceback
+import types
+
+from model_registry import current_rss_bytes
+
+
+# ---------------------------
+# Lazy Imports
+# ---------------------------
+# Heavy third-party libraries (spaCy, Transformers, SpeechRecognition, gTTS,
+# the document parsers, ...) are only needed by the tab that uses them. They
+# are bound to module-level proxies that import the real module the first time
+# one of its attributes is used, so a fresh worker starts with just Streamlit
+# and the chat path loaded. Every import is recorded with its duration, the
+# memory it added and the code that triggered it, for the import profile.
+
+# 1 imports on first use, 0 imports everything up front (e.g. to pay the cost before the first user arrives)
+LAZY_IMPORTS = os.environ.get("LAZY_IMPORTS", "1") != "0"
+
+_profile = []
+_lock = threading.Lock()
+
+
+def _load(name, trigger):
+    if name in sys.modules:
+        # Already imported by something else, e.g. another library
+        return sys.modules[name]
+    rss_before = current_rss_bytes()
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    entry = {
+        "module": name,
+        "seconds": round(time.perf_counter() - started, 3),
+        "rss_mb": round((current_rss_bytes() - rss_before) / (1024 * 1024), 1),
+        "trigger": trigger,
+    }
+    with _lock:
+        _profile.append(entry)
+    return module
+
+
+# Name the caller outside this module that caused an import, e.g. "podcast.py:49 synthesize"
+def _caller():
+    for frame in reversed(traceback.extract_stack(limit=8)[:-1]):
+        if os.path.basename(frame.filename) != "lazy_imports.py":
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    return "unknown"
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _resolve(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = _load(self.__name__, _caller())
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._resolve(), attribute)
+
+    def __dir__(self):
+        return dir(self._resolve())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+# Function to bind a module by name: a proxy that imports it on first attribute access,
+# or the module itself when LAZY_IMPORTS is off
+def lazy(name):
+    if not LAZY_IMPORTS:
+        return _load(name, "startup")
+    return LazyModule(name)
+
+
+# Function to check whether a module has been imported yet (without importing it)
+def is_loaded(name):
+    return name in sys.modules
+
+
+# Function to list the recorded imports, slowest first: {"module", "seconds", "rss_mb", "trigger"}
+def profile():
+    with _lock:
+        return sorted(_profile, key=lambda entry: entry["seconds"], reverse=True)
@@ -0,0 +1,70 @@
+import re
+import time
+
+import ollama_client
+
+
+# ---------------------------
+# Token Streaming for Ollama
+# ---------------------------
+
+# A sentence ends at ., ! or ? followed by whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+# Function to stream a completion token by token, recording timing metrics into `metrics`
+def stream_generate(prompt, model, metrics=None, **options):
+    metrics = {} if metrics is None else metrics
+    started = time.perf_counter()
+    metrics.update({"model": model, "prompt_chars": len(prompt), "time_to_first_token": None})
+    tokens = 0
+
+    for chunk in ollama_client.client.generate_stream(model=model, prompt=prompt, **options):
+        token = chunk.get("response", "")
+        if token:
+            if metrics["time_to_first_token"] is None:
+                metrics["time_to_first_token"] = time.perf_counter() - started
+            tokens += 1
+            yield token
+        if chunk.get("done"):
+            metrics["prompt_tokens"] = chunk.get("prompt_eval_count")
+            metrics["eval_tokens"] = chunk.get("eval_count")
+            metrics["eval_duration"] = chunk.get("eval_duration")
+            metrics["context"] = chunk.get("context")
+            metrics["queue_seconds"] = chunk.get("queue_seconds")
+
+    total_seconds = time.perf_counter() - started
+    eval_tokens = metrics.get("eval_tokens") or tokens
+    eval_duration = metrics.get("eval_duration")
+    if eval_duration:
+        # Ollama reports durations in nanoseconds
+        tokens_per_second = eval_tokens / (eval_duration / 1e9)
+    else:
+        generation_seconds = total_seconds - (metrics["time_to_first_token"] or 0)
+        tokens_per_second = eval_tokens / generation_seconds if generation_seconds > 0 else 0.0
+    metrics.update({
+        "eval_tokens": eval_tokens,
+        "total_seconds": total_seconds,
+        "tokens_per_second": tokens_per_second,
+    })
+
+
+# Function to split a finished text into sentences
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_END.split(text) if sentence.strip()]
+
+
+# Function to pass tokens through unchanged while calling `on_sentence` for every completed sentence
+def iter_with_sentences(tokens, on_sentence):
+    pending = ""
+    for token in tokens:
+        yield token
+        pending += token
+        parts = SENTENCE_END.split(pending)
+        # The last part is still being written
+        for sentence in parts[:-1]:
+            if sentence.strip():
+                on_sentence(sentence.strip())
+        pending = parts[-1]
+    if pending.strip():
+        on_sentence(pending.strip())
@@ -0,0 +1,133 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+
+# ---------------------------
+# Video to Speech Audio
+# ---------------------------
+# Uploaded videos are copied to disk in chunks, and ffmpeg demuxes only the
+# audio stream (-vn, so no video frame is ever decoded) and resamples it to
+# 16 kHz mono 16-bit PCM WAV, the format speech recognizers expect. Memory use
+# stays flat however large the upload is, and ffmpeg's -progress output is
+# turned into a completion fraction for the UI.
+
+SPEECH_SAMPLE_RATE = 16000
+COPY_CHUNK_BYTES = 1024 * 1024
+
+DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class AudioExtractionError(Exception):
+    pass
+
+
+# Function to find the ffmpeg executable: $FFMPEG_BINARY, the one bundled with moviepy, or the PATH
+def ffmpeg_binary():
+    configured = os.environ.get("FFMPEG_BINARY")
+    if configured:
+        return configured
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        pass
+    found = shutil.which("ffmpeg")
+    if not found:
+        raise AudioExtractionError("ffmpeg was not found; install it or set FFMPEG_BINARY")
+    return found
+
+
+# Function to copy an uploaded file (any binary file object) to `path` in chunks.
+# Returns the number of bytes written.
+def save_upload(uploaded_file, path, chunk_bytes=COPY_CHUNK_BYTES, on_progress=None):
+    total = getattr(uploaded_file, "size", None)
+    uploaded_file.seek(0)
+    written = 0
+    with open(path, "wb") as output:
+        while True:
+            chunk = uploaded_file.read(chunk_bytes)
+            if not chunk:
+                break
+            output.write(chunk)
+            written += len(chunk)
+            if on_progress and total:
+                on_progress(min(written / total, 1.0))
+    return written
+
+
+# Function to read the duration in seconds that ffmpeg reports for a media file, or None
+def probe_duration(path, ffmpeg=None):
+    result = subprocess.run(
+        [ffmpeg or ffmpeg_binary(), "-hide_banner", "-nostdin", "-i", path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace",
+    )
+    # Without an output file ffmpeg exits with an error, but it has printed the input's details
+    match = DURATION.search(result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+# Function to write the audio track of a media file as mono 16-bit PCM WAV at `sample_rate`.
+# `on_progress` is called with the completed fraction while ffmpeg runs.
+def extract_speech_wav(input_path, output_path, sample_rate=SPEECH_SAMPLE_RATE, on_progress=None):
+    ffmpeg = ffmpeg_binary()
+    duration = probe_duration(input_path, ffmpeg) if on_progress else None
+    command = [
+        ffmpeg, "-hide_banner", "-nostdin", "-loglevel", "error", "-y",
+        "-i", input_path,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(sample_rate), "-acodec", "pcm_s16le",
+        "-progress", "pipe:1", "-nostats",
+        output_path,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+
+    # Drain stderr in the background so a chatty ffmpeg cannot block on a full pipe
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    reader.start()
+
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        # out_time_ms is in microseconds too; older ffmpeg versions only print that one
+        if key in ("out_time_us", "out_time_ms") and duration and on_progress and value.isdigit():
+            on_progress(min(int(value) / 1e6 / duration, 1.0))
+    process.wait()
+    reader.join()
+
+    if process.returncode != 0:
+        message = "".join(errors).strip() or f"ffmpeg exited with code {process.returncode}"
+        if "matches no streams" in message:
+            message = "the video has no audio track"
+        raise AudioExtractionError(message)
+    if on_progress:
+        on_progress(1.0)
+    return output_path
+
+
+# Function to turn an uploaded video into a speech-ready WAV file and return its path.
+# `on_progress(stage, fraction)` reports the "upload" copy and the "audio" extraction.
+def video_to_speech_wav(uploaded_file, sample_rate=SPEECH_SAMPLE_RATE, on_progress=None):
+    suffix = os.path.splitext(getattr(uploaded_file, "name", ""))[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_video_file:
+        video_path = tmp_video_file.name
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_audio_file:
+        audio_path = tmp_audio_file.name
+
+    try:
+        save_upload(uploaded_file, video_path,
+                    on_progress=(lambda fraction: on_progress("upload", fraction)) if on_progress else None)
+        extract_speech_wav(video_path, audio_path, sample_rate,
+                           on_progress=(lambda fraction: on_progress("audio", fraction)) if on_progress else None)
+    except Exception:
+        os.remove(audio_path)
+        raise
+    finally:
+        os.remove(video_path)
+    return audio_path
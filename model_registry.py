@@ -0,0 +1,156 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------------------
+# Lazy Model Registry
+# ---------------------------
+# Models are loaded the first time they are requested and then shared by every
+# Streamlit session in the process (this module is imported once per process,
+# unlike app.py which is re-executed on every rerun).
+
+# Memory budget for loaded models in MB, 0 means unlimited
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+
+
+# Function to read the resident memory of this process in bytes (0 if unavailable)
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget_bytes = int(memory_budget_mb) * 1024 * 1024
+        self._loaders = {}
+        self._models = OrderedDict()  # name -> model, least recently used first
+        self._stats = {}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._warming = set()
+
+    # Register a loader; re-registering keeps an already loaded model
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {
+                "loads": 0,
+                "hits": 0,
+                "evictions": 0,
+                "load_seconds": None,
+                "memory_bytes": 0,
+            })
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    # Return the model, loading it on first use
+    def get(self, name):
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self._stats[name]["hits"] += 1
+                return self._models[name]
+            if name not in self._loaders:
+                raise KeyError(f"No model registered under '{name}'")
+            load_lock = self._load_locks[name]
+
+        # Only one session loads a given model, the others wait for it
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    self._stats[name]["hits"] += 1
+                    return self._models[name]
+                loader = self._loaders[name]
+
+            rss_before = current_rss_bytes()
+            started = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - started
+            memory_bytes = max(current_rss_bytes() - rss_before, 0)
+
+            with self._lock:
+                self._models[name] = model
+                stats = self._stats[name]
+                stats["loads"] += 1
+                stats["load_seconds"] = load_seconds
+                stats["memory_bytes"] = memory_bytes
+                self._enforce_budget(keep=name)
+            return model
+
+    # Load the given models (all registered ones by default) in a background thread
+    def warm(self, names=None):
+        with self._lock:
+            pending = [
+                name for name in (names or list(self._loaders))
+                if name not in self._models and name not in self._warming
+            ]
+            self._warming.update(pending)
+        if not pending:
+            return None
+
+        def warm_models():
+            for name in pending:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Error warming model {name}: {e}")
+                finally:
+                    with self._lock:
+                        self._warming.discard(name)
+
+        thread = threading.Thread(target=warm_models, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def evict(self, name):
+        with self._lock:
+            if self._models.pop(name, None) is not None:
+                self._stats[name]["evictions"] += 1
+        gc.collect()
+
+    # Drop least recently used models until the budget is met, never the one just used
+    def _enforce_budget(self, keep=None):
+        if not self.memory_budget_bytes:
+            return
+        while self._loaded_bytes() > self.memory_budget_bytes:
+            victim = next((name for name in self._models if name != keep), None)
+            if victim is None:
+                break
+            self._models.pop(victim)
+            self._stats[victim]["evictions"] += 1
+        gc.collect()
+
+    def _loaded_bytes(self):
+        return sum(self._stats[name]["memory_bytes"] for name in self._models)
+
+    # Per-model report of load time and resident memory
+    def stats(self):
+        with self._lock:
+            report = []
+            for name, stats in self._stats.items():
+                load_seconds = stats["load_seconds"]
+                report.append({
+                    "model": name,
+                    "loaded": name in self._models,
+                    "load_seconds": round(load_seconds, 3) if load_seconds is not None else None,
+                    "memory_mb": round(stats["memory_bytes"] / (1024 * 1024), 1),
+                    "loads": stats["loads"],
+                    "hits": stats["hits"],
+                    "evictions": stats["evictions"],
+                })
+            return report
+
+
+# Process-wide registry shared by all sessions
+registry = ModelRegistry()
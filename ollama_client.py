@@ -0,0 +1,251 @@
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import queue
+import statistics
+import threading
+import time
+
+import ollama
+
+import telemetry
+
+
+# ---------------------------
+# Shared Ollama Client
+# ---------------------------
+# One asyncio event loop in a background thread owns a single pooled
+# ollama.AsyncClient for the whole process. Generations wait in a FIFO queue
+# for one of OLLAMA_MAX_CONCURRENT slots, and identical requests that are in
+# flight at the same time share one generation, whichever session sent them.
+
+DEFAULT_MAX_CONCURRENT = int(os.environ.get("OLLAMA_MAX_CONCURRENT", "2"))
+
+_DONE = object()
+
+
+class FairLimiter:
+    # Like asyncio.Semaphore, but waiters are served strictly first come, first served
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiters = collections.deque()
+
+    async def acquire(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next waiter so nobody can jump the queue
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class _SharedGeneration:
+    # One generation broadcast to every session that asked for it
+    def __init__(self):
+        self.chunks = []
+        self.subscribers = []
+        self.task = None
+
+    def subscribe(self, out_queue):
+        for chunk in self.chunks:
+            out_queue.put(chunk)
+        self.subscribers.append(out_queue)
+
+    def publish(self, item):
+        if item is not _DONE and not isinstance(item, Exception):
+            self.chunks.append(item)
+        for out_queue in self.subscribers:
+            out_queue.put(item)
+
+
+# Function to build the coalescing key of a generate request
+def request_key(request):
+    payload = json.dumps(request, sort_keys=True, default=list)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OllamaService:
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, host=None):
+        self.max_concurrent = max_concurrent
+        self.host = host
+        self._loop = None
+        self._client = None
+        self._limiter = None
+        self._inflight = {}
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._requests = 0
+        self._coalesced = 0
+        self._wait_seconds = collections.deque(maxlen=1000)
+
+    # Start the event loop thread on first use
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True).start()
+                self._loop = loop
+                self._submit(self._init_client()).result()
+        return self._loop
+
+    async def _init_client(self):
+        self._client = ollama.AsyncClient(host=self.host)
+        self._limiter = FairLimiter(self.max_concurrent)
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _acquire_slot(self):
+        queued = time.perf_counter()
+        with self._stats_lock:
+            self._waiting += 1
+        try:
+            await self._limiter.acquire()
+        finally:
+            with self._stats_lock:
+                self._waiting -= 1
+        waited = time.perf_counter() - queued
+        with self._stats_lock:
+            self._running += 1
+            self._wait_seconds.append(waited)
+        return waited
+
+    def _release_slot(self):
+        with self._stats_lock:
+            self._running -= 1
+        self._limiter.release()
+
+    async def _subscribe(self, request, out_queue):
+        key = request_key(request)
+        with self._stats_lock:
+            self._requests += 1
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = _SharedGeneration()
+            self._inflight[key] = shared
+            shared.task = asyncio.get_running_loop().create_task(self._run(request, shared))
+            # Removed however the task ends, even when it is cancelled before it starts
+            shared.task.add_done_callback(lambda _: self._forget(key, shared))
+        else:
+            with self._stats_lock:
+                self._coalesced += 1
+        shared.subscribe(out_queue)
+        return key
+
+    async def _unsubscribe(self, key, out_queue):
+        shared = self._inflight.get(key)
+        if shared is None or out_queue not in shared.subscribers:
+            return
+        shared.subscribers.remove(out_queue)
+        # Nobody is reading any more, free the slot for someone else; a new identical request starts afresh
+        if not shared.subscribers and shared.task and not shared.task.done():
+            self._forget(key, shared)
+            shared.task.cancel()
+
+    def _forget(self, key, shared):
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+
+    async def _run(self, request, shared):
+        waited = await self._acquire_slot()
+        try:
+            async for chunk in await self._client.generate(stream=True, **request):
+                if chunk.get("done"):
+                    # Let callers tell time spent queueing from time spent generating
+                    chunk = {**chunk, "queue_seconds": waited}
+                shared.publish(chunk)
+            shared.publish(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            shared.publish(e)
+        finally:
+            self._release_slot()
+
+    # Function to stream a completion as Ollama's chunk dicts; a blocking generator for Streamlit code
+    def generate_stream(self, model, prompt, context=None, **options):
+        self._ensure_loop()
+        request = {"model": model, "prompt": prompt, **options}
+        if context:
+            request["context"] = list(context)
+        out_queue = queue.Queue()
+        with telemetry.span("ollama_generate", model=model, prompt_chars=len(prompt)) as span:
+            started = time.perf_counter()
+            key = self._submit(self._subscribe(request, out_queue)).result()
+            try:
+                while True:
+                    item = out_queue.get()
+                    if item is _DONE:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    if "time_to_first_token" not in span.attributes:
+                        span.set(time_to_first_token=round(time.perf_counter() - started, 4))
+                    if item.get("done"):
+                        span.set(queue_seconds=round(item.get("queue_seconds", 0.0), 4),
+                                 prompt_tokens=item.get("prompt_eval_count"), eval_tokens=item.get("eval_count"))
+                    yield item
+            finally:
+                self._submit(self._unsubscribe(key, out_queue))
+
+    # Function to run a completion and return it like ollama.generate(stream=False)
+    def generate(self, model, prompt, context=None, **options):
+        text = []
+        final = {}
+        for chunk in self.generate_stream(model, prompt, context=context, **options):
+            text.append(chunk.get("response", ""))
+            final = chunk
+        return {**final, "response": "".join(text)}
+
+    async def _embed(self, model, texts):
+        await self._acquire_slot()
+        try:
+            return await self._client.embed(model=model, input=texts)
+        finally:
+            self._release_slot()
+
+    def embed(self, model, input):
+        self._ensure_loop()
+        with telemetry.span("ollama_embed", model=model, texts=len(input) if isinstance(input, list) else 1):
+            return self._submit(self._embed(model, input)).result()
+
+    # Queue depth and waiting times, for sizing the Ollama hardware
+    def stats(self):
+        with self._stats_lock:
+            waits = list(self._wait_seconds)
+            report = {
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queue_depth": self._waiting,
+                "requests": self._requests,
+                "coalesced": self._coalesced,
+            }
+        report["wait_p50_seconds"] = round(statistics.median(waits), 3) if waits else 0.0
+        report["wait_p95_seconds"] = round(telemetry.percentile(waits, 0.95), 3)
+        return report
+
+
+# Process-wide client shared by all sessions
+client = OllamaService()
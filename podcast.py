@@ -0,0 +1,172 @@
+import base64
+import io
+import math
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import lazy_imports
+import translation
+from extraction_cache import ExtractionCache
+
+gtts = lazy_imports.lazy("gtts")
+pyttsx3 = lazy_imports.lazy("pyttsx3")
+
+
+# ---------------------------
+# Podcast Synthesis
+# ---------------------------
+# The text is cut into sentence-aligned segments that are synthesized
+# concurrently by a pluggable TTS backend. Finished segments are handed back
+# strictly in order, so the first part of the podcast can be played while
+# later parts are still rendering. Every segment is cached by its text hash,
+# so after a document is edited only the changed segments are synthesized.
+
+PODCAST_BACKEND = os.environ.get("PODCAST_BACKEND", "gtts")
+PODCAST_WORKERS = int(os.environ.get("PODCAST_WORKERS", "4"))
+SEGMENT_CHARS = int(os.environ.get("PODCAST_SEGMENT_CHARS", "800"))
+PODCAST_CACHE_DIR = os.environ.get(
+    "PODCAST_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "podcast")
+)
+PODCAST_CACHE_MB = int(os.environ.get("PODCAST_CACHE_MB", "256"))
+
+# Bump when synthesis settings change so cached segments are not reused
+SYNTHESIS_VERSION = 1
+
+
+class GTTSBackend:
+    name = "gtts"
+    format = "mp3"
+
+    def __init__(self, lang="en"):
+        self.lang = lang
+
+    def synthesize(self, text):
+        buffer = io.BytesIO()
+        gtts.gTTS(text, lang=self.lang).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class EspeakBackend:
+    # Offline synthesis with the espeak command line tool
+    name = "espeak"
+    format = "wav"
+
+    def synthesize(self, text):
+        result = subprocess.run(["espeak", "--stdout", "-s", "160"], input=text.encode("utf-8"),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return result.stdout
+
+
+class Pyttsx3Backend:
+    # Offline synthesis with pyttsx3; its engine is not thread-safe, so segments are rendered one at a time
+    name = "pyttsx3"
+    format = "wav"
+    _lock = threading.Lock()
+
+    def synthesize(self, text):
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
+            path = tmp_file.name
+        try:
+            with self._lock:
+                engine = pyttsx3.init()
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+            with open(path, "rb") as audio_file:
+                return audio_file.read()
+        finally:
+            os.remove(path)
+
+
+class StubBackend:
+    # Deterministic stand-in for tests and benchmarks: a quiet tone of 50 ms per word
+    name = "stub"
+    format = "wav"
+
+    def __init__(self, seconds_per_segment=0.0, sample_rate=8000):
+        self.seconds_per_segment = seconds_per_segment
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text):
+        if self.seconds_per_segment:
+            time.sleep(self.seconds_per_segment)
+        frames = int(len(text.split()) * 0.05 * self.sample_rate)
+        samples = (int(1000 * math.sin(2 * math.pi * 440 * i / self.sample_rate)) for i in range(frames))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(struct.pack(f"<{frames}h", *samples))
+        return buffer.getvalue()
+
+
+BACKENDS = {"gtts": GTTSBackend, "espeak": EspeakBackend, "pyttsx3": Pyttsx3Backend, "stub": StubBackend}
+
+
+# Function to create the backend named by PODCAST_BACKEND (or `name`)
+def get_backend(name=None):
+    return BACKENDS[name or PODCAST_BACKEND]()
+
+
+# Shared on-disk cache of synthesized segments for the whole process
+cache = ExtractionCache(directory=PODCAST_CACHE_DIR, max_mb=PODCAST_CACHE_MB)
+
+
+# Function to split text into sentence-aligned segments of at most `max_chars`
+def split_segments(text, max_chars=SEGMENT_CHARS):
+    return [segment.strip() for segment in translation.split_text(text, max_chars) if segment.strip()]
+
+
+# Function to synthesize one segment, from the cache when it was synthesized before.
+# Returns (audio bytes, whether it came from the cache).
+def synthesize_segment(text, backend):
+    key = cache.key(text.encode("utf-8"), f"tts-{backend.name}", SYNTHESIS_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return base64.b64decode(cached["audio"]), True
+    audio = backend.synthesize(text)
+    try:
+        cache.put(key, {"audio": base64.b64encode(audio).decode("ascii")})
+    except OSError as e:
+        print(f"Error writing podcast cache: {e}")
+    return audio, False
+
+
+# Function to synthesize text segment by segment on a thread pool.
+# Yields {"index", "total", "text", "audio", "cached"} in reading order as soon as each segment
+# and all segments before it are ready.
+def synthesize(text, backend=None, max_workers=PODCAST_WORKERS, max_chars=SEGMENT_CHARS):
+    backend = backend or get_backend()
+    segments = split_segments(text, max_chars)
+    if not segments:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segments))), thread_name_prefix="podcast")
+    try:
+        # Submitted in order, so the first segments are rendered first
+        futures = [executor.submit(synthesize_segment, segment, backend) for segment in segments]
+        for index, (segment, future) in enumerate(zip(segments, futures)):
+            audio, cached = future.result()
+            yield {"index": index, "total": len(segments), "text": segment, "audio": audio, "cached": cached}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to join audio segments of one format into a single file's bytes.
+# MP3 frames can simply be concatenated; WAV segments are rewritten under one header.
+def stitch(segments, audio_format):
+    if audio_format == "mp3":
+        return b"".join(segments)
+    output = io.BytesIO()
+    with wave.open(output, "wb") as stitched:
+        for index, segment in enumerate(segments):
+            with wave.open(io.BytesIO(segment)) as wav_file:
+                if index == 0:
+                    stitched.setparams(wav_file.getparams())
+                stitched.writeframes(wav_file.readframes(wav_file.getnframes()))
+    return output.getvalue()
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import retrieval
+
+
+# ---------------------------
+# LLM Response Cache
+# ---------------------------
+# Responses are stored in SQLite under (model, prompt template, context hash,
+# question). A question is answered from the cache when it matches exactly, or,
+# when the semantic tier is enabled, when its embedding is close enough to a
+# cached question asked against the same context.
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "RESPONSE_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "responses.sqlite3")
+)
+DEFAULT_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+# Cosine similarity needed for a semantic hit, 0 disables the semantic tier
+DEFAULT_SEMANTIC_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0"))
+
+
+# Function to hash text for use in cache keys
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Function to normalize a question so trivial differences (case, spacing) still hit
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, semantic_threshold=DEFAULT_SEMANTIC_THRESHOLD, embedder=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self._embedder = embedder
+        self._lock = threading.Lock()
+        self._metrics = {}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " scope TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " embedder TEXT,"
+            " embedding BLOB,"
+            " generation_seconds REAL NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    # The embedder is only created when the semantic tier is actually used
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = retrieval.default_embedder()
+        return self._embedder
+
+    @staticmethod
+    def _scope(model, template, context):
+        return f"{model}|{template}|{text_hash(context)}"
+
+    def _record(self, tab, outcome, saved_seconds=0.0):
+        with self._lock:
+            metrics = self._metrics.setdefault(tab, {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0})
+            metrics[outcome] += 1
+            metrics["saved_seconds"] += saved_seconds
+
+    # Return {"response", "match", "similarity"} for a cached answer, or None on a miss
+    def lookup(self, tab, model, template, context, question):
+        scope = self._scope(model, template, context)
+        normalized = normalize_question(question)
+        key = text_hash(f"{scope}|{normalized}")
+        now = time.time()
+        oldest = now - self.ttl_seconds
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, generation_seconds FROM responses WHERE key = ? AND created >= ?", (key, oldest)
+            ).fetchone()
+            if row:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+        if row:
+            self._record(tab, "exact_hits", row[1])
+            return {"response": row[0], "match": "exact", "similarity": 1.0}
+
+        if self.semantic_threshold > 0:
+            match = self._semantic_lookup(scope, normalized, oldest, now)
+            if match:
+                self._record(tab, "semantic_hits", match.pop("generation_seconds"))
+                return match
+
+        self._record(tab, "misses")
+        return None
+
+    def _semantic_lookup(self, scope, normalized, oldest, now):
+        embedder = self.embedder
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, response, embedding, generation_seconds FROM responses"
+                " WHERE scope = ? AND embedder = ? AND created >= ? AND embedding IS NOT NULL",
+                (scope, embedder.name, oldest),
+            ).fetchall()
+        if not rows:
+            return None
+        query = self._embed(normalized)
+        vectors = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        scores = vectors @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, rows[best][0]))
+            self._db.commit()
+        return {
+            "response": rows[best][1],
+            "match": "semantic",
+            "similarity": float(scores[best]),
+            "generation_seconds": rows[best][3],
+        }
+
+    def _embed(self, text):
+        vector = self.embedder.embed([text])[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def store(self, model, template, context, question, response, generation_seconds):
+        if not response:
+            return
+        scope = self._scope(model, template, context)
+        normalized = normalize_question(question)
+        key = text_hash(f"{scope}|{normalized}")
+        embedder_name, embedding = None, None
+        if self.semantic_threshold > 0:
+            try:
+                embedding = self._embed(normalized).astype(np.float32).tobytes()
+                embedder_name = self.embedder.name
+            except Exception as e:
+                print(f"Error embedding cached question: {e}")
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalized, response, embedder_name, embedding, generation_seconds, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    # Remove expired entries, then least recently used ones beyond max_entries
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    # Per-tab hit rates and the generation time saved by cache hits
+    def stats(self):
+        with self._lock:
+            report = []
+            for tab, metrics in self._metrics.items():
+                lookups = metrics["exact_hits"] + metrics["semantic_hits"] + metrics["misses"]
+                hits = metrics["exact_hits"] + metrics["semantic_hits"]
+                report.append({
+                    "tab": tab,
+                    **metrics,
+                    "saved_seconds": round(metrics["saved_seconds"], 2),
+                    "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                })
+            return report
+
+
+# Process-wide cache shared by all sessions
+cache = ResponseCache()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+import ollama_client
+
+
+# ---------------------------
+# Chunked Retrieval Index
+# ---------------------------
+# Documents are split into chunks that remember where they came from (file and
+# page/slide/sheet), embedded into a NumPy matrix, and only the chunks most
+# similar to a question are sent to the LLM.
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
+
+WORD = re.compile(r"\w+")
+
+
+# Function to split segments ({"source", "location", "text"}) into chunks of about `chunk_chars`,
+# merging small neighbouring segments of the same file and overlapping long ones
+def chunk_segments(segments, chunk_chars=1000, overlap_chars=150):
+    chunks = []
+    current = None
+
+    def flush():
+        if current and current["text"].strip():
+            chunks.append(current)
+
+    for segment in segments:
+        text = segment["text"].strip()
+        if not text:
+            continue
+
+        # Merge into the running chunk when it belongs to the same file and still fits
+        if current and current["source"] == segment["source"] and len(current["text"]) + len(text) + 1 <= chunk_chars:
+            current["text"] += "\n" + text
+            current["last_location"] = segment["location"]
+            current["location"] = f"{current['first_location']} – {segment['location']}"
+            continue
+
+        flush()
+        current = None
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_chars, len(text))
+            if end < len(text):
+                # Prefer to cut at a sentence end, then at whitespace
+                cut = max(text.rfind(". ", start, end), text.rfind("\n", start, end))
+                if cut <= start + chunk_chars // 2:
+                    cut = text.rfind(" ", start, end)
+                if cut > start + chunk_chars // 2:
+                    end = cut + 1
+            piece = {
+                "source": segment["source"],
+                "location": segment["location"],
+                "first_location": segment["location"],
+                "last_location": segment["location"],
+                "text": text[start:end].strip(),
+            }
+            if end >= len(text):
+                current = piece
+                break
+            chunks.append(piece)
+            start = max(end - overlap_chars, start + 1)
+
+    flush()
+    for chunk in chunks:
+        del chunk["first_location"], chunk["last_location"]
+    return chunks
+
+
+class HashingEmbedder:
+    # Local fallback: hashed word and word-pair counts, needs no model or server
+    name = "hashing"
+
+    def __init__(self, dimensions=1024):
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = WORD.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return vectors
+
+
+class OllamaEmbedder:
+    def __init__(self, model=EMBEDDING_MODEL, batch_size=32):
+        self.model = model
+        self.name = f"ollama:{model}"
+        self.batch_size = batch_size
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = ollama_client.client.embed(model=self.model, input=list(texts[start:start + self.batch_size]))
+            vectors.extend(response["embeddings"])
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+
+# Function to pick the Ollama embedder when the embedding model is available, else the hashing one
+def default_embedder():
+    embedder = OllamaEmbedder()
+    try:
+        embedder.embed(["ping"])
+        return embedder
+    except Exception:
+        return HashingEmbedder()
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    def __init__(self, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.chunks = []
+        self.vectors = None
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add(self, chunks):
+        chunks = list(chunks)
+        if not chunks:
+            return
+        vectors = _normalize(self.embedder.embed([chunk["text"] for chunk in chunks]))
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        self.chunks.extend(chunks)
+
+    # Return the `k` chunks most similar to the query as (score, chunk) pairs, best first
+    def search(self, query, k=4):
+        if not self.chunks:
+            return []
+        query_vector = _normalize(self.embedder.embed([query]))[0]
+        scores = self.vectors @ query_vector
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.chunks[i]) for i in top]
+
+
+# Function to label a chunk with its provenance, e.g. "report.pdf, page 3"
+def format_source(chunk):
+    return f"{chunk['source']}, {chunk['location']}"
+
+
+# Function to build a numbered context from search results so the answer can cite [1], [2], ...
+def build_context(results):
+    sources = "\n\n".join(
+        f"[{number}] ({format_source(chunk)})\n{chunk['text']}"
+        for number, (_, chunk) in enumerate(results, start=1)
+    )
+    return (
+        "Answer the question using only the numbered sources below. "
+        "Cite the sources you used like [1] or [2].\n\n"
+        f"{sources}\n"
+    )
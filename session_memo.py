@@ -0,0 +1,56 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import telemetry
+
+
+# ---------------------------
+# Rerun Memoization
+# ---------------------------
+# Streamlit re-executes app.py from the top on every interaction. Values that
+# are derived from a session's inputs (extracted document text, previews,
+# sentiment and emotion results) are kept per session and keyed by what they
+# were computed from: the upload file ids and sizes, a hash of the input text
+# and the call's options. A rerun with unchanged inputs reuses the value.
+
+SESSION_MEMO_ENTRIES = int(os.environ.get("SESSION_MEMO_ENTRIES", "32"))
+
+
+class SessionMemo:
+    def __init__(self, max_entries=SESSION_MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (name, inputs) -> value, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    # Function to return the value of `name` for `inputs`, calling `compute()` only when they were
+    # not seen recently. None results (failures that were already reported) are not kept.
+    def get(self, name, inputs, compute):
+        key = (name, inputs)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            telemetry.metrics.inc("sm_session_memo_total", {"name": name, "result": "hit"})
+            return self._entries[key]
+        self.misses += 1
+        telemetry.metrics.inc("sm_session_memo_total", {"name": name, "result": "miss"})
+        value = compute()
+        if value is not None:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Function to identify a set of uploaded files; Streamlit gives every new upload a new file id
+def upload_key(uploaded_files):
+    return tuple((uploaded_file.name, uploaded_file.size, uploaded_file.file_id) for uploaded_file in uploaded_files)
+
+
+# Function to identify an input text without keeping a second copy of it in the key
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ---------------------------
+# Session Store
+# ---------------------------
+# The only per-user state the assistant's pipelines keep between requests is
+# the conversation memory of each chat tab. It lives in a session store keyed
+# by (session id, name). The in-process store keeps live objects and suits a
+# single Streamlit or API process; the SQLite store keeps JSON state in a file
+# that several worker processes share, so any worker behind a load balancer
+# can continue any session. Other backends only need get/put/delete.
+
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(24 * 3600)))
+SESSION_STORE_PATH = os.environ.get(
+    "SESSION_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "sessions.sqlite3")
+)
+
+# Values kept by the in-process store, least recently used ones are dropped
+MEMORY_STORE_ENTRIES = 10000
+
+
+class MemorySessionStore:
+    # Values are kept as the objects themselves, so nothing has to be serialized
+    shared = False
+
+    def __init__(self, ttl_seconds=SESSION_TTL, max_entries=MEMORY_STORE_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._values = OrderedDict()  # (session, name) -> (value, last used)
+        self._lock = threading.Lock()
+
+    def get(self, session, name):
+        key = (session, name)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl_seconds:
+                self._values.pop(key, None)
+                return None
+            self._values[key] = (entry[0], time.time())
+            self._values.move_to_end(key)
+            return entry[0]
+
+    def put(self, session, name, value):
+        with self._lock:
+            self._values[(session, name)] = (value, time.time())
+            self._values.move_to_end((session, name))
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+    def delete(self, session, name):
+        with self._lock:
+            self._values.pop((session, name), None)
+
+
+class SQLiteSessionStore:
+    # Values must be JSON-serializable; the file can be shared by worker processes on one host
+    shared = True
+
+    def __init__(self, path=SESSION_STORE_PATH, ttl_seconds=SESSION_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writers from other processes are waited for instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_values ("
+            " session TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (session, name))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS session_values_updated ON session_values (updated)")
+        self._db.commit()
+
+    def get(self, session, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM session_values WHERE session = ? AND name = ? AND updated >= ?",
+                (session, name, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session, name, value):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO session_values (session, name, value, updated) VALUES (?, ?, ?, ?)",
+                (session, name, json.dumps(value), now),
+            )
+            self._db.execute("DELETE FROM session_values WHERE updated < ?", (now - self.ttl_seconds,))
+            self._db.commit()
+
+    def delete(self, session, name):
+        with self._lock:
+            self._db.execute("DELETE FROM session_values WHERE session = ? AND name = ?", (session, name))
+            self._db.commit()
+
+
+STORES = {"memory": MemorySessionStore, "sqlite": SQLiteSessionStore}
+
+
+# Function to create the store named by SESSION_STORE (or `name`)
+def get_store(name=None):
+    return STORES[name or SESSION_STORE]()
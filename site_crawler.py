@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import web_fetch
+
+
+# ---------------------------
+# Site Crawler
+# ---------------------------
+# Crawls a site from a seed page or sitemap in a background thread. Pages are
+# fetched concurrently with asyncio (the blocking fetch runs in worker threads),
+# at most `per_host` at a time per host, and deduplicated by canonical URL and
+# by content hash. Pages that a host's robots.txt disallows are skipped. Pages
+# are available through `pages` as soon as they arrive, so the chat can use
+# them before the crawl has finished.
+
+MAX_SITEMAPS = 20
+
+
+# Function to normalize a URL so the same page is not crawled twice
+def normalize_url(url):
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path[:-1]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def is_sitemap(url):
+    path = urlsplit(url).path.lower()
+    return path.endswith(".xml") or "sitemap" in path
+
+
+# Function to read the page URLs and nested sitemap URLs of a sitemap document
+def parse_sitemap(data):
+    root = ET.fromstring(data)
+    locations = [element.text.strip() for element in root.iter() if element.tag.endswith("loc") and element.text]
+    if root.tag.endswith("sitemapindex"):
+        return [], locations
+    return locations, []
+
+
+class SiteCrawler:
+    def __init__(self, seed, max_depth=2, max_pages=50, concurrency=8, per_host=2, delay=0.0,
+                 same_host=True, robots=True, fetch=web_fetch.fetch_page, fetch_bytes=web_fetch.fetch_bytes):
+        self.seed = seed
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.delay = delay
+        self.same_host = same_host
+        self.robots = robots
+        self.fetch = fetch
+        self.fetch_bytes = fetch_bytes
+        self.pages = []  # {"url", "depth", "text"} in the order they were crawled
+        self.errors = []  # (url, message)
+        self.done = False
+        self._queued = 0
+        self._seen = set()
+        self._content_hashes = set()
+        self._host_limits = {}
+        self._robots = {}  # host -> task reading its robots.txt
+        self._allowed_hosts = set()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="site-crawler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return {"pages": len(self.pages), "queued": self._queued, "errors": len(self.errors), "done": self.done}
+
+    # Function to get the pages crawled after the first `start` ones
+    def pages_since(self, start):
+        with self._lock:
+            return list(self.pages[start:])
+
+    def _run(self):
+        try:
+            asyncio.run(self._crawl())
+        except Exception as e:
+            with self._lock:
+                self.errors.append((self.seed, str(e)))
+        finally:
+            with self._lock:
+                self.done = True
+
+    async def _crawl(self):
+        frontier = asyncio.Queue()
+        seed_urls = await self._seed_urls()
+        self._allowed_hosts = {urlsplit(url).netloc.lower() for url in seed_urls}
+        for url in seed_urls:
+            self._enqueue(frontier, url, 0)
+
+        workers = [asyncio.create_task(self._worker(frontier)) for _ in range(self.concurrency)]
+        await frontier.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    # Function to expand a sitemap seed into its page URLs
+    async def _seed_urls(self):
+        if not is_sitemap(self.seed):
+            return [self.seed]
+        pages = []
+        sitemaps = [self.seed]
+        visited = 0
+        while sitemaps and visited < MAX_SITEMAPS:
+            sitemap = sitemaps.pop(0)
+            visited += 1
+            try:
+                data = await asyncio.to_thread(self.fetch_bytes, sitemap)
+                page_urls, nested = parse_sitemap(data)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append((sitemap, str(e)))
+                continue
+            pages.extend(page_urls)
+            sitemaps.extend(nested)
+        return pages[:self.max_pages * 2] or [self.seed]
+
+    def _enqueue(self, frontier, url, depth):
+        url = normalize_url(url)
+        if url in self._seen:
+            return
+        self._seen.add(url)
+        with self._lock:
+            self._queued += 1
+        frontier.put_nowait((url, depth))
+
+    def _host_limit(self, host):
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    # Function to check a URL against its host's robots.txt, read once per host.
+    # A robots.txt that cannot be fetched (e.g. 404) allows everything.
+    async def _robots_allow(self, url):
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        if host not in self._robots:
+            robots_url = urlunsplit((parts.scheme, parts.netloc, "/robots.txt", "", ""))
+            self._robots[host] = asyncio.create_task(self._read_robots(robots_url))
+        parser = await self._robots[host]
+        return parser is None or parser.can_fetch(web_fetch.USER_AGENT, url)
+
+    async def _read_robots(self, robots_url):
+        try:
+            data = await asyncio.to_thread(self.fetch_bytes, robots_url)
+        except Exception:
+            return None
+        parser = RobotFileParser(robots_url)
+        parser.parse(data.decode("utf-8", errors="replace").splitlines())
+        return parser
+
+    async def _worker(self, frontier):
+        while True:
+            url, depth = await frontier.get()
+            try:
+                with self._lock:
+                    self._queued -= 1
+                    full = len(self.pages) >= self.max_pages
+                if not full and not self._stop.is_set():
+                    await self._visit(frontier, url, depth)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append((url, str(e)))
+            finally:
+                frontier.task_done()
+
+    async def _visit(self, frontier, url, depth):
+        if self.robots and not await self._robots_allow(url):
+            return
+        async with self._host_limit(urlsplit(url).netloc.lower()):
+            page, _ = await asyncio.to_thread(self.fetch, url)
+            if self.delay:
+                # Politeness pause before the next request to this host
+                await asyncio.sleep(self.delay)
+
+        final_url = page.get("final_url") or url
+        canonical = normalize_url(urljoin(final_url, page.get("canonical") or final_url))
+        if canonical != url:
+            if canonical in self._seen:
+                return
+            self._seen.add(canonical)
+
+        content_hash = hashlib.sha256(page["text"].encode("utf-8")).hexdigest()
+        with self._lock:
+            if content_hash in self._content_hashes or len(self.pages) >= self.max_pages:
+                return
+            self._content_hashes.add(content_hash)
+            self.pages.append({"url": canonical, "depth": depth, "text": page["text"]})
+
+        if depth >= self.max_depth:
+            return
+        for link in page.get("links", []):
+            absolute = urljoin(final_url, link)
+            parts = urlsplit(absolute)
+            if parts.scheme not in ("http", "https"):
+                continue
+            if self.same_host and parts.netloc.lower() not in self._allowed_hosts:
+                continue
+            self._enqueue(frontier, absolute, depth + 1)
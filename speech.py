@@ -0,0 +1,191 @@
+import io
+import os
+import queue
+import shlex
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+
+import lazy_imports
+import llm_streaming
+import telemetry
+
+gtts = lazy_imports.lazy("gtts")
+
+
+# ---------------------------
+# Speech Output
+# ---------------------------
+# One process-wide service speaks the bot's replies. Replies wait in a bounded
+# queue instead of each starting its own thread, so they never talk over each
+# other. A synthesis thread turns sentences into audio while a playback thread
+# plays the previous one, so speech starts after the first sentence. Repeated
+# phrases are served from an in-memory cache, temp files are removed after
+# playback, and stop() cancels queued speech and interrupts the current one.
+
+SPEECH_QUEUE_SIZE = int(os.environ.get("SPEECH_QUEUE_SIZE", "8"))
+SPEECH_PLAYER = os.environ.get("SPEECH_PLAYER", "mpg321 -q")
+PHRASE_CACHE_SIZE = 256
+
+# Synthesized sentences waiting for the player; keeps synthesis at most this far ahead
+PLAYBACK_AHEAD = 2
+
+
+# Function to synthesize a sentence to MP3 bytes with gTTS
+def gtts_synthesize(text):
+    buffer = io.BytesIO()
+    gtts.gTTS(text).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class SpeechService:
+    def __init__(self, max_queued=SPEECH_QUEUE_SIZE, player=SPEECH_PLAYER, synthesize=gtts_synthesize,
+                 cache_size=PHRASE_CACHE_SIZE):
+        self.player = shlex.split(player)
+        self.synthesize = synthesize
+        self.cache_size = cache_size
+        self._requests = queue.Queue(maxsize=max_queued)
+        self._playback = queue.Queue(maxsize=PLAYBACK_AHEAD)
+        self._cache = OrderedDict()
+        self._generation = 0
+        self._process = None
+        self._lock = threading.Lock()
+        self._threads = []
+        self._synthesis_seconds = deque(maxlen=200)
+        self._spoken = 0
+        self._dropped = 0
+        self._cache_hits = 0
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._synthesis_loop, name="speech-synthesis", daemon=True),
+                threading.Thread(target=self._playback_loop, name="speech-playback", daemon=True),
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    # Function to queue a reply for speaking. `text` is a string or an iterable of sentences that may
+    # still be produced while it is spoken. Returns False when the queue is full and the reply is dropped.
+    def say(self, text):
+        self._start()
+        sentences = llm_streaming.split_sentences(text) if isinstance(text, str) else text
+        try:
+            self._requests.put_nowait((self._generation, sentences))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+
+    # Function to cancel everything queued and interrupt the sentence being played
+    def stop(self):
+        with self._lock:
+            self._generation += 1
+            process = self._process
+        for pending in (self._requests, self._playback):
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is self._playback:
+                    self._remove(item[1])
+        if process and process.poll() is None:
+            process.terminate()
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def _audio(self, sentence):
+        with self._lock:
+            if sentence in self._cache:
+                self._cache.move_to_end(sentence)
+                self._cache_hits += 1
+                return self._cache[sentence]
+        started = time.perf_counter()
+        with telemetry.span("tts_synthesize", chars_in=len(sentence)) as span:
+            audio = self.synthesize(sentence)
+            span.set(bytes_out=len(audio))
+        with self._lock:
+            self._synthesis_seconds.append(time.perf_counter() - started)
+            self._cache[sentence] = audio
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return audio
+
+    def _synthesis_loop(self):
+        while True:
+            generation, sentences = self._requests.get()
+            for sentence in sentences:
+                if self._cancelled(generation):
+                    # Drain a streamed reply without speaking it, so its producer is never blocked
+                    continue
+                try:
+                    audio = self._audio(sentence)
+                except Exception as e:
+                    print(f"Error synthesizing speech: {e}")
+                    continue
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
+                    tmp_file.write(audio)
+                self._put_playback(generation, tmp_file.name)
+
+    # Wait for room in the playback queue, giving up if the reply is cancelled meanwhile
+    def _put_playback(self, generation, path):
+        while not self._cancelled(generation):
+            try:
+                self._playback.put((generation, path), timeout=0.2)
+                return
+            except queue.Full:
+                continue
+        self._remove(path)
+
+    def _playback_loop(self):
+        while True:
+            generation, path = self._playback.get()
+            try:
+                with self._lock:
+                    if self._cancelled(generation):
+                        continue
+                    self._process = subprocess.Popen(self.player + [path], stdout=subprocess.DEVNULL,
+                                                     stderr=subprocess.DEVNULL)
+                    process = self._process
+                process.wait()
+                with self._lock:
+                    self._process = None
+                    self._spoken += 1
+            except OSError as e:
+                print(f"Error playing speech: {e}")
+            finally:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            seconds = sorted(self._synthesis_seconds)
+            report = {
+                "queued_replies": self._requests.qsize(),
+                "queued_sentences": self._playback.qsize(),
+                "speaking": self._process is not None,
+                "sentences_spoken": self._spoken,
+                "dropped_replies": self._dropped,
+                "phrase_cache_hits": self._cache_hits,
+            }
+        report["synthesis_p50_seconds"] = round(statistics.median(seconds), 3) if seconds else 0.0
+        report["synthesis_p95_seconds"] = round(telemetry.percentile(seconds, 0.95), 3)
+        return report
+
+
+# Process-wide speech service shared by all sessions
+service = SpeechService()
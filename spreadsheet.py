@@ -0,0 +1,225 @@
+import csv
+import datetime
+import io
+import os
+from contextlib import closing
+
+import lazy_imports
+
+openpyxl = lazy_imports.lazy("openpyxl")
+
+
+# ---------------------------
+# Spreadsheet Profiles
+# ---------------------------
+# Excel workbooks (every sheet) and CSV files are read row by row, never as a
+# whole DataFrame. One pass builds a compact profile of each sheet: its row
+# count and, per column, the inferred type, empty cells, numeric and date
+# ranges and the most frequent values. The profile is what goes into the
+# prompt; the rows themselves are fetched on demand, a page at a time, and as
+# retrieved row blocks for the question being asked.
+
+SPREADSHEET_EXTENSIONS = (".xlsx", ".csv")
+
+# Distinct values counted per column for the top values; beyond it, values seen once are dropped
+MAX_TRACKED_VALUES = 1000
+TOP_VALUES = 5
+# Longest cell text kept for top values and summaries
+MAX_VALUE_CHARS = 40
+
+# Bump when the profile changes so cached profiles are not reused
+PROFILE_VERSION = 1
+
+
+def is_spreadsheet(name):
+    return os.path.splitext(name)[1].lower() in SPREADSHEET_EXTENSIONS
+
+
+# Function to yield (sheet title, header row, iterator over the remaining rows) for every sheet of
+# an .xlsx workbook or a .csv file. Rows are read lazily as the iterator is consumed.
+def iter_sheets(name, data):
+    if os.path.splitext(name)[1].lower() == ".csv":
+        yield from _iter_csv_sheet(name, data)
+        return
+    workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is not None:
+                yield sheet.title, header, rows
+    finally:
+        workbook.close()
+
+
+def _iter_csv_sheet(name, data):
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace", newline="")
+    sample = text.read(64 * 1024)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = (tuple(_parse_csv_value(value) for value in row) for row in csv.reader(text, dialect))
+    header = next(rows, None)
+    if header is not None:
+        yield os.path.splitext(os.path.basename(name))[0], header, rows
+
+
+# CSV cells are text; numbers and ISO dates are converted so they are profiled like Excel's cells
+def _parse_csv_value(value):
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if value[:4].isdigit() and value[4:5] == "-":
+        try:
+            return datetime.datetime.fromisoformat(value) if len(value) > 10 else datetime.date.fromisoformat(value)
+        except ValueError:
+            pass
+    return value
+
+
+KINDS = {str: "text", int: "number", float: "number", bool: "boolean",
+         datetime.datetime: "date", datetime.date: "date", datetime.time: "date"}
+
+
+def _kind(value):
+    kind = KINDS.get(type(value))
+    if kind:
+        return kind
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return "date"
+    return "text"
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + "…"
+
+
+class _ColumnStats:
+    def __init__(self, name):
+        self.name = name
+        self.kinds = {}
+        self.empty = 0
+        self.ranges = {}  # kind -> [min, max], numbers and dates are never compared with each other
+        self.total = 0.0
+        self.numbers = 0
+        self.counts = {}
+        self.overflow = False
+
+    def add(self, value):
+        if value is None or value == "":
+            self.empty += 1
+            return
+        kind = _kind(value)
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        if kind in ("number", "date"):
+            comparable = value if kind == "number" else str(value)
+            value_range = self.ranges.get(kind)
+            if value_range is None:
+                self.ranges[kind] = [comparable, comparable]
+            elif comparable < value_range[0]:
+                value_range[0] = comparable
+            elif comparable > value_range[1]:
+                value_range[1] = comparable
+            if kind == "number":
+                self.total += value
+                self.numbers += 1
+        key = _short(value)
+        if key in self.counts or len(self.counts) < MAX_TRACKED_VALUES:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        else:
+            # Keep memory bounded: forget values seen only once, the counts become approximate
+            self.overflow = True
+            self.counts = {value: count for value, count in self.counts.items() if count > 1}
+            if len(self.counts) < MAX_TRACKED_VALUES:
+                self.counts[key] = 1
+
+    def profile(self):
+        kind = max(self.kinds, key=self.kinds.get) if self.kinds else "empty"
+        column = {"name": self.name, "type": kind, "empty": self.empty,
+                  "distinct": f"{MAX_TRACKED_VALUES}+" if self.overflow else len(self.counts)}
+        if kind in self.ranges:
+            column["min"], column["max"] = (_short(value) for value in self.ranges[kind])
+        if self.numbers:
+            column["mean"] = round(self.total / self.numbers, 4)
+        if kind in ("text", "boolean") or not self.overflow:
+            top = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:TOP_VALUES]
+            column["top"] = [[value, count] for value, count in top if count > 1]
+        return column
+
+
+# Function to profile every sheet in one streaming pass.
+# Returns {"source", "sheets": [{"title", "rows", "columns": [{"name", "type", "empty", "distinct", ...}]}]}
+def profile(name, data):
+    sheets = []
+    for title, header, rows in iter_sheets(name, data):
+        columns = [_ColumnStats(_short(value) if value not in (None, "") else f"column {number}")
+                   for number, value in enumerate(header, start=1)]
+        row_count = 0
+        for row in rows:
+            row_count += 1
+            for index, value in enumerate(row):
+                if index >= len(columns):
+                    columns.append(_ColumnStats(f"column {index + 1}"))
+                    columns[-1].empty = row_count - 1
+                columns[index].add(value)
+            for column in columns[len(row):]:
+                column.empty += 1
+        sheets.append({"title": title, "rows": row_count, "columns": [column.profile() for column in columns]})
+    return {"source": name, "sheets": sheets}
+
+
+# Function to describe a profile in a few lines per sheet, for the prompt
+def summary_text(spreadsheet_profile):
+    lines = []
+    for sheet in spreadsheet_profile["sheets"]:
+        lines.append(f"Sheet \"{sheet['title']}\" of {spreadsheet_profile['source']}: {sheet['rows']} rows")
+        for column in sheet["columns"]:
+            details = [column["type"]]
+            if "min" in column:
+                details.append(f"{column['min']} to {column['max']}")
+            if "mean" in column:
+                details.append(f"mean {column['mean']:g}")
+            if column["type"] in ("text", "boolean"):
+                details.append(f"{column['distinct']} distinct")
+            if column.get("top"):
+                details.append("top: " + ", ".join(f"{value} ({count})" for value, count in column["top"]))
+            if column["empty"]:
+                details.append(f"{column['empty']} empty")
+            lines.append(f"- {column['name']}: " + "; ".join(details))
+    return "\n".join(lines)
+
+
+# Function to read rows [start, stop) of one sheet (row 0 is the first row after the header).
+# The sheet is streamed and reading stops at `stop`, so only one page is held in memory.
+# Returns {"header", "rows"} with every row padded to the header's width.
+def read_rows(name, data, sheet_title, start=0, stop=100):
+    with closing(iter_sheets(name, data)) as sheets:
+        for title, header, rows in sheets:
+            if title != sheet_title:
+                continue
+            page = []
+            for index, row in enumerate(rows):
+                if index >= stop:
+                    break
+                if index >= start:
+                    page.append(row)
+            width = max([len(header)] + [len(row) for row in page])
+            header = [value if value not in (None, "") else f"column {number}"
+                      for number, value in enumerate(list(header) + [None] * (width - len(header)), start=1)]
+            return {"header": header, "rows": [list(row) + [None] * (width - len(row)) for row in page]}
+    raise KeyError(f"No sheet named {sheet_title!r}")
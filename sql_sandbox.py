@@ -0,0 +1,232 @@
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# ---------------------------
+# Text-to-SQL Sandbox
+# ---------------------------
+# A schema (an uploaded SQLite database or CREATE statements) is loaded into a
+# local SQLite sandbox and summarized into a compact table list that is put in
+# the prompt. Generated SQL is checked with EXPLAIN QUERY PLAN before it is
+# shown; if SQLite rejects it the model gets one retry with the error message.
+# Read-only queries can be run in the sandbox with a row limit and time budget.
+# CREATE statements and queries both run under an authorizer and a time budget,
+# so neither can write outside the sandbox or run forever.
+
+SQL_ROW_LIMIT = int(os.environ.get("SQL_ROW_LIMIT", "200"))
+SQL_TIME_BUDGET = float(os.environ.get("SQL_TIME_BUDGET", "2"))
+
+SQL_FENCE = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+# Operations a query run in the sandbox may perform
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Operations pasted CREATE statements may perform on the main database, besides reading. ATTACH, DETACH,
+# PRAGMA, temporary objects and everything else are denied, so a schema cannot write outside the sandbox.
+SCHEMA_ACTIONS = {sqlite3.SQLITE_CREATE_TABLE, sqlite3.SQLITE_CREATE_VIEW, sqlite3.SQLITE_CREATE_INDEX,
+                  sqlite3.SQLITE_CREATE_TRIGGER, sqlite3.SQLITE_INSERT,
+                  # CREATE INDEX fills the new index through a reindex
+                  sqlite3.SQLITE_REINDEX}
+
+# Schema summaries kept per process, least recently used ones are dropped
+SCHEMA_SUMMARIES = 64
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+class SchemaError(Exception):
+    pass
+
+
+class Sandbox:
+    def __init__(self, connection, description, path=None):
+        self.connection = connection
+        self.description = description
+        self.path = path
+        self.summary = summarize_schema(connection)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.connection.close()
+        if self.path:
+            os.remove(self.path)
+
+
+# Context manager that limits a connection to the operations `authorize(action, arg1, arg2, database, trigger)`
+# allows and interrupts statements that run past `time_budget` seconds
+@contextmanager
+def _guarded(connection, authorize, time_budget):
+    deadline = time.perf_counter() + time_budget
+    connection.set_authorizer(authorize)
+    # Returning non-zero interrupts the statement once the time budget is spent
+    connection.set_progress_handler(lambda: int(time.perf_counter() > deadline), 10000)
+    try:
+        yield connection
+    finally:
+        connection.set_authorizer(None)
+        connection.set_progress_handler(None, 0)
+
+
+def _authorize_schema(action, arg1, arg2, database, trigger):
+    if action in READ_ACTIONS or action == sqlite3.SQLITE_TRANSACTION:
+        return sqlite3.SQLITE_OK
+    if database == "main" and (action in SCHEMA_ACTIONS or (action == sqlite3.SQLITE_UPDATE and arg1 == "sqlite_master")):
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _authorize_read(action, *_):
+    return sqlite3.SQLITE_OK if action in READ_ACTIONS else sqlite3.SQLITE_DENY
+
+
+# Function to open an uploaded SQLite database (bytes) read-only as a sandbox
+def sandbox_from_sqlite(data, name="database"):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".sqlite3") as tmp_file:
+        tmp_file.write(data)
+    try:
+        connection = sqlite3.connect(f"file:{tmp_file.name}?mode=ro", uri=True, check_same_thread=False)
+        connection.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        return Sandbox(connection, name, path=tmp_file.name)
+    except sqlite3.Error as e:
+        os.remove(tmp_file.name)
+        raise SchemaError(f"Not a SQLite database: {e}") from e
+
+
+# Function to build an in-memory sandbox from CREATE TABLE/VIEW/INDEX/TRIGGER statements and INSERTs
+def sandbox_from_ddl(ddl, time_budget=SQL_TIME_BUDGET):
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    try:
+        with _guarded(connection, _authorize_schema, time_budget):
+            connection.executescript(ddl)
+    except sqlite3.Error as e:
+        connection.close()
+        raise SchemaError(f"Invalid schema: {e}") from e
+    return Sandbox(connection, "schema")
+
+
+# Function to describe every table as one line, e.g. "orders(id INTEGER PK, user_id INTEGER -> users.id)".
+# Summaries are memoized by the schema's SQL so the prompt prefix stays identical between questions.
+def summarize_schema(connection):
+    objects = connection.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table', 'view') "
+        "AND name NOT LIKE 'sqlite_%' ORDER BY type, name"
+    ).fetchall()
+    key = hashlib.sha256(repr(objects).encode("utf-8")).hexdigest()
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+
+    lines = []
+    for kind, name, _ in objects:
+        foreign_keys = {column: f"{table}.{to}" for column, table, to in connection.execute(
+            'SELECT "from", "table", "to" FROM pragma_foreign_key_list(?)', (name,))}
+        columns = []
+        for column, column_type, primary_key in connection.execute("SELECT name, type, pk FROM pragma_table_info(?)", (name,)):
+            column_text = f"{column} {column_type}".strip()
+            if primary_key:
+                column_text += " PK"
+            if column in foreign_keys:
+                column_text += f" -> {foreign_keys[column]}"
+            columns.append(column_text)
+        lines.append(f"{'view ' if kind == 'view' else ''}{name}({', '.join(columns)})")
+    summary = "\n".join(lines)
+    with _summaries_lock:
+        _summaries[key] = summary
+        while len(_summaries) > SCHEMA_SUMMARIES:
+            _summaries.popitem(last=False)
+    return summary
+
+
+# Function to build the Text-to-SQL prompt; with a schema, the model is told to use only its tables
+def sql_prompt(question, schema_summary="", previous_sql=None, error=None):
+    if not schema_summary:
+        return f"Convert the following natural language query into an SQL statement:\n\nQuery: {question}\nSQL:"
+    prompt = (
+        "You write SQLite queries. Use only these tables and columns:\n"
+        f"{schema_summary}\n\n"
+        "Answer with a single SQL statement and nothing else.\n\n"
+        f"Query: {question}\n"
+    )
+    if previous_sql:
+        prompt += f"\nThis attempt failed:\n{previous_sql}\nSQLite error: {error}\nWrite a corrected statement.\n"
+    return prompt + "SQL:"
+
+
+# Function to pull the SQL statement out of a model reply (code fences, trailing explanations)
+def extract_sql(response):
+    fenced = SQL_FENCE.search(response)
+    sql = (fenced.group(1) if fenced else response).strip()
+    # Keep the first complete statement; a ";" inside a string literal or comment does not end it
+    end = sql.find(";")
+    while end != -1:
+        if sqlite3.complete_statement(sql[:end + 1]):
+            return sql[:end + 1].strip()
+        end = sql.find(";", end + 1)
+    return sql
+
+
+# Function to check a statement against the schema; returns the query plan rows or raises sqlite3.Error
+def validate(sandbox, sql):
+    if not sqlite3.complete_statement(sql if sql.rstrip().endswith(";") else sql + ";"):
+        raise sqlite3.OperationalError("incomplete SQL statement")
+    with sandbox.lock:
+        return [row[-1] for row in sandbox.connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+# Function to generate SQL for a question and validate it, retrying once with SQLite's error.
+# `generate_tokens(prompt)` yields the model's reply in pieces. Yields {"event": "token", "text", "attempt"}
+# while the reply arrives, then {"event": "done", "sql", "plan", "attempts", "error"}.
+def generate_sql_events(question, sandbox, generate_tokens, max_attempts=2):
+    previous_sql = error = None
+    for attempt in range(1, max_attempts + 1):
+        reply = []
+        for token in generate_tokens(sql_prompt(question, sandbox.summary, previous_sql, error)):
+            reply.append(token)
+            yield {"event": "token", "text": token, "attempt": attempt}
+        sql = extract_sql("".join(reply))
+        try:
+            plan = validate(sandbox, sql)
+            yield {"event": "done", "sql": sql, "plan": plan, "attempts": attempt, "error": None}
+            return
+        except sqlite3.Error as e:
+            previous_sql, error = sql, str(e)
+    yield {"event": "done", "sql": previous_sql, "plan": [], "attempts": max_attempts, "error": error}
+
+
+# Function to generate SQL for a question and validate it, retrying once with SQLite's error.
+# `generate(prompt, attempt)` returns the model's reply. Returns {"sql", "plan", "attempts", "error"}.
+def generate_sql(question, sandbox, generate, max_attempts=2):
+    attempts = 0
+
+    def generate_tokens(prompt):
+        nonlocal attempts
+        attempts += 1
+        yield generate(prompt, attempts)
+
+    for event in generate_sql_events(question, sandbox, generate_tokens, max_attempts):
+        if event["event"] == "done":
+            return {key: event[key] for key in ("sql", "plan", "attempts", "error")}
+
+
+# Function to run a read-only statement in the sandbox with a row limit and a time budget.
+# Returns {"columns", "rows", "truncated", "seconds"}; raises sqlite3.Error on failure or timeout.
+def execute(sandbox, sql, row_limit=SQL_ROW_LIMIT, time_budget=SQL_TIME_BUDGET):
+    with sandbox.lock, _guarded(sandbox.connection, _authorize_read, time_budget) as connection:
+        started = time.perf_counter()
+        cursor = connection.execute(sql)
+        rows = cursor.fetchmany(row_limit + 1)
+        columns = [column[0] for column in cursor.description or []]
+    return {
+        "columns": columns,
+        "rows": rows[:row_limit],
+        "truncated": len(rows) > row_limit,
+        "seconds": time.perf_counter() - started,
+    }
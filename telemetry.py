@@ -0,0 +1,247 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ---------------------------
+# Tracing & Metrics
+# ---------------------------
+# Every pipeline stage runs inside a span that times it and carries attributes
+# such as bytes in, characters out, prompt/eval tokens and cache hits. Finished
+# spans are appended as JSON lines to a trace log, folded into process-wide
+# counters and latency histograms, and collected into the current trace so the
+# app can show the breakdown of the last request. The metrics are served in
+# Prometheus text format from a local HTTP endpoint.
+
+TRACE_LOG_PATH = os.environ.get(
+    "TRACE_LOG_PATH", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "traces.jsonl")
+)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+
+# Numeric span attributes that are also summed into sm_<name>_total counters
+COUNTED_ATTRIBUTES = ("bytes_in", "chars_out", "prompt_tokens", "eval_tokens", "cache_hits")
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            buckets, total, count = self._histograms.get(key, ([0] * len(LATENCY_BUCKETS), 0.0, 0))
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[index] += 1
+            self._histograms[key] = (buckets, total + value, count + 1)
+
+    # Register a gauge whose value is read from `read()` at scrape time, e.g. a queue depth
+    def gauge(self, name, read):
+        with self._lock:
+            self._gauges[name] = read
+
+    # Function to render all metrics in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{_labels(labels)} {value}" for (metric, labels), value in sorted(counters.items()) if metric == name)
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {bucket_count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        for name, read in sorted(gauges.items()):
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+# Process-wide metrics shared by all sessions
+metrics = Metrics()
+
+
+# Function to get the nearest-rank percentile of `values` (`fraction` between 0 and 1); 0.0 when there are none
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Rounded first so that e.g. 0.95 * 60 does not become rank 58 through float error
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class Trace:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.time()
+        self.spans = []
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+
+# Function to start a new trace for the current request; spans started afterwards in this context belong to it
+def begin_trace(name):
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+# Function to end the current trace and return it
+def end_trace():
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+
+# Context manager timing a pipeline stage; attributes can be added with span.set(...) while it runs
+@contextmanager
+def span(name, **attributes):
+    current = Span(name, {key: value for key, value in attributes.items() if value is not None})
+    try:
+        yield current
+    except BaseException as e:
+        # Streamlit's rerun/stop exceptions are control flow, not failures
+        if isinstance(e, Exception) and type(e).__module__.split(".")[0] != "streamlit":
+            current.status = "error"
+            current.attributes["error"] = str(e)[:200]
+        raise
+    finally:
+        current.seconds = time.perf_counter() - current.started
+        _finish(current)
+
+
+def _finish(current):
+    if "error" in current.attributes:
+        # Errors that the caller handled itself still count as failed stages
+        current.status = "error"
+    labels = {"stage": current.name}
+    metrics.inc("sm_stage_total", {**labels, "status": current.status})
+    metrics.observe("sm_stage_seconds", labels, current.seconds)
+    for attribute in COUNTED_ATTRIBUTES:
+        value = current.attributes.get(attribute)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+            metrics.inc(f"sm_{attribute}_total", labels, value)
+    if current.attributes.get("cache_hit") is True:
+        metrics.inc("sm_cache_hits_total", labels)
+
+    trace = _current_trace.get()
+    record = {
+        "ts": round(time.time(), 3),
+        "trace_id": trace.id if trace else None,
+        "trace": trace.name if trace else None,
+        "span": current.name,
+        "duration_ms": round(current.seconds * 1000, 2),
+        "status": current.status,
+        **current.attributes,
+    }
+    if trace is not None:
+        trace.spans.append(record)
+    _write_log(record)
+
+
+_log_lock = threading.Lock()
+_log_file = None
+
+
+def _write_log(record):
+    global _log_file
+    if not TRACE_LOG_PATH:
+        return
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        try:
+            if _log_file is None:
+                os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+                _log_file = open(TRACE_LOG_PATH, "a", encoding="utf-8", buffering=1)
+            _log_file.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing trace log: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+# Function to serve /metrics on 127.0.0.1:`port` once per process; returns the server, or None when disabled
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    global _server, _server_started
+    with _server_lock:
+        # Only try once, so a port taken by another worker is not retried on every rerun
+        if _server_started or not port:
+            return _server
+        _server_started = True
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"Error starting metrics endpoint on port {port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        return _server
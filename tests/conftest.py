@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# Caches, stores and trace logs go to a throwaway directory; set before the modules read their configuration
+_cache_dir = tempfile.mkdtemp(prefix="sm_assistant_tests_")
+for name in ("PAGE_CACHE_DIR", "EXTRACTION_CACHE_DIR", "TRANSLATION_CACHE_DIR", "PODCAST_CACHE_DIR"):
+    os.environ[name] = os.path.join(_cache_dir, name.lower())
+for name in ("RESPONSE_CACHE_PATH", "SESSION_STORE_PATH", "CHAT_HISTORY_PATH"):
+    os.environ[name] = os.path.join(_cache_dir, f"{name.lower()}.sqlite3")
+os.environ["TRACE_LOG_PATH"] = ""
+os.environ["API_TOKEN"] = ""
+# Stand-ins for the speech, translation and podcast services
+for name in ("TRANSCRIPTION_BACKEND", "TRANSLATION_BACKEND", "PODCAST_BACKEND"):
+    os.environ[name] = "stub"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    # Point the shared Ollama client at benchmark.py's stand-in, without its latency; yields the stand-in's URL
+    import benchmark
+    import ollama_client
+
+    handler = type("QuickOllamaHandler", (benchmark.FakeOllamaHandler,), {"first_token_seconds": 0.0, "token_seconds": 0.0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(ollama_client, "client", ollama_client.OllamaService(host=url))
+    yield url
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,142 @@
+import threading
+import uuid
+
+import pytest
+import requests
+
+import api
+import api_client
+
+
+@pytest.fixture
+def api_url(fake_ollama):
+    server = api.create_server("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+# Questions are unique per test run so the response cache never answers them
+def question(text):
+    return f"{text} ({uuid.uuid4().hex[:8]})"
+
+
+def test_healthz(api_url):
+    assert requests.get(f"{api_url}/healthz", timeout=10).json()["status"] == "ok"
+
+
+def test_unknown_route_is_404(api_url):
+    assert requests.post(f"{api_url}/v1/nothing", json={}, timeout=10).status_code == 404
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]", b'{"message": ""}', b'{"message": 3}'])
+def test_invalid_body_is_400(api_url, body):
+    response = requests.post(f"{api_url}/v1/chat", data=body, timeout=10)
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+def test_invalid_k_is_400(api_url):
+    body = {"files": [api_client._encode_file("a.txt", b"text")], "question": "q", "k": 0}
+    response = requests.post(f"{api_url}/v1/documents/context", json=body, timeout=10)
+    assert response.status_code == 400
+    assert "'k'" in response.json()["error"]
+
+
+def test_token_is_required_when_set(api_url, monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "secret")
+    assert requests.post(f"{api_url}/v1/sentiment", json={"text": "hi"}, timeout=10).status_code == 401
+    assert requests.get(f"{api_url}/metrics", timeout=10).status_code == 401
+    headers = {"Authorization": "Bearer wrong"}
+    assert requests.post(f"{api_url}/v1/chat/clear", json={"session": "s"}, headers=headers, timeout=10).status_code == 401
+    client = api_client.RemoteAssistant(api_url, token="secret")
+    client.clear_conversation("s", "chat")
+    # The health check stays open for load balancers
+    assert requests.get(f"{api_url}/healthz", timeout=10).status_code == 200
+
+
+def test_oversized_body_is_413(api_url, monkeypatch):
+    monkeypatch.setattr(api, "API_MAX_BODY_MB", 0)
+    response = requests.post(f"{api_url}/v1/chat", json={"message": "hi"}, timeout=10)
+    assert response.status_code == 413
+
+
+def test_server_needs_a_token_off_loopback(monkeypatch):
+    monkeypatch.setattr(api, "API_TOKEN", "")
+    with pytest.raises(ValueError, match="API_TOKEN"):
+        api.create_server("0.0.0.0", 0)
+
+
+def test_chat_without_streaming(api_url):
+    response = requests.post(f"{api_url}/v1/chat", json={"message": question("Hello")}, timeout=30)
+    assert response.status_code == 200
+    reply = response.json()
+    assert reply["response"].strip()
+    assert reply["cached"] is None
+    assert reply["session"]
+
+    # The session id continues the conversation
+    follow_up = {"message": question("And then?"), "session": reply["session"]}
+    assert requests.post(f"{api_url}/v1/chat", json=follow_up, timeout=30).json()["session"] == reply["session"]
+
+
+def test_chat_stream_through_the_client(api_url):
+    client = api_client.get_client(api_url)
+    events = list(client.answer_events("stream-session", "chat", question("Tell me a story")))
+    assert [event["event"] for event in events[:-1]] == ["token"] * (len(events) - 1)
+    assert len(events) > 2
+    done = events[-1]
+    assert done["event"] == "done"
+    assert done["response"] == "".join(event["text"] for event in events[:-1])
+    assert done["session"] == "stream-session"
+
+
+def test_sse_framing(api_url):
+    body = {"message": question("Frame this"), "stream": True}
+    with requests.post(f"{api_url}/v1/chat", json=body, stream=True, timeout=30) as response:
+        assert response.headers["Content-Type"] == "text/event-stream"
+        lines = [line for line in response.iter_lines(decode_unicode=True) if line]
+    assert lines[0] == "event: token"
+    assert lines[1].startswith("data: {")
+    assert lines[-2] == "event: done"
+
+
+def test_failing_backend_ends_the_stream_with_an_error_event(api_url, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("model crashed")
+        yield
+
+    monkeypatch.setattr(api.assistant.ollama_client.client, "generate_stream", fail)
+    body = {"message": question("Anything"), "stream": True}
+    with requests.post(f"{api_url}/v1/chat", json=body, stream=True, timeout=30) as response:
+        assert response.status_code == 200
+        lines = [line for line in response.iter_lines(decode_unicode=True) if line]
+    assert lines == ["event: error", 'data: {"error": "model crashed"}']
+
+    client = api_client.get_client(api_url)
+    with pytest.raises(api_client.APIError, match="model crashed"):
+        list(client.answer_events("error-session", "chat", question("Anything")))
+
+
+def test_failing_backend_without_streaming_is_500(api_url, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(api.assistant.ollama_client.client, "generate", fail)
+    response = requests.post(f"{api_url}/v1/chat", json={"message": question("Anything")}, timeout=30)
+    assert response.status_code == 500
+    assert response.json() == {"error": "model crashed"}
+
+
+def test_sql_and_translation_through_the_client(api_url):
+    client = api_client.get_client(api_url)
+    schema = "CREATE TABLE users(id INTEGER PRIMARY KEY, name TEXT); INSERT INTO users VALUES (1, 'Ada');"
+    assert client.sql_schema(schema) == {"summary": "users(id INTEGER PK, name TEXT)", "database": False}
+    done = list(client.sql_events(question("list the users"), schema, run=True, stream=False))[-1]
+    assert done["sql"] == "SELECT * FROM users;"
+    assert done["result"]["rows"] == [[1, "Ada"]]
+    assert client.translate("Hello.", ["fr"]) == {"fr": "[fr] Hello."}
+
+    with pytest.raises(api_client.APIError, match="400.*not authorized"):
+        client.sql_schema("ATTACH DATABASE 'x.db' AS x;")
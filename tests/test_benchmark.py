@@ -0,0 +1,62 @@
+import pytest
+
+import benchmark
+import telemetry
+
+
+@pytest.mark.parametrize("values, fraction, expected", [
+    ([], 0.95, 0.0),
+    ([7], 0.95, 7),
+    ([1, 2], 0.95, 2),
+    ([1, 2], 0.5, 1),
+    ([3, 1, 2, 5, 4], 0.5, 3),
+    (list(range(1, 21)), 0.95, 19),
+    (list(range(1, 61)), 0.95, 57),
+    (list(range(1, 101)), 0.95, 95),
+    (list(range(1, 101)), 1.0, 100),
+    (list(range(1, 101)), 0.0, 1),
+])
+def test_percentile_is_nearest_rank(values, fraction, expected):
+    assert telemetry.percentile(values, fraction) == expected
+
+
+def result(name="extract_pdf", p50_ms=10.0, p95_ms=12.0, peak_mb=4.0):
+    return {"name": name, "p50_ms": p50_ms, "p95_ms": p95_ms, "peak_mb": peak_mb}
+
+
+BASELINE = {"extract_pdf": result()}
+
+
+def test_compare_accepts_results_within_tolerance():
+    results = [result(p50_ms=11.5, p95_ms=14.0, peak_mb=4.5)]
+    assert benchmark.compare(results, BASELINE, tolerance=0.2) == []
+    assert "REGRESSION" not in results[0]["vs_baseline"]
+
+
+@pytest.mark.parametrize("slower", [
+    {"p50_ms": 13.0},
+    {"p95_ms": 20.0},
+    {"peak_mb": 6.0},
+])
+def test_compare_flags_p50_p95_and_memory_regressions(slower):
+    results = [result(**slower)]
+    assert benchmark.compare(results, BASELINE, tolerance=0.2) == ["extract_pdf"]
+    assert results[0]["vs_baseline"].endswith("REGRESSION")
+
+
+def test_compare_marks_new_benchmarks():
+    results = [result(name="fetch_website")]
+    assert benchmark.compare(results, BASELINE, tolerance=0.2) == []
+    assert results[0]["vs_baseline"] == "new"
+
+
+def test_compare_tolerates_a_baseline_without_p95():
+    baseline = {"extract_pdf": {"name": "extract_pdf", "p50_ms": 10.0, "peak_mb": 4.0}}
+    assert benchmark.compare([result(p95_ms=100.0)], baseline, tolerance=0.2) == []
+
+
+def test_measure_reports_latency_and_memory():
+    measured = benchmark.measure("noop", lambda: bytearray(1024 * 1024), units=2, unit="items", repeats=3)
+    assert 0 <= measured["p50_ms"] <= measured["p95_ms"]
+    assert measured["peak_mb"] >= 1
+    assert measured["unit"] == "items/s"
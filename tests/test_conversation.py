@@ -0,0 +1,109 @@
+import conversation
+
+
+DOCUMENT = "x" * 16000
+
+
+def test_first_prompt_has_context_and_question():
+    chat = conversation.Conversation("model")
+    prompt, tokens = chat.prepare("What is it?", "Some document")
+    assert prompt == "Some document\nUser: What is it?\nBot:"
+    assert tokens is None
+
+
+def test_continues_from_ollama_context():
+    chat = conversation.Conversation("model")
+    chat.record("What is it?", "A report.", "Some document", [1, 2, 3])
+    prompt, tokens = chat.prepare("Who wrote it?", "Some document")
+    # Only the new turn is sent; the document is already in the context
+    assert prompt == "\nUser: Who wrote it?\nBot:"
+    assert tokens == [1, 2, 3]
+
+    prompt, _ = chat.prepare("And this one?", "Another document")
+    assert prompt == "\nAnother document\nUser: And this one?\nBot:"
+
+
+def test_large_attached_context_does_not_count_against_the_budget():
+    chat = conversation.Conversation("model", token_budget=3000)
+    chat.record("Summarize it", "It is long.", DOCUMENT, range(4100))
+    assert chat.prepare("More?", DOCUMENT)[1] == list(range(4100))
+    chat.record("More?", "Yes.", DOCUMENT, range(4300))
+    assert chat.prepare("Again?", DOCUMENT)[1] == list(range(4300))
+
+
+def test_conversation_past_the_budget_is_folded(fake_ollama):
+    chat = conversation.Conversation("model", token_budget=3000, keep_turns=2)
+    for number in range(3):
+        chat.record(f"question {number}", f"answer {number}", DOCUMENT, range(4100 + number * 100))
+    # 3200 tokens beyond the document's estimated 4001
+    chat.record("question 3", "answer 3", DOCUMENT, range(7201))
+
+    prompt, tokens = chat.prepare("question 4", DOCUMENT)
+    assert tokens is None
+    assert [turn["user"] for turn in chat.turns] == ["question 2", "question 3"]
+    chat.wait_for_summary(10)
+    assert chat.summary
+    prompt, _ = chat.prepare("question 4", DOCUMENT)
+    assert prompt.startswith(DOCUMENT + "\nSummary of the earlier conversation: ")
+    assert prompt.endswith("User: question 2\nBot: answer 2\nUser: question 3\nBot: answer 3\nUser: question 4\nBot:")
+
+
+def test_without_ollama_context_turns_are_estimated(fake_ollama):
+    chat = conversation.Conversation("model", token_budget=20, keep_turns=1)
+    chat.record("a" * 40, "b" * 40)
+    assert len(chat.turns) == 1
+    chat.record("c" * 40, "d" * 40)
+    assert [turn["user"] for turn in chat.turns] == ["c" * 40]
+    chat.wait_for_summary(10)
+    assert chat.summary
+
+
+def test_failed_summary_keeps_the_transcript(monkeypatch):
+    class Failing:
+        def generate(self, **request):
+            raise ConnectionError("Ollama is down")
+
+    monkeypatch.setattr(conversation.ollama_client, "client", Failing())
+    chat = conversation.Conversation("model", token_budget=1, keep_turns=1)
+    chat.record("first", "one")
+    chat.record("second", "two")
+    chat.wait_for_summary(10)
+    assert chat.summary == "User: first\nBot: one"
+
+
+def test_unsent_turns_keep_ollama_context():
+    chat = conversation.Conversation("model")
+    chat.record("What is it?", "A report.", "Some document", [1, 2, 3])
+    chat.record_unsent("Who wrote it?", "Ada.", "Some document")
+
+    prompt, tokens = chat.prepare("When?", "Some document")
+    assert tokens == [1, 2, 3]
+    assert prompt == "\nUser: Who wrote it?\nBot: Ada.\nUser: When?\nBot:"
+
+    # Once the model has seen them they are not sent again
+    chat.record("When?", "In 2024.", "Some document", [1, 2, 3, 4])
+    assert chat.prepare("Why?", "Some document")[0] == "\nUser: Why?\nBot:"
+
+
+def test_restore_continues_the_same_conversation():
+    chat = conversation.Conversation("model")
+    chat.record("What is it?", "A report.", DOCUMENT, range(4100))
+    chat.record_unsent("Who wrote it?", "Ada.", DOCUMENT)
+    state = chat.to_dict()
+
+    restored = conversation.Conversation("model")
+    restored.restore(state)
+    assert restored.to_dict() == state
+    assert restored.prepare("When?", DOCUMENT) == chat.prepare("When?", DOCUMENT)
+    assert restored.fingerprint() == chat.fingerprint()
+
+
+def test_fingerprint_follows_the_history():
+    chat = conversation.Conversation("model")
+    assert chat.fingerprint() == ""
+    chat.record("What is it?", "A report.")
+    first = chat.fingerprint()
+    chat.record("Who wrote it?", "Ada.")
+    assert chat.fingerprint() not in ("", first)
+    chat.clear()
+    assert chat.fingerprint() == ""
@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import pytest
+
+import benchmark
+import document_extraction
+from extraction_cache import ExtractionCache
+
+
+# Segmenter that kills its worker process, like a worker killed for using too much memory
+def crashing_segments(name, data):
+    os._exit(1)
+
+
+@pytest.fixture(scope="module")
+def documents():
+    return [
+        ("notes.docx", benchmark.make_docx(5)),
+        ("sales.csv", b"region,units\nnorth,3\nsouth,4\n"),
+        ("report.pdf", benchmark.make_pdf(60, lines_per_page=3)),
+        ("slides.pptx", benchmark.make_pptx(2)),
+        ("readme.txt", b"plain text"),
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_results_follow_the_input_order(documents, max_workers, tmp_path, monkeypatch):
+    # Temporary copies of large PDFs are written under tmp_path and must be gone afterwards
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    results = document_extraction.extract_documents(documents, max_workers=max_workers)
+    assert [result["name"] for result in results] == [name for name, _ in documents]
+    notes, sales, report, slides, readme = results
+
+    assert [segment["location"] for segment in notes["segments"]] == [f"paragraph {n}" for n in range(1, 6)]
+    assert sales["segments"][0]["text"] == "region\tunits\nnorth\t3\nsouth\t4"
+    # 60 pages are three page-range jobs, joined back in page order
+    assert [segment["location"] for segment in report["segments"]] == [f"page {n}" for n in range(1, 61)]
+    assert slides["segments"][1]["text"].startswith("Slide 2")
+    assert readme == {"name": "readme.txt", "segments": [], "error": "Unsupported file type"}
+    assert all(result["error"] is None for result in results[:4])
+    assert os.listdir(tmp_path) == []
+
+
+def test_a_broken_file_does_not_affect_the_others(documents):
+    files = [documents[0], ("broken.docx", b"not a zip file"), documents[1]]
+    results = document_extraction.extract_documents(files, max_workers=2)
+    assert results[1]["segments"] == []
+    assert results[1]["error"] == "BadZipFile: File is not a zip file"
+    assert results[0]["segments"] and results[0]["error"] is None
+    assert results[2]["segments"] and results[2]["error"] is None
+
+
+def test_a_crashed_worker_is_reported_for_its_file_only(documents, monkeypatch):
+    monkeypatch.setitem(document_extraction.SEGMENTERS, ".crash", crashing_segments)
+    files = [documents[0], ("bad.crash", b""), documents[1], documents[3]]
+    results = document_extraction.extract_documents(files, max_workers=2)
+    assert results[1]["error"] == "The extraction worker crashed, e.g. out of memory"
+    assert [result["error"] for result in results[:1] + results[2:]] == [None, None, None]
+    assert all(result["segments"] for result in results[:1] + results[2:])
+
+    # The broken pool was replaced
+    assert document_extraction.extract_documents(documents[:2], max_workers=2)[0]["segments"]
+
+
+def test_cached_files_are_not_extracted_again(documents, tmp_path):
+    cache = ExtractionCache(directory=str(tmp_path / "cache"))
+    first = document_extraction.extract_documents(documents[:2], cache=cache, max_workers=1)
+    key = cache.key(documents[0][1], "word_segments", document_extraction.EXTRACTOR_VERSION)
+    assert cache.get(key) == first[0]["segments"]
+    assert document_extraction.extract_documents(documents[:2], cache=cache, max_workers=1) == first
@@ -0,0 +1,139 @@
+import asyncio
+import queue
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import benchmark
+import ollama_client
+
+
+class CountingOllamaHandler(benchmark.FakeOllamaHandler):
+    # Counts generate requests and the most that ran at the same time
+    first_token_seconds = 0.2
+    token_seconds = 0.001
+    lock = threading.Lock()
+    requests = 0
+    active = 0
+    most_active = 0
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.active += 1
+            cls.most_active = max(cls.most_active, cls.active)
+        try:
+            super().do_POST()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+@pytest.fixture
+def ollama_url():
+    handler = type("Handler", (CountingOllamaHandler,), {"requests": 0, "active": 0, "most_active": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", handler
+    server.shutdown()
+    server.server_close()
+
+
+# Function to run `target(index)` on `count` threads at once; returns the results in index order
+def run_concurrently(count, target):
+    results = [None] * count
+
+    def run(index):
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return results
+
+
+def test_identical_prompts_share_one_generation(ollama_url):
+    url, handler = ollama_url
+    service = ollama_client.OllamaService(max_concurrent=4, host=url)
+    replies = run_concurrently(6, lambda _: service.generate("model", "the same prompt")["response"])
+    assert handler.requests == 1
+    assert len(set(replies)) == 1 and replies[0]
+    assert service.stats()["coalesced"] == 5
+
+
+def test_concurrency_stays_within_the_limit(ollama_url):
+    url, handler = ollama_url
+    service = ollama_client.OllamaService(max_concurrent=2, host=url)
+    replies = run_concurrently(6, lambda index: service.generate("model", f"prompt {index}")["response"])
+    assert all(replies)
+    assert handler.requests == 6
+    assert handler.most_active == 2
+    assert service.stats()["running"] == 0
+
+
+def test_cancelled_subscriber_frees_its_slot(ollama_url):
+    url, handler = ollama_url
+    handler.reply_tokens = 2000
+    service = ollama_client.OllamaService(max_concurrent=1, host=url)
+    stream = service.generate_stream("model", "a long answer")
+    next(stream)
+    # The reader leaves; its generation is cancelled and the only slot goes to the next request
+    stream.close()
+    started = time.perf_counter()
+    # The stand-in answers prompts ending in "SQL:" with a single token
+    assert service.generate("model", "another prompt\nSQL:")["response"]
+    assert time.perf_counter() - started < 1.5
+    # The same prompt starts a new generation instead of joining the cancelled one
+    stream = service.generate_stream("model", "a long answer")
+    assert next(stream)["response"]
+    stream.close()
+    assert handler.requests == 3
+
+
+def test_generation_cancelled_before_it_starts_is_forgotten(ollama_url):
+    url, _ = ollama_url
+    service = ollama_client.OllamaService(host=url)
+    request = {"model": "model", "prompt": "left at once"}
+
+    async def subscribe_and_leave():
+        out_queue = queue.Queue()
+        key = await service._subscribe(request, out_queue)
+        await service._unsubscribe(key, out_queue)
+
+    service._ensure_loop()
+    service._submit(subscribe_and_leave()).result(10)
+    time.sleep(0.05)
+    assert service._inflight == {}
+
+    replies = run_concurrently(1, lambda _: service.generate("model", "left at once")["response"])
+    assert replies[0]
+
+
+def test_fair_limiter_serves_waiters_in_order():
+    async def scenario():
+        limiter = ollama_client.FairLimiter(1)
+        await limiter.acquire()
+        order = []
+
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second", "third")]
+        await asyncio.sleep(0)
+        waiters[1].cancel()
+        for _ in range(3):
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return order, limiter.active
+
+    order, active = asyncio.run(scenario())
+    # The cancelled waiter is skipped without taking a slot
+    assert order == ["first", "third"]
+    assert active == 0
@@ -0,0 +1,45 @@
+import io
+import wave
+
+import podcast
+
+
+TEXT = "The first sentence is short. " * 6 + "The last sentence closes the episode."
+
+
+def wav_params(audio):
+    with wave.open(io.BytesIO(audio)) as wav_file:
+        return wav_file.getnchannels(), wav_file.getframerate(), wav_file.getnframes()
+
+
+def test_stub_backend_writes_a_wav_per_segment():
+    backend = podcast.StubBackend()
+    channels, rate, frames = wav_params(backend.synthesize("four words of text"))
+    assert (channels, rate) == (1, backend.sample_rate)
+    assert frames == int(4 * 0.05 * backend.sample_rate)
+
+
+def test_segments_arrive_in_reading_order():
+    segments = list(podcast.synthesize(TEXT, backend=podcast.StubBackend(), max_chars=60))
+    assert [segment["index"] for segment in segments] == list(range(len(segments)))
+    assert all(segment["total"] == len(segments) for segment in segments)
+    assert " ".join(segment["text"] for segment in segments) == TEXT.strip()
+    assert all(len(segment["text"]) <= 60 for segment in segments)
+
+
+def test_repeated_segments_come_from_the_cache():
+    text = "A sentence only this test synthesizes."
+    first = list(podcast.synthesize(text, backend=podcast.StubBackend()))
+    second = list(podcast.synthesize(text, backend=podcast.StubBackend()))
+    assert [segment["cached"] for segment in first + second] == [False, True]
+    assert first[0]["audio"] == second[0]["audio"]
+
+
+def test_stitch_joins_the_segments():
+    segments = list(podcast.synthesize(TEXT, backend=podcast.StubBackend(), max_chars=60))
+    stitched = podcast.stitch([segment["audio"] for segment in segments], "wav")
+    assert wav_params(stitched)[2] == sum(wav_params(segment["audio"])[2] for segment in segments)
+
+
+def test_empty_text_has_no_segments():
+    assert list(podcast.synthesize("   ", backend=podcast.StubBackend())) == []
@@ -0,0 +1,97 @@
+import time
+import uuid
+
+import pytest
+
+import assistant
+import response_cache
+import retrieval
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return response_cache.ResponseCache(str(tmp_path / "responses.sqlite3"))
+
+
+def test_exact_hit_ignores_case_and_spacing(cache):
+    cache.store("model", "chat", "report text", "What is the total?", "42", 1.5)
+    hit = cache.lookup("documents", "model", "chat", "report text", "  what is THE total? ")
+    assert hit == {"response": "42", "match": "exact", "similarity": 1.0}
+    assert cache.stats() == [{"tab": "documents", "exact_hits": 1, "semantic_hits": 0, "misses": 0,
+                              "saved_seconds": 1.5, "hit_rate": 1.0}]
+
+
+@pytest.mark.parametrize("model, template, context", [
+    ("other-model", "chat", "report text"),
+    ("model", "sql", "report text"),
+    # A changed document has another hash, so its answers are not reused
+    ("model", "chat", "report text, second edition"),
+])
+def test_miss_for_another_model_template_or_document(cache, model, template, context):
+    cache.store("model", "chat", "report text", "What is the total?", "42", 1.0)
+    assert cache.lookup("documents", model, template, context, "What is the total?") is None
+
+
+def test_empty_responses_are_not_stored(cache):
+    cache.store("model", "chat", "", "Hello", "", 1.0)
+    assert cache.lookup("chat", "model", "chat", "", "Hello") is None
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path / "responses.sqlite3"), ttl_seconds=0.05)
+    cache.store("model", "chat", "", "Hello", "Hi", 1.0)
+    time.sleep(0.1)
+    assert cache.lookup("chat", "model", "chat", "", "Hello") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path / "responses.sqlite3"), max_entries=2)
+    for question in ("first", "second"):
+        cache.store("model", "chat", "", question, f"{question} answer", 1.0)
+        time.sleep(0.01)
+    cache.lookup("chat", "model", "chat", "", "first")
+    time.sleep(0.01)
+    cache.store("model", "chat", "", "third", "third answer", 1.0)
+    assert cache.lookup("chat", "model", "chat", "", "first") is not None
+    assert cache.lookup("chat", "model", "chat", "", "second") is None
+    assert cache.lookup("chat", "model", "chat", "", "third") is not None
+
+
+def test_semantic_threshold(tmp_path):
+    cache = response_cache.ResponseCache(str(tmp_path / "responses.sqlite3"), semantic_threshold=0.6,
+                                         embedder=retrieval.HashingEmbedder())
+    cache.store("model", "chat", "report", "What was the revenue in 2023?", "12 million", 2.0)
+    hit = cache.lookup("documents", "model", "chat", "report", "What was revenue in 2023?")
+    assert hit["match"] == "semantic"
+    assert hit["response"] == "12 million"
+    assert 0.6 <= hit["similarity"] < 1.0
+    assert cache.lookup("documents", "model", "chat", "report", "Who is the chief executive?") is None
+    # Only questions about the same content are compared
+    assert cache.lookup("documents", "model", "chat", "other report", "What was revenue in 2023?") is None
+
+
+def test_clear(cache):
+    cache.store("model", "chat", "", "Hello", "Hi", 1.0)
+    cache.clear()
+    assert cache.lookup("chat", "model", "chat", "", "Hello") is None
+
+
+def answer(session, tab, question, context=""):
+    return list(assistant.answer_events(session, tab, question, context, stream=False))[-1]
+
+
+def test_document_questions_hit_later_in_other_conversations(fake_ollama):
+    document = f"Quarterly report {uuid.uuid4().hex}"
+    answer("first", "documents", "What is this report about?", document)
+    first = answer("first", "documents", "Who wrote it?", document)
+    assert first["cached"] is None
+    # Asked second in one conversation, first in another: still the same question about the same document
+    assert answer("second", "documents", "Who wrote it?", document)["cached"]["match"] == "exact"
+
+
+def test_chat_questions_hit_only_with_the_same_history(fake_ollama):
+    question = f"What should I do next? {uuid.uuid4().hex}"
+    assert answer("one", "chat", question)["cached"] is None
+    assert answer("two", "chat", question)["cached"] is not None
+    answer("three", "chat", "Earlier message")
+    assert answer("three", "chat", question)["cached"] is None
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import conversation
+import session_store
+
+
+class BlockingSummarizer:
+    # Stand-in for the Ollama client whose summaries finish only when `release` is set
+    def __init__(self):
+        self.release = threading.Event()
+        self.prompts = []
+
+    def generate(self, model, prompt, **options):
+        self.prompts.append(prompt)
+        self.release.wait(10)
+        return {"response": f"summary {len(self.prompts)}"}
+
+
+def test_memory_store_keeps_objects_until_they_expire():
+    store = session_store.MemorySessionStore(ttl_seconds=60)
+    value = object()
+    store.put("s", "name", value)
+    assert store.get("s", "name") is value
+    store.delete("s", "name")
+    assert store.get("s", "name") is None
+
+    expired = session_store.MemorySessionStore(ttl_seconds=-1)
+    expired.put("s", "name", value)
+    assert expired.get("s", "name") is None
+
+
+def test_memory_store_drops_least_recently_used():
+    store = session_store.MemorySessionStore(max_entries=2)
+    store.put("s", "a", 1)
+    store.put("s", "b", 2)
+    store.get("s", "a")
+    store.put("s", "c", 3)
+    assert (store.get("s", "a"), store.get("s", "b"), store.get("s", "c")) == (1, None, 3)
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    first, second = session_store.SQLiteSessionStore(path), session_store.SQLiteSessionStore(path)
+    first.put("s", "name", {"a": [1, 2]})
+    assert second.get("s", "name") == {"a": [1, 2]}
+    second.delete("s", "name")
+    assert first.get("s", "name") is None
+
+
+def test_sqlite_store_drops_expired_values(tmp_path):
+    store = session_store.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl_seconds=0.05)
+    store.put("s", "name", 1)
+    time.sleep(0.1)
+    assert store.get("s", "name") is None
+
+
+def test_conversation_round_trips_with_pending_turns(tmp_path, monkeypatch):
+    summarizer = BlockingSummarizer()
+    monkeypatch.setattr(conversation.ollama_client, "client", summarizer)
+    path = str(tmp_path / "sessions.sqlite3")
+
+    chat = conversation.Conversation("model", token_budget=5, keep_turns=1)
+    chat.record("first question", "first answer", "context", [1, 2, 3])
+    chat.record("second question", "second answer", "context", list(range(10)))
+    # The first turn is being summarized; it is saved as pending instead of waiting for the summary
+    assert chat.turns == [{"user": "second question", "bot": "second answer"}]
+    session_store.SQLiteSessionStore(path).put("s", "conversation:chat", chat.to_dict())
+
+    restored = conversation.Conversation("model")
+    restored.restore(session_store.SQLiteSessionStore(path).get("s", "conversation:chat"))
+    assert restored.to_dict() == chat.to_dict()
+    assert restored.to_dict()["pending"] == [{"user": "first question", "bot": "first answer"}]
+
+    # The restored conversation summarizes the pending turn again
+    summarizer.release.set()
+    restored.wait_for_summary(10)
+    chat.wait_for_summary(10)
+    assert restored.summary.startswith("summary")
+    assert restored.to_dict()["pending"] == []
+    assert "first question" in summarizer.prompts[-1]
@@ -0,0 +1,114 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+import site_crawler
+
+
+# Local fixture site: "/" -> "/a" -> "/a/deep" -> "/a/deeper", "/" -> "/private" (disallowed by
+# robots.txt) and "/" -> the same server under another host name
+ROBOTS = "User-agent: *\nDisallow: /private\n"
+
+
+def _page(title, links=()):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><h1>{title}</h1>{anchors}</body></html>"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.headers["Host"], self.path))
+        if self.path == "/robots.txt" and self.server.robots is not None:
+            self._send(200, "text/plain", self.server.robots)
+            return
+        pages = {
+            "/": _page("Home", ["/a", "/private", f"http://localhost:{self.server.server_address[1]}/other"]),
+            "/a": _page("Page A", ["/a/deep"]),
+            "/a/deep": _page("Deep page", ["/a/deeper"]),
+            "/a/deeper": _page("Deeper page"),
+            "/private": _page("Private page"),
+            "/other": _page("Other host page"),
+        }
+        if self.path in pages:
+            self._send(200, "text/html; charset=utf-8", pages[self.path])
+        else:
+            self._send(404, "text/plain", "not found")
+
+    def _send(self, status, content_type, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.requests = []
+    server.robots = ROBOTS
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(server, **options):
+    crawler = site_crawler.SiteCrawler(f"http://127.0.0.1:{server.server_address[1]}/", **options).start()
+    crawler.join(timeout=30)
+    assert crawler.done
+    # Pages by path, without the leading "/"
+    return {urlsplit(page["url"]).path[1:]: page for page in crawler.pages}
+
+
+def test_depth_limit(site):
+    pages = crawl(site, max_depth=1)
+    assert set(pages) == {"", "a"}
+    assert pages[""]["depth"] == 0
+    assert pages["a"]["depth"] == 1
+
+
+def test_follows_links_up_to_max_depth(site):
+    pages = crawl(site, max_depth=3)
+    assert {"a/deep", "a/deeper"} <= set(pages)
+    assert pages["a/deeper"]["depth"] == 3
+
+
+def test_stays_on_the_seed_host(site):
+    crawl(site, max_depth=3)
+    assert all(host.startswith("127.0.0.1:") for host, _ in site.requests)
+
+
+def test_follows_other_hosts_when_allowed(site):
+    pages = crawl(site, max_depth=1, same_host=False)
+    assert "other" in pages
+
+
+def test_robots_txt_disallow(site):
+    pages = crawl(site, max_depth=3)
+    assert "private" not in pages
+    paths = [path for _, path in site.requests]
+    assert "/robots.txt" in paths
+    assert "/private" not in paths
+
+
+def test_robots_txt_ignored_when_disabled(site):
+    pages = crawl(site, max_depth=1, robots=False)
+    assert "private" in pages
+
+
+def test_missing_robots_txt_allows_everything(site):
+    site.robots = None
+    pages = crawl(site, max_depth=1)
+    assert "private" in pages
+
+
+def test_page_limit(site):
+    pages = crawl(site, max_depth=3, max_pages=2)
+    assert len(pages) == 2
@@ -0,0 +1,121 @@
+import sqlite3
+import time
+
+import pytest
+
+import sql_sandbox
+
+
+SCHEMA = """
+CREATE TABLE users(id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE orders(id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), total REAL);
+INSERT INTO users VALUES (1, 'Ada'), (2, 'Grace'), (3, 'Linus');
+"""
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = sql_sandbox.sandbox_from_ddl(SCHEMA)
+    yield sandbox
+    sandbox.close()
+
+
+def test_schema_summary(sandbox):
+    assert sandbox.summary == ("orders(id INTEGER PK, user_id INTEGER -> users.id, total REAL)\n"
+                               "users(id INTEGER PK, name TEXT)")
+
+
+def test_execute_reads_with_a_row_limit(sandbox):
+    result = sql_sandbox.execute(sandbox, "SELECT name FROM users ORDER BY id", row_limit=2)
+    assert result["columns"] == ["name"]
+    assert result["rows"] == [("Ada",), ("Grace",)]
+    assert result["truncated"]
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM users",
+    "UPDATE users SET name = 'x'",
+    "INSERT INTO users VALUES (4, 'x')",
+    "DROP TABLE users",
+    "ATTACH DATABASE ':memory:' AS other",
+    "PRAGMA table_info(users)",
+])
+def test_execute_denies_anything_but_reading(sandbox, sql):
+    with pytest.raises(sqlite3.DatabaseError, match="not authorized"):
+        sql_sandbox.execute(sandbox, sql)
+    assert sql_sandbox.execute(sandbox, "SELECT count(*) FROM users")["rows"] == [(3,)]
+
+
+def test_schema_cannot_attach_a_database(tmp_path):
+    target = tmp_path / "outside.db"
+    ddl = f"ATTACH DATABASE '{target}' AS outside; CREATE TABLE outside.t(a); INSERT INTO outside.t VALUES ('p');"
+    with pytest.raises(sql_sandbox.SchemaError, match="not authorized"):
+        sql_sandbox.sandbox_from_ddl(ddl)
+    assert not target.exists()
+
+
+@pytest.mark.parametrize("ddl", [
+    "PRAGMA foreign_keys = OFF;",
+    "CREATE TEMP TABLE t(a);",
+    "CREATE TABLE t(a); DELETE FROM t;",
+    "CREATE TABLE t(a); DROP TABLE t;",
+])
+def test_schema_allows_only_creating_and_inserting(ddl):
+    with pytest.raises(sql_sandbox.SchemaError, match="not authorized"):
+        sql_sandbox.sandbox_from_ddl(ddl)
+
+
+def test_schema_stops_at_the_time_budget():
+    ddl = ("CREATE TABLE t(i); "
+           "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) INSERT INTO t SELECT i FROM n;")
+    with pytest.raises(sql_sandbox.SchemaError, match="interrupted"):
+        sql_sandbox.sandbox_from_ddl(ddl, time_budget=0.05)
+
+
+def test_schema_with_indexes_views_and_triggers():
+    sandbox = sql_sandbox.sandbox_from_ddl(SCHEMA + """
+        CREATE INDEX orders_user ON orders(user_id);
+        CREATE VIEW big_orders AS SELECT * FROM orders WHERE total > 100;
+        CREATE TRIGGER welcome AFTER INSERT ON users BEGIN INSERT INTO orders(user_id, total) VALUES (new.id, 0); END;
+        INSERT INTO users VALUES (4, 'Margaret');
+    """)
+    assert "view big_orders(id INTEGER, user_id INTEGER, total REAL)" in sandbox.summary
+    assert sql_sandbox.execute(sandbox, "SELECT user_id FROM orders")["rows"] == [(4,)]
+    sandbox.close()
+
+
+def test_execute_stops_at_the_time_budget(sandbox):
+    endless = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT max(i) FROM n"
+    started = time.perf_counter()
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        sql_sandbox.execute(sandbox, endless, time_budget=0.05)
+    assert time.perf_counter() - started < 5
+    # The sandbox is usable again afterwards
+    assert sql_sandbox.execute(sandbox, "SELECT 1")["rows"] == [(1,)]
+
+
+def test_extract_sql_keeps_semicolons_in_literals():
+    reply = "```sql\nSELECT * FROM users WHERE name = 'a;b'; -- all of them\n```\nThis lists the users."
+    assert sql_sandbox.extract_sql(reply) == "SELECT * FROM users WHERE name = 'a;b';"
+    assert sql_sandbox.extract_sql("SELECT 1") == "SELECT 1"
+
+
+def test_generate_sql_retries_with_the_error(sandbox):
+    prompts = []
+
+    def generate(prompt, attempt):
+        prompts.append(prompt)
+        return "SELECT nme FROM users;" if attempt == 1 else "SELECT name FROM users;"
+
+    result = sql_sandbox.generate_sql("list user names", sandbox, generate)
+    assert result["sql"] == "SELECT name FROM users;"
+    assert result["attempts"] == 2
+    assert result["error"] is None
+    assert "no such column: nme" in prompts[1]
+
+
+def test_generate_sql_reports_the_last_error(sandbox):
+    result = sql_sandbox.generate_sql("list user names", sandbox, lambda prompt, attempt: "SELECT nme FROM users")
+    assert result["sql"] == "SELECT nme FROM users"
+    assert result["attempts"] == 2
+    assert "no such column" in result["error"]
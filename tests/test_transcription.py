@@ -0,0 +1,77 @@
+import time
+import wave
+
+import numpy as np
+import pytest
+
+import transcription
+
+
+# Function to write a 16 kHz mono WAV of `seconds` of tone, silent between the `quiet` (start, end) seconds
+def write_wav(path, seconds, quiet=(), rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    samples = 8000 * np.sin(2 * np.pi * 220 * t)
+    for start, end in quiet:
+        samples[int(start * rate):int(end * rate)] = 0
+    with wave.open(str(path), "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.astype(np.int16).tobytes())
+    return str(path)
+
+
+class SlowFirstBackend(transcription.StubBackend):
+    # Earlier chunks take longer, so they finish last
+    def transcribe(self, path, start, end):
+        time.sleep(max(0.0, 0.2 - start / 50))
+        return super().transcribe(path, start, end)
+
+
+class FailingBackend(transcription.StubBackend):
+    def transcribe(self, path, start, end):
+        if start == 0:
+            raise RuntimeError("recognizer unavailable")
+        return super().transcribe(path, start, end)
+
+
+def test_chunks_cover_the_recording(tmp_path):
+    path = write_wav(tmp_path / "long.wav", 25)
+    chunks = transcription.plan_chunks(path, chunk_seconds=10)
+    assert chunks[0][0] == 0.0
+    assert chunks[-1][1] == pytest.approx(25)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    assert all(end - start <= 10 for start, end in chunks)
+
+
+def test_chunks_are_cut_in_silence(tmp_path):
+    path = write_wav(tmp_path / "pause.wav", 15, quiet=[(7.5, 8.0)])
+    chunks = transcription.plan_chunks(path, chunk_seconds=10)
+    assert 7.5 <= chunks[0][1] <= 8.0
+
+
+def test_segments_are_joined_in_recording_order(tmp_path):
+    path = write_wav(tmp_path / "long.wav", 25)
+    results = list(transcription.transcribe_chunks(path, backend=SlowFirstBackend(), max_workers=4, chunk_seconds=5))
+    segments = [segment for segment, _ in results]
+    assert all(total == len(segments) for _, total in results)
+    # Yielded as they finish, which is not recording order
+    assert [segment["index"] for segment in segments] != sorted(segment["index"] for segment in segments)
+    expected = [f"speech from {start:.1f}s to {end:.1f}s" for start, end in transcription.plan_chunks(path, 5)]
+    assert transcription.join_segments(segments) == " ".join(expected)
+
+
+def test_failed_chunk_becomes_an_error_segment(tmp_path):
+    path = write_wav(tmp_path / "long.wav", 12)
+    segments = {segment["index"]: segment for segment, _ in
+                transcription.transcribe_chunks(path, backend=FailingBackend(), chunk_seconds=5)}
+    assert segments[0]["error"] == "recognizer unavailable"
+    assert segments[0]["text"] == ""
+    assert all(segment["error"] is None and segment["text"] for index, segment in segments.items() if index)
+    assert not transcription.join_segments(segments.values()).startswith(" ")
+
+
+def test_missing_offline_package_is_reported(monkeypatch):
+    monkeypatch.setattr(transcription.importlib.util, "find_spec", lambda name: None)
+    with pytest.raises(transcription.TranscriptionError, match="pip install pocketsphinx"):
+        transcription.get_backend("sphinx")
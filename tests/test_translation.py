@@ -0,0 +1,32 @@
+import pytest
+
+import translation
+
+
+TEXTS = [
+    "",
+    "One sentence.",
+    "First sentence. Second one!  Third?\n\nA new paragraph; with a clause.\n",
+    "   Leading and trailing whitespace.   ",
+    "word " * 500,
+    "x" * 1234,
+    "Hindi: यह एक वाक्य है। Chinese: 这是一个句子。 Done.",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("max_chars", [10, 100, translation.MAX_CHUNK_CHARS])
+def test_split_text_round_trip(text, max_chars):
+    chunks = translation.split_text(text, max_chars)
+    assert "".join(chunks) == text
+    assert all(0 < len(chunk) <= max_chars for chunk in chunks)
+
+
+def test_split_text_ends_chunks_at_sentence_breaks():
+    chunks = translation.split_text("Alpha beta. Gamma delta. Epsilon zeta.", 15)
+    assert chunks == ["Alpha beta. ", "Gamma delta. ", "Epsilon zeta."]
+
+
+def test_translate_keeps_surrounding_whitespace():
+    translated = translation.translate("  Hello there.\n", ["fr", "de"], backend=translation.StubBackend())
+    assert translated == {"fr": "  [fr] Hello there.\n", "de": "  [de] Hello there.\n"}
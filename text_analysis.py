@@ -0,0 +1,158 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# ---------------------------
+# Batched Sentiment & Emotion Analysis
+# ---------------------------
+# Long texts are split into sentence-aligned segments that fit the models'
+# 512-token window, the segments are classified in batches, and the per-segment
+# scores are combined into one length-weighted document score. Results are
+# memoized per text hash so reruns do not classify the same text again.
+
+# About 400 tokens of English, safely below the 512-token model limit
+MAX_SEGMENT_CHARS = 1500
+BATCH_SIZE = 16
+# spaCy refuses texts longer than nlp.max_length, so long texts are parsed in blocks
+BLOCK_CHARS = 100000
+MEMO_SIZE = 256
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+# Function to split text into blocks at paragraph breaks, keeping each block's start offset
+def _blocks(text, block_chars=BLOCK_CHARS):
+    start = 0
+    while start < len(text):
+        end = min(start + block_chars, len(text))
+        if end < len(text):
+            cut = text.rfind("\n", start, end)
+            if cut > start:
+                end = cut + 1
+        yield start, text[start:end]
+        start = end
+
+
+# Function to split text into sentence-aligned segments of at most `max_chars` characters,
+# each with its character offsets in the original text
+def segment_text(nlp, text, max_chars=MAX_SEGMENT_CHARS):
+    disabled = [name for name in ("ner", "lemmatizer", "attribute_ruler") if name in nlp.pipe_names]
+    blocks = list(_blocks(text))
+    segments = []
+    current = None
+    for (offset, _), doc in zip(blocks, nlp.pipe((block for _, block in blocks), disable=disabled)):
+        for sent in doc.sents:
+            start = offset + sent.start_char
+            end = offset + sent.end_char
+            # Sentences longer than a segment are cut at word boundaries
+            while end - start > max_chars:
+                cut = text.rfind(" ", start, start + max_chars)
+                cut = cut if cut > start else start + max_chars
+                if current:
+                    segments.append(current)
+                    current = None
+                segments.append({"start": start, "end": cut})
+                start = cut
+            if current and end - current["start"] <= max_chars:
+                current["end"] = end
+            else:
+                if current:
+                    segments.append(current)
+                current = {"start": start, "end": end}
+    if current:
+        segments.append(current)
+    for segment in segments:
+        segment["text"] = text[segment["start"]:segment["end"]].strip()
+    return [segment for segment in segments if segment["text"]]
+
+
+# Function to get the probability of the positive label from a sentiment prediction
+def _positive_score(prediction):
+    return prediction["score"] if prediction["label"].upper().startswith("POS") else 1 - prediction["score"]
+
+
+# Function to get the segments of a text, parsed once for both analyses
+def _segments(nlp, text):
+    segments = _memoized("segments", text, lambda: segment_text(nlp, text))
+    return [dict(segment) for segment in segments]
+
+
+def _memoized(kind, text, compute):
+    key = (kind, hashlib.sha256(text.encode("utf-8")).hexdigest())
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    result = compute()
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+
+# Function to run sentiment analysis over a text of any length.
+# Returns {"document": {"label", "score", "positive"}, "segments": [...]}
+def analyze_sentiment(nlp, sentiment_pipeline, text, batch_size=BATCH_SIZE):
+    def compute():
+        segments = _segments(nlp, text)
+        if not segments:
+            return {"document": None, "segments": []}
+        predictions = sentiment_pipeline([s["text"] for s in segments], batch_size=batch_size, truncation=True)
+        weighted = 0.0
+        total = 0
+        for segment, prediction in zip(segments, predictions):
+            segment["label"] = prediction["label"]
+            segment["score"] = prediction["score"]
+            segment["positive"] = _positive_score(prediction)
+            weight = len(segment["text"])
+            weighted += segment["positive"] * weight
+            total += weight
+        positive = weighted / total
+        document = {
+            "label": "POSITIVE" if positive >= 0.5 else "NEGATIVE",
+            "score": positive if positive >= 0.5 else 1 - positive,
+            "positive": positive,
+        }
+        return {"document": document, "segments": segments}
+    return _memoized("sentiment", text, compute)
+
+
+# Function to run emotion analysis over a text of any length.
+# Returns {"document": {"label", "score", "scores"}, "segments": [...]}
+def analyze_emotions(nlp, emotion_pipeline, text, batch_size=BATCH_SIZE):
+    def compute():
+        segments = _segments(nlp, text)
+        if not segments:
+            return {"document": None, "segments": []}
+        predictions = emotion_pipeline([s["text"] for s in segments], batch_size=batch_size, truncation=True)
+        totals = {}
+        total_weight = 0
+        for segment, prediction in zip(segments, predictions):
+            # return_all_scores pipelines give every label's score for each input
+            scores = {item["label"]: item["score"] for item in prediction}
+            segment["scores"] = scores
+            segment["label"] = max(scores, key=scores.get)
+            weight = len(segment["text"])
+            for label, score in scores.items():
+                totals[label] = totals.get(label, 0.0) + score * weight
+            total_weight += weight
+        scores = {label: value / total_weight for label, value in totals.items()}
+        label = max(scores, key=scores.get)
+        return {"document": {"label": label, "score": scores[label], "scores": scores}, "segments": segments}
+    return _memoized("emotion", text, compute)
+
+
+# Function to line up segment results over the text, in seconds when the audio duration is known
+# and as a fraction of the text otherwise
+def timeline(sentiment_result, emotion_result, text_length, duration_seconds=None):
+    rows = []
+    for sentiment, emotion in zip(sentiment_result["segments"], emotion_result["segments"]):
+        position = sentiment["start"] / text_length if text_length else 0.0
+        row = {"position": round(position * duration_seconds, 1) if duration_seconds else round(position, 3),
+               "positive": sentiment["positive"]}
+        row.update(emotion["scores"])
+        rows.append(row)
+    return rows
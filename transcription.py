@@ -0,0 +1,161 @@
+import importlib.util
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import lazy_imports
+
+sr = lazy_imports.lazy("speech_recognition")
+
+
+# ---------------------------
+# Chunked Transcription
+# ---------------------------
+# Long recordings are cut into chunks of at most CHUNK_SECONDS, preferably in
+# the quietest moment near each boundary so words are not split. The chunks
+# are read with sr.AudioFile offset/duration and transcribed concurrently by
+# a pluggable backend. Timestamped segments are yielded as they finish, so the
+# transcript fills in while the rest is still being recognized.
+
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "google")
+TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "4"))
+CHUNK_SECONDS = float(os.environ.get("TRANSCRIPTION_CHUNK_SECONDS", "30"))
+
+# How far before a chunk boundary to look for silence, and the length of the energy frames
+SILENCE_SEARCH_SECONDS = 5.0
+FRAME_SECONDS = 0.02
+
+SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+# Packages the offline recognizers need on top of SpeechRecognition; they are large, so they
+# are not in requirements.txt: (modules to check, what to pip install)
+OFFLINE_PACKAGES = {
+    "sphinx": (("pocketsphinx",), "pocketsphinx"),
+    "whisper": (("whisper", "soundfile"), "openai-whisper soundfile"),
+}
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+# Function to read the RMS energy of FRAME_SECONDS frames between `start` and `end` seconds of a WAV file
+def _frame_energy(wav_file, start, end):
+    rate = wav_file.getframerate()
+    dtype = SAMPLE_TYPES.get(wav_file.getsampwidth())
+    if dtype is None:
+        return None
+    wav_file.setpos(int(start * rate))
+    samples = np.frombuffer(wav_file.readframes(int((end - start) * rate)), dtype=dtype).astype(np.float32)
+    if dtype is np.uint8:
+        samples -= 128.0
+    samples = samples.reshape(-1, wav_file.getnchannels()).mean(axis=1)
+    frame = max(int(FRAME_SECONDS * rate), 1)
+    usable = len(samples) // frame * frame
+    if not usable:
+        return None
+    return np.sqrt((samples[:usable].reshape(-1, frame) ** 2).mean(axis=1))
+
+
+# Function to plan (start, end) chunks in seconds. WAV files are cut at the quietest frame in the
+# last SILENCE_SEARCH_SECONDS of each chunk; other formats are cut into fixed windows.
+def plan_chunks(path, chunk_seconds=CHUNK_SECONDS):
+    try:
+        with wave.open(path) as wav_file:
+            total = wav_file.getnframes() / wav_file.getframerate()
+            cuts = [0.0]
+            while total - cuts[-1] > chunk_seconds:
+                target = cuts[-1] + chunk_seconds
+                search_start = max(cuts[-1] + chunk_seconds / 2, target - SILENCE_SEARCH_SECONDS)
+                energy = _frame_energy(wav_file, search_start, target)
+                if energy is None:
+                    cuts.append(target)
+                else:
+                    cuts.append(search_start + (int(np.argmin(energy)) + 0.5) * FRAME_SECONDS)
+    except (wave.Error, EOFError):
+        # AIFF or FLAC: let SpeechRecognition read the duration
+        with sr.AudioFile(path) as source:
+            total = source.DURATION
+        cuts = [i * chunk_seconds for i in range(int(total // chunk_seconds) + 1) if i * chunk_seconds < total] or [0.0]
+    return list(zip(cuts, cuts[1:] + [total]))
+
+
+class RecognizerBackend:
+    # Any SpeechRecognition recognizer, e.g. "google" (online), "sphinx" or "whisper" (offline)
+    def __init__(self, method="google", **options):
+        self.name = method
+        self.method = method
+        self.options = options
+
+    def transcribe(self, path, start, end):
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(path) as source:
+            audio = recognizer.record(source, offset=start, duration=end - start)
+        try:
+            return getattr(recognizer, f"recognize_{self.method}")(audio, **self.options)
+        except sr.UnknownValueError:
+            # Nothing intelligible in this chunk, e.g. music or silence
+            return ""
+
+
+class StubBackend:
+    # Deterministic stand-in for tests and benchmarks: waits `seconds_per_chunk` and describes the chunk
+    name = "stub"
+
+    def __init__(self, seconds_per_chunk=0.0):
+        self.seconds_per_chunk = seconds_per_chunk
+
+    def transcribe(self, path, start, end):
+        if self.seconds_per_chunk:
+            time.sleep(self.seconds_per_chunk)
+        return f"speech from {start:.1f}s to {end:.1f}s"
+
+
+# Function to create the backend named by TRANSCRIPTION_BACKEND (or `name`)
+def get_backend(name=None):
+    name = name or TRANSCRIPTION_BACKEND
+    if name == "stub":
+        return StubBackend()
+    modules, install = OFFLINE_PACKAGES.get(name, ((), ""))
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    if missing:
+        raise TranscriptionError(f"The {name} recognizer needs {', '.join(missing)}; install it with 'pip install {install}'")
+    if name == "whisper":
+        return RecognizerBackend("whisper", model=os.environ.get("WHISPER_MODEL", "base"))
+    return RecognizerBackend(name)
+
+
+# Function to transcribe an audio file in concurrent chunks.
+# Yields {"index", "start", "end", "text", "error"} segments in the order they finish, along with the chunk count.
+def transcribe_chunks(path, backend=None, max_workers=TRANSCRIPTION_WORKERS, chunk_seconds=CHUNK_SECONDS):
+    backend = backend or get_backend()
+    chunks = plan_chunks(path, chunk_seconds)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks))), thread_name_prefix="transcribe")
+    try:
+        futures = {executor.submit(backend.transcribe, path, start, end): (index, start, end)
+                   for index, (start, end) in enumerate(chunks)}
+        for future in as_completed(futures):
+            index, start, end = futures[future]
+            segment = {"index": index, "start": start, "end": end, "text": "", "error": None}
+            try:
+                segment["text"] = future.result().strip()
+            except Exception as e:
+                segment["error"] = str(e)
+            yield segment, len(chunks)
+    finally:
+        # Stop queued chunks if the caller stops reading early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to join finished segments into a transcript in recording order
+def join_segments(segments):
+    return " ".join(segment["text"] for segment in sorted(segments, key=lambda s: s["index"]) if segment["text"])
+
+
+# Function to format seconds as m:ss for timestamps
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
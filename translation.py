@@ -0,0 +1,172 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import lazy_imports
+from extraction_cache import ExtractionCache
+
+deep_translator = lazy_imports.lazy("deep_translator")
+
+
+# ---------------------------
+# Chunked Translation
+# ---------------------------
+# Text is split at sentence and line boundaries into chunks below the
+# provider's request size limit. The chunks of every target language are
+# translated concurrently by a bounded thread pool, and each translated chunk
+# is cached on disk by (chunk hash, languages, backend), so translating an
+# edited document again only sends the chunks that changed.
+
+TRANSLATION_WORKERS = int(os.environ.get("TRANSLATION_WORKERS", "4"))
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "google")
+TRANSLATION_CACHE_DIR = os.environ.get(
+    "TRANSLATION_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "translations")
+)
+TRANSLATION_CACHE_MB = int(os.environ.get("TRANSLATION_CACHE_MB", "64"))
+
+# Google Translate rejects requests over 5000 characters
+MAX_CHUNK_CHARS = 4500
+
+# Bump when chunking changes so cached translations are not reused
+TRANSLATION_VERSION = 1
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?;।。！？])\s+|\n+")
+
+
+class TranslationError(Exception):
+    pass
+
+
+class GoogleBackend:
+    name = "google"
+
+    def translate(self, text, source, target):
+        return deep_translator.GoogleTranslator(source=source, target=target).translate(text)
+
+
+class StubBackend:
+    # Deterministic stand-in for tests and benchmarks: tags the text with the target language
+    name = "stub"
+
+    def __init__(self, seconds_per_chunk=0.0):
+        self.seconds_per_chunk = seconds_per_chunk
+
+    def translate(self, text, source, target):
+        if self.seconds_per_chunk:
+            time.sleep(self.seconds_per_chunk)
+        return f"[{target}] {text}"
+
+
+BACKENDS = {"google": GoogleBackend, "stub": StubBackend}
+
+
+# Function to create the backend named by TRANSLATION_BACKEND (or `name`)
+def get_backend(name=None):
+    return BACKENDS[name or TRANSLATION_BACKEND]()
+
+
+# Shared on-disk cache of translated chunks for the whole process
+cache = ExtractionCache(directory=TRANSLATION_CACHE_DIR, max_mb=TRANSLATION_CACHE_MB)
+
+
+# Function to cut a piece longer than `max_chars` at word boundaries
+def _split_long(piece, max_chars):
+    while len(piece) > max_chars:
+        cut = piece.rfind(" ", 0, max_chars)
+        cut = cut + 1 if cut > 0 else max_chars
+        yield piece[:cut]
+        piece = piece[cut:]
+    if piece:
+        yield piece
+
+
+# Function to split text into chunks of at most `max_chars`, ending at sentence or line breaks.
+# Joining the chunks gives back the original text.
+def split_text(text, max_chars=MAX_CHUNK_CHARS):
+    pieces = []
+    position = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        pieces.extend(_split_long(text[position:match.end()], max_chars))
+        position = match.end()
+    pieces.extend(_split_long(text[position:], max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Split a chunk into (leading whitespace, text, trailing whitespace); providers drop the whitespace
+def _strip(chunk):
+    text = chunk.strip()
+    if not text:
+        return chunk, "", ""
+    start = chunk.index(text)
+    return chunk[:start], text, chunk[start + len(text):]
+
+
+# Function to translate a chunk, from the cache when it was translated before
+def translate_chunk(text, target, source="auto", backend=None):
+    backend = backend or get_backend()
+    key = cache.key(text.encode("utf-8"), f"{backend.name}-{source}-{target}", TRANSLATION_VERSION)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached["text"], True
+    translated = backend.translate(text, source, target) or ""
+    try:
+        cache.put(key, {"text": translated})
+    except OSError as e:
+        print(f"Error writing translation cache: {e}")
+    return translated, False
+
+
+# Function to translate text into one or more target languages.
+# `on_progress(done, total, cached)` is called after every chunk. Returns {target: translated text};
+# raises TranslationError after all other chunks finished (and were cached) if any chunk failed.
+def translate(text, targets, source="auto", backend=None, max_workers=TRANSLATION_WORKERS, on_progress=None):
+    backend = backend or get_backend()
+    targets = [targets] if isinstance(targets, str) else list(targets)
+    chunks = [_strip(chunk) for chunk in split_text(text)]
+    translated = {target: [""] * len(chunks) for target in targets}
+
+    # The same sentence repeated in a document is translated once per language
+    jobs = {}
+    for target in targets:
+        for index, (_, body, _) in enumerate(chunks):
+            if body:
+                jobs.setdefault((body, target), []).append(index)
+
+    total = len(jobs)
+    done = 0
+    cached_count = 0
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total or 1)), thread_name_prefix="translate") as executor:
+        futures = {executor.submit(translate_chunk, body, target, source, backend): (body, target)
+                   for body, target in jobs}
+        for future in as_completed(futures):
+            body, target = futures[future]
+            try:
+                result, was_cached = future.result()
+            except Exception as e:
+                errors.append(f"{target}: {e}")
+                result, was_cached = body, False
+            for index in jobs[(body, target)]:
+                translated[target][index] = result
+            done += 1
+            cached_count += was_cached
+            if on_progress:
+                on_progress(done, total, cached_count)
+
+    if errors:
+        raise TranslationError(f"{len(errors)} of {total} chunks failed, e.g. {errors[0]}")
+    return {
+        target: "".join(lead + part + trail for (lead, _, trail), part in zip(chunks, parts))
+        for target, parts in translated.items()
+    }
@@ -0,0 +1,155 @@
+import importlib.util
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import lazy_imports
+from extraction_cache import ExtractionCache
+
+bs4 = lazy_imports.lazy("bs4")
+
+
+# ---------------------------
+# Website Fetching
+# ---------------------------
+# One pooled requests.Session is shared by all sessions. Pages are downloaded
+# in a stream with a byte cap and stored with their ETag/Last-Modified in an
+# on-disk cache; later fetches of the same URL revalidate with a conditional
+# request and reuse the cached text when the server answers 304 Not Modified.
+
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "10"))
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+PAGE_CACHE_DIR = os.environ.get(
+    "PAGE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sm_assistant", "pages")
+)
+PAGE_CACHE_MB = int(os.environ.get("PAGE_CACHE_MB", "128"))
+USER_AGENT = "Mozilla/5.0 (compatible; SM-Business-Assistant)"
+
+# Bump when text extraction changes so cached texts are re-parsed
+PARSER_VERSION = 1
+
+
+# Function to pick the fastest installed BeautifulSoup parser
+def _default_parser():
+    configured = os.environ.get("HTML_PARSER")
+    if configured:
+        return configured
+    # Look the parser up without importing it, lxml is only loaded when a page is parsed
+    return "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+HTML_PARSER = _default_parser()
+
+
+def _build_session(pool_size=20):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+# Shared connection pool and page cache for the whole process
+session = _build_session()
+page_cache = ExtractionCache(directory=PAGE_CACHE_DIR, max_mb=PAGE_CACHE_MB)
+
+
+class FetchError(Exception):
+    pass
+
+
+# Function to download a URL in chunks, stopping after `max_bytes`.
+# Returns (response, body bytes, truncated); truncated only when the body was longer than `max_bytes`
+def _download(url, headers, timeout, max_bytes):
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return response, b"", False
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        # One byte past the cap tells a body of exactly `max_bytes` from a longer one
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                break
+        body = b"".join(chunks)
+        return response, body[:max_bytes], len(body) > max_bytes
+
+
+# Function to download a URL as raw bytes (e.g. a sitemap), without caching or parsing
+def fetch_bytes(url, timeout=FETCH_TIMEOUT, max_bytes=FETCH_MAX_BYTES):
+    try:
+        _, body, _ = _download(url, {}, timeout, max_bytes)
+    except requests.RequestException as e:
+        raise FetchError(str(e)) from e
+    return body
+
+
+# Function to turn HTML into readable text and the list of links on the page
+def parse_html(html, parser=None):
+    soup = bs4.BeautifulSoup(html, parser or HTML_PARSER)
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    canonical = soup.find("link", rel="canonical", href=True)
+    # Remove script and style elements
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    text = ' '.join(soup.stripped_strings)
+    return {"text": text, "links": links, "canonical": canonical["href"] if canonical else None}
+
+
+# Function to fetch a page and its text, revalidating against the page cache.
+# Returns the parsed page plus a report with timings, sizes and cache status.
+def fetch_page(url, timeout=FETCH_TIMEOUT, max_bytes=FETCH_MAX_BYTES):
+    key = page_cache.key(url.encode("utf-8"), "page", PARSER_VERSION)
+    cached = page_cache.get(key)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    started = time.perf_counter()
+    try:
+        response, body, truncated = _download(url, headers, timeout, max_bytes)
+    except requests.RequestException as e:
+        raise FetchError(str(e)) from e
+    fetch_seconds = time.perf_counter() - started
+
+    report = {"url": url, "status": response.status_code, "fetch_seconds": fetch_seconds, "parse_seconds": 0.0}
+    if response.status_code == 304 and cached:
+        report.update({"cache": "revalidated", "bytes": 0, "truncated": cached.get("truncated", False)})
+        return {**cached["page"], "final_url": cached["final_url"]}, report
+
+    # Without a declared charset the raw bytes are passed on so the parser can detect it
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        html = body.decode(response.encoding, errors="replace")
+    else:
+        html = body
+    started = time.perf_counter()
+    page = parse_html(html)
+    report.update({
+        "cache": "miss",
+        "bytes": len(body),
+        "truncated": truncated,
+        "parse_seconds": time.perf_counter() - started,
+    })
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        try:
+            page_cache.put(key, {
+                "etag": etag,
+                "last_modified": last_modified,
+                "final_url": response.url,
+                "truncated": truncated,
+                "page": page,
+            })
+        except OSError as e:
+            print(f"Error writing page cache: {e}")
+    return {**page, "final_url": response.url}, report